@@ -0,0 +1,129 @@
+"""
+Bulk Import Module
+Streams rows out of CSV/XLSX uploads for SecureDatabaseOperations.import_rows
+"""
+import codecs
+import csv
+import re
+import unicodedata
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Type, Union, get_args, get_origin
+from pydantic import BaseModel
+from app.secure_operations import SecureOperationError
+
+# Brazilian spreadsheets usually come as dd/mm/yyyy and 1.234,56
+BR_DATE = re.compile(r"^(\d{2})/(\d{2})/(\d{4})$")
+BR_NUMBER = re.compile(r"^-?\d{1,3}(\.\d{3})*(,\d+)?$|^-?\d+,\d+$")
+
+def normalize_header(header: Any) -> str:
+    """'Data Início' -> 'data_inicio', so columns match the model fields"""
+    text = unicodedata.normalize("NFKD", str(header or "").strip().lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\W+", "_", text).strip("_")
+
+def field_types(model: Type[BaseModel]) -> Dict[str, Any]:
+    """Type of each model field, with Optional[...] unwrapped"""
+    types = {}
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        types[name] = args[0] if get_origin(annotation) is Union and len(args) == 1 else annotation
+    return types
+
+def normalize_cell(value: Any, field_type: Any = None) -> Any:
+    """
+    Empty cells become None. Brazilian dates and numbers are converted only
+    for date and float fields; text fields keep the cell as typed, so
+    '250' or '1.200,50' stay strings (numeric XLSX cells become text).
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if field_type is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    if field_type is date:
+        match = BR_DATE.match(value)
+        if match:
+            day, month, year = match.groups()
+            return f"{year}-{month}-{day}"
+    if field_type in (float, int) and BR_NUMBER.match(value):
+        return float(value.replace(".", "").replace(",", "."))
+    return value
+
+def _build_row(headers: List[str], values, types: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    row = {
+        header: normalize_cell(value, types.get(header))
+        for header, value in zip(headers, values)
+        if header
+    }
+    return row if any(value is not None for value in row.values()) else None
+
+def iter_csv_rows(file: BinaryIO, model: Type[BaseModel],
+                  encoding: str = "utf-8-sig") -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, row) from a CSV upload, detecting ',' / ';' / tab"""
+    types = field_types(model)
+    text = codecs.getreader(encoding)(file)
+    sample = text.read(4096)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    def lines():
+        # Re-joins the sniffed sample with the rest of the stream
+        yield from sample.splitlines(keepends=True)
+        yield from text
+
+    reader = csv.reader(_rejoin(lines()), dialect)
+    headers = [normalize_header(header) for header in next(reader, [])]
+    for values in reader:
+        row = _build_row(headers, values, types)
+        if row:
+            yield reader.line_num, row
+
+def _rejoin(chunks: Iterator[str]) -> Iterator[str]:
+    """The sample may end mid-line; glue that piece to the next chunk"""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        if pending.endswith("\n"):
+            yield pending
+            pending = ""
+    if pending:
+        yield pending
+
+def iter_xlsx_rows(file: BinaryIO, model: Type[BaseModel]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row number, row) from the first sheet of an XLSX upload"""
+    types = field_types(model)
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SecureOperationError("Importação de XLSX requer o pacote openpyxl")
+
+    # read_only streams the sheet XML instead of building the whole workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [normalize_header(header) for header in next(rows, [])]
+        for number, values in enumerate(rows, start=2):
+            row = _build_row(headers, values, types)
+            if row:
+                yield number, row
+    finally:
+        workbook.close()
+
+def iter_upload_rows(filename: str, file: BinaryIO,
+                     model: Type[BaseModel]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Pick the parser from the file extension; cells are read as `model`'s fields"""
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return iter_csv_rows(file, model)
+    if extension in ("xlsx", "xlsm"):
+        return iter_xlsx_rows(file, model)
+    raise SecureOperationError("Formato não suportado: envie um arquivo .csv ou .xlsx")
@@ -3,87 +3,485 @@ Cache Service using Redis
 Implements multi-level caching based on Gemini recommendations
 """
 import redis.asyncio as redis
+import asyncio
 import json
 import hashlib
-from typing import Optional, Any, Dict
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple, Iterable, List, Callable, Awaitable
 from datetime import timedelta
 from loguru import logger
+from app.single_flight import SingleFlight
+from app.serialization import CacheSerializer, json_dumps, json_loads
+from app.monitoring import cache_operations, log_sampled, track_cache
+
+# Pub/sub channel used to evict L1 entries on every worker
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Prefix of every entry key. Bump it when the shape of cached values
+# changes: entries of the old shape are then never read, and expire with
+# their TTL instead of being served after a deploy.
+CACHE_KEY_VERSION = "v2"
+
+# Tables read by each cached operation, used to tag entries so a write
+# only invalidates the operations that depend on the table it touched
+OPERATION_TABLES = {
+    'get_obras_ativas': ['obras'],
+    'get_obras_todas': ['obras'],
+    'get_obras_finalizadas': ['obras'],
+    'get_custos_obra': ['lancamentos_financeiros', 'itens_orcamento'],
+    'get_fornecedores': ['fornecedores'],
+    'search_all': ['obras', 'fornecedores', 'lancamentos_financeiros'],
+    'fluxo_caixa': ['lancamentos_financeiros'],
+    # One entry per obra (SecureDatabaseOperations.get_obras_dashboards)
+    'obra_dashboard': ['obras', 'lancamentos_financeiros', 'itens_orcamento'],
+}
+
+class LocalCache:
+    """
+    In-process LRU cache (L1) bounded by entry count and payload bytes.
+    Entries expire after their TTL even if they are never evicted.
+
+    A value read from Redis is copied into L1 through begin_fill/end_fill:
+    if the key is deleted or set while the read is in flight (an
+    invalidation arriving mid-read), the value read may be stale and the
+    copy is skipped.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        # key -> [generation, reads in flight], only for keys being filled
+        self._fills: Dict[str, List[int]] = {}
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value), refreshing the entry's LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any, size: int, ttl_seconds: float) -> None:
+        """Store a decoded value; `size` is the length of its serialized form"""
+        self.delete(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + ttl_seconds, value, size)
+        self.current_bytes += size
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def delete(self, key: str) -> bool:
+        fill = self._fills.get(key)
+        if fill is not None:
+            fill[0] += 1
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry[2]
+        return True
+
+    def clear(self) -> None:
+        for fill in self._fills.values():
+            fill[0] += 1
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def begin_fill(self, key: str) -> int:
+        """Mark a read of `key` from L2 as in flight; returns its generation"""
+        fill = self._fills.setdefault(key, [0, 0])
+        fill[1] += 1
+        return fill[0]
+
+    def end_fill(self, key: str, generation: int,
+                 entry: Optional[Tuple[Any, int, float]] = None) -> None:
+        """
+        Finish a read started with begin_fill, storing `entry`
+        (value, size, ttl_seconds) unless the key changed in the meantime
+        """
+        fill = self._fills[key]
+        current = fill[0]
+        fill[1] -= 1
+        if not fill[1]:
+            del self._fills[key]
+        if entry is not None and generation == current:
+            self.set(key, *entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 class CacheService:
     """
     Redis-based cache service for improving performance
+
+    Lookups go through an in-process L1 tier before hitting Redis (L2).
+    Writes and invalidations are broadcast on INVALIDATION_CHANNEL so every
+    worker drops its stale L1 copy; call `start_invalidation_listener` once
+    per process to receive them.
+
+    Every key is registered in a per-user tag set and in one tag set per
+    table it reads (see OPERATION_TABLES), so invalidation only touches the
+    keys of the affected user instead of scanning the whole keyspace.
+
+    Values are stored through a CacheSerializer, so the client should be
+    created with decode_responses=False. L1 keeps the JSON bytes, which
+    `get_raw` hands out as-is for responses that embed cached data.
     """
-    
-    def __init__(self, redis_client: redis.Redis):
+
+    def __init__(self, redis_client: redis.Redis,
+                 l1_max_entries: int = 1000,
+                 l1_max_bytes: int = 16 * 1024 * 1024,
+                 l1_ttl: Optional[timedelta] = None,
+                 serializer: Optional[CacheSerializer] = None):
         self.redis = redis_client
+        self.serializer = serializer or CacheSerializer()
         self.default_ttl = timedelta(minutes=5)
-        
+        self.l1_ttl = l1_ttl or self.default_ttl
+        self.local = LocalCache(l1_max_entries, l1_max_bytes)
+        self.instance_id = uuid.uuid4().hex
+        self.stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        self.single_flight = SingleFlight(redis_client)
+        self._listener_task: Optional[asyncio.Task] = None
+
     def _generate_key(self, operation: str, user_id: str, params: Dict = None) -> str:
         """Generate a unique cache key"""
-        key_parts = [operation, user_id]
+        key_parts = [CACHE_KEY_VERSION, operation, user_id]
         if params:
             # Sort params to ensure consistent keys
             sorted_params = json.dumps(params, sort_keys=True)
             key_parts.append(hashlib.md5(sorted_params.encode()).hexdigest())
         return ":".join(key_parts)
-    
+
+    @staticmethod
+    def _user_tag(user_id: str) -> str:
+        return f"tag:user:{user_id}"
+
+    @staticmethod
+    def _table_tag(table: str, user_id: str) -> str:
+        return f"tag:table:{table}:{user_id}"
+
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return f"data_version:{user_id}"
+
+    async def get_data_version(self, user_id: str) -> int:
+        """Counter bumped on every invalidation of the user's data"""
+        try:
+            return int(await self.redis.get(self._version_key(user_id)) or 0)
+        except Exception as e:
+            logger.error(f"Cache version error: {e}")
+            return 0
+
+    def _l1_ttl_seconds(self, ttl: timedelta) -> float:
+        """L1 entries never outlive their Redis counterpart"""
+        return min(ttl, self.l1_ttl).total_seconds()
+
     async def get(self, operation: str, user_id: str, params: Dict = None) -> Optional[Any]:
         """Get cached value"""
-        key = self._generate_key(operation, user_id, params)        try:
-            cached = await self.redis.get(key)
+        raw = await self.get_raw(operation, user_id, params)
+        return json_loads(raw) if raw is not None else None
+
+    async def get_raw(self, operation: str, user_id: str, params: Dict = None) -> Optional[bytes]:
+        """Get the cached value as JSON bytes, ready to send to a client"""
+        key = self._generate_key(operation, user_id, params)
+        found, value = self.local.get(key)
+        if found:
+            self.stats["l1_hits"] += 1
+            cache_operations.labels(operation="get", result="hit").inc()
+            return value
+        self.stats["l1_misses"] += 1
+
+        generation = self.local.begin_fill(key)
+        fill = None
+        try:
+            # Fetch the remaining TTL in the same round trip so the L1 copy
+            # expires together with the Redis entry
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                cached, remaining = await pipe.execute()
             if cached:
-                logger.debug(f"Cache HIT for key: {key}")
-                return json.loads(cached)
-            logger.debug(f"Cache MISS for key: {key}")
+                self.stats["l2_hits"] += 1
+                if log_sampled():
+                    logger.debug("Cache HIT for key: {}", key)
+                value = self.serializer.to_json(cached)
+                if remaining and remaining > 0:
+                    ttl = timedelta(milliseconds=remaining)
+                    fill = (value, len(value), self._l1_ttl_seconds(ttl))
+                cache_operations.labels(operation="get", result="hit").inc()
+                return value
+            self.stats["l2_misses"] += 1
+            cache_operations.labels(operation="get", result="miss").inc()
+            if log_sampled():
+                logger.debug("Cache MISS for key: {}", key)
             return None
         except Exception as e:
+            cache_operations.labels(operation="get", result="error").inc()
             logger.error(f"Cache GET error: {e}")
             return None
-    
-    async def set(self, operation: str, user_id: str, value: Any, 
+        finally:
+            self.local.end_fill(key, generation, fill)
+
+    async def get_many(self, operation: str, user_id: str,
+                       params_list: List[Optional[Dict]]) -> List[Optional[Any]]:
+        """
+        Cached values of several entries of one operation, in the order of
+        `params_list` (None where missing). Entries not in L1 are read from
+        Redis in a single round trip.
+        """
+        keys = [self._generate_key(operation, user_id, params) for params in params_list]
+        values: List[Optional[bytes]] = [None] * len(keys)
+        remote = []
+        for i, key in enumerate(keys):
+            found, value = self.local.get(key)
+            if found:
+                values[i] = value
+            else:
+                remote.append(i)
+        self.stats["l1_hits"] += len(keys) - len(remote)
+        self.stats["l1_misses"] += len(remote)
+
+        failed = 0
+        if remote:
+            generations = [self.local.begin_fill(keys[i]) for i in remote]
+            fills: List[Optional[Tuple[bytes, int, float]]] = [None] * len(remote)
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for i in remote:
+                        pipe.get(keys[i])
+                        pipe.pttl(keys[i])
+                    results = await pipe.execute()
+                for n, i in enumerate(remote):
+                    cached, remaining = results[2 * n], results[2 * n + 1]
+                    if not cached:
+                        continue
+                    value = self.serializer.to_json(cached)
+                    if remaining and remaining > 0:
+                        ttl = timedelta(milliseconds=remaining)
+                        fills[n] = (value, len(value), self._l1_ttl_seconds(ttl))
+                    values[i] = value
+                found_remote = sum(1 for i in remote if values[i] is not None)
+                self.stats["l2_hits"] += found_remote
+                self.stats["l2_misses"] += len(remote) - found_remote
+            except Exception as e:
+                # Entries that could not be read are errors, not misses
+                failed = sum(1 for i in remote if values[i] is None)
+                cache_operations.labels(operation="get", result="error").inc(failed)
+                logger.error(f"Cache GET error: {e}")
+            finally:
+                for n, i in enumerate(remote):
+                    self.local.end_fill(keys[i], generations[n], fills[n])
+
+        hits = sum(1 for value in values if value is not None)
+        cache_operations.labels(operation="get", result="hit").inc(hits)
+        cache_operations.labels(operation="get", result="miss").inc(len(values) - hits - failed)
+        return [json_loads(value) if value is not None else None for value in values]
+
+    @track_cache("set")
+    async def set(self, operation: str, user_id: str, value: Any,
                   params: Dict = None, ttl: timedelta = None) -> bool:
         """Set cached value with TTL"""
-        key = self._generate_key(operation, user_id, params)
+        return await self._set_entries(operation, user_id, [(params, value)], ttl)
+
+    async def set_many(self, operation: str, user_id: str,
+                       entries: List[Tuple[Optional[Dict], Any]],
+                       ttl: timedelta = None) -> bool:
+        """Store several entries of one operation in a single round trip"""
+        if not entries:
+            return True
+        stored = await self._set_entries(operation, user_id, entries, ttl)
+        cache_operations.labels(operation="set", result="success" if stored else "error").inc(len(entries))
+        return stored
+
+    async def _set_entries(self, operation: str, user_id: str,
+                           entries: List[Tuple[Optional[Dict], Any]],
+                           ttl: Optional[timedelta]) -> bool:
         ttl = ttl or self.default_ttl
-        
+        ttl_seconds = int(ttl.total_seconds())
+        tags = [self._user_tag(user_id)] + [
+            self._table_tag(table, user_id)
+            for table in OPERATION_TABLES.get(operation, [])
+        ]
+
         try:
-            await self.redis.setex(
-                key,
-                int(ttl.total_seconds()),
-                json.dumps(value)
-            )
-            logger.debug(f"Cache SET for key: {key}, TTL: {ttl}")
+            stored = []
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for params, value in entries:
+                    key = self._generate_key(operation, user_id, params)
+                    json_bytes = json_dumps(value)
+                    payload = self.serializer.dumps(value, json_bytes)
+                    pipe.setex(
+                        key,
+                        ttl_seconds,
+                        payload
+                    )
+                    for tag in tags:
+                        pipe.sadd(tag, key)
+                    self._publish_invalidation(pipe, key)
+                    stored.append((key, json_bytes, len(payload)))
+                # Tag sets live as long as the longest-lived entry they
+                # reference; members whose key already expired are harmless
+                for tag in tags:
+                    pipe.expire(tag, ttl_seconds, nx=True)
+                    pipe.expire(tag, ttl_seconds, gt=True)
+                await pipe.execute()
+            for key, json_bytes, size in stored:
+                self.local.set(key, json_bytes, len(json_bytes), self._l1_ttl_seconds(ttl))
+                if log_sampled():
+                    logger.debug("Cache SET for key: {}, TTL: {}, {} bytes", key, ttl, size)
             return True
         except Exception as e:
             logger.error(f"Cache SET error: {e}")
             return False
-    
+
+    async def coalesce(self, operation: str, user_id: str,
+                       fetch: Callable[[], Awaitable[Any]],
+                       params: Dict = None) -> Any:
+        """
+        Run `fetch` once for concurrent misses of the same entry.
+        `fetch` is expected to store its result with `set`, which is how
+        callers waiting on other workers receive it.
+        """
+        key = self._generate_key(operation, user_id, params)
+        return await self.single_flight.do(
+            key, fetch, wait_for=lambda: self.get(operation, user_id, params)
+        )
+
     async def invalidate_user_cache(self, user_id: str) -> int:
         """Invalidate all cache for a specific user"""
-        pattern = f"*:{user_id}:*"        try:
-            keys = []
-            async for key in self.redis.scan_iter(match=pattern):
-                keys.append(key)
-            
-            if keys:
-                await self.redis.delete(*keys)
-                logger.info(f"Invalidated {len(keys)} cache entries for user {user_id}")
-                return len(keys)
+        try:
+            count = await self._invalidate_tags(user_id, [self._user_tag(user_id)])
+            if count:
+                logger.info(f"Invalidated {count} cache entries for user {user_id}")
+            return count
+        except Exception as e:
+            logger.error(f"Cache invalidation error: {e}")
             return 0
+
+    async def invalidate_tables(self, user_id: str, tables: Iterable[str]) -> int:
+        """Invalidate only the user's entries that read from `tables`"""
+        tables = list(tables)
+        try:
+            tags = [self._table_tag(table, user_id) for table in tables]
+            count = await self._invalidate_tags(user_id, tags)
+            if count:
+                logger.info(f"Invalidated {count} cache entries for user {user_id} "
+                            f"(tables: {', '.join(tables)})")
+            return count
         except Exception as e:
             logger.error(f"Cache invalidation error: {e}")
             return 0
-    
+
+    async def _invalidate_tags(self, user_id: str, tags: List[str]) -> int:
+        """Delete every key referenced by `tags`, then the tag sets themselves"""
+        if len(tags) == 1:
+            members = await self.redis.smembers(tags[0])
+        else:
+            members = await self.redis.sunion(tags)
+        keys = [self._decode(key) for key in members]
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if keys:
+                pipe.delete(*keys)
+                pipe.srem(self._user_tag(user_id), *keys)
+                for key in keys:
+                    self.local.delete(key)
+                    self._publish_invalidation(pipe, key)
+            pipe.delete(*tags)
+            # Lets derived caches keyed by data version drop stale entries
+            pipe.incr(self._version_key(user_id))
+            results = await pipe.execute()
+        # Again now that Redis no longer has the keys: a get_raw that
+        # started its read after the first delete may have read the old
+        # value, and our own pub/sub message is ignored by this worker
+        for key in keys:
+            self.local.delete(key)
+        return results[0] if keys else 0
+
+    # ============= L1 INVALIDATION =============
+
+    @staticmethod
+    def _decode(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _publish_invalidation(self, pipe, key: str) -> None:
+        """Queue a message telling the other workers to drop their L1 copy of `key`"""
+        pipe.publish(INVALIDATION_CHANNEL, f"{self.instance_id}|{key}")
+
+    def _handle_invalidation(self, message: str) -> None:
+        instance_id, _, key = message.partition("|")
+        if instance_id != self.instance_id:
+            self.local.delete(key)
+
+    async def _listen_for_invalidations(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self._handle_invalidation(self._decode(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Anything published while we were disconnected is lost,
+                # so start again from an empty L1
+                logger.error(f"Cache invalidation listener error: {e}")
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def start_invalidation_listener(self) -> None:
+        """Subscribe to L1 invalidation messages (one task per process)"""
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen_for_invalidations())
+
+    async def close(self) -> None:
+        """Stop the invalidation listener"""
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
     async def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
+        l1_lookups = self.stats["l1_hits"] + self.stats["l1_misses"]
+        local_stats = {
+            "l1": {
+                "hits": self.stats["l1_hits"],
+                "misses": self.stats["l1_misses"],
+                "hit_rate": self.stats["l1_hits"] / l1_lookups if l1_lookups else 0.0,
+                "entries": len(self.local),
+                "bytes": self.local.current_bytes
+            },
+            "l2": {
+                "hits": self.stats["l2_hits"],
+                "misses": self.stats["l2_misses"]
+            },
+            "single_flight": self.single_flight.get_stats(),
+            "serializer": self.serializer.format
+        }
         try:
             info = await self.redis.info()
             return {
                 "hits": info.get("keyspace_hits", 0),
                 "misses": info.get("keyspace_misses", 0),
                 "used_memory": info.get("used_memory_human", "0B"),
-                "connected_clients": info.get("connected_clients", 0)
+                "connected_clients": info.get("connected_clients", 0),
+                **local_stats
             }
         except Exception as e:
             logger.error(f"Error getting cache stats: {e}")
-            return {}
\ No newline at end of file
+            return local_stats
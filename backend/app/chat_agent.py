@@ -2,14 +2,59 @@
 Chat Agent Service
 Orchestrates the interaction between user, LLM and secure database operations
 """
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator, Callable, Awaitable
+import asyncio
+import httpx
 import json
-from datetime import datetime
+import os
+import time
+import weakref
+from datetime import date, timedelta
 from app.secure_operations import SecureDatabaseOperations, SecureOperationError
 from app.llm_integration import OpenRouterClient, UserLLMConfig
+from app.services.llm_router import LLMRouter
+from app.conversation_context import DEFAULT_CONVERSATION
 import re
 from loguru import logger
 
+BUDGET_EXCEEDED_MESSAGE = "Seu limite de gastos com IA foi atingido. Ajuste o orçamento nas configurações do modelo."
+
+# Operations of compound questions a single user may run at the same time
+CHAT_USER_CONCURRENCY = int(os.getenv("CHAT_USER_CONCURRENCY", "4"))
+
+# One semaphore per user with operations in flight; entries go away with the last holder
+_user_limits: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+
+def user_limit(user_id: str) -> asyncio.Semaphore:
+    """Semaphore shared by every request of the user in this process"""
+    limit = _user_limits.get(user_id)
+    if limit is None:
+        limit = asyncio.Semaphore(CHAT_USER_CONCURRENCY)
+        _user_limits[user_id] = limit
+    return limit
+
+SEARCH_LABELS = {'obra': 'Obra', 'fornecedor': 'Fornecedor', 'lancamento': 'Lançamento'}
+
+# Folds accented Portuguese letters so "concluída" and "concluida" match alike
+ACCENT_TABLE = str.maketrans('áàâãäéèêëíìîïóòôõöúùûüç', 'aaaaaeeeeiiiiooooouuuuc')
+
+# "buscar cimento", "procure por João Silva": the words after the verb
+SEARCH_TERM = re.compile(
+    r'(?:busca|buscar|busque|procur[ae]r?|pesquis[ae]r?)\s+(?:por\s+|pelo\s+|pela\s+)?(.+)',
+    re.IGNORECASE
+)
+
+def extract_search_term(message: str) -> str:
+    """What to look for in a search request (the whole message if no verb is found)"""
+    match = SEARCH_TERM.search(message)
+    return (match.group(1) if match else message).strip(" ?!.\"'")
+
+def normalize_message(message: str) -> str:
+    """Lowercase and strip accents before intent matching"""
+    message = message.lower()
+    # str.translate is comparatively slow, so skip it for plain ASCII input
+    return message if message.isascii() else message.translate(ACCENT_TABLE)
+
 class OperationMapping:
     """Maps natural language intents to secure operations"""
     
@@ -31,7 +76,8 @@ class OperationMapping:
             r'obras?\s+finalizadas?',
             r'obras?\s+conclu[ií]das?',
             r'projetos?\s+finalizados?'
-        ],        # Financial queries
+        ],
+        # Financial queries
         'get_custos_obra': [
             r'custos?\s+(?:da\s+)?obra',
             r'quanto\s+(?:já\s+)?gast[ou|ei]',
@@ -55,19 +101,112 @@ class OperationMapping:
             r'adicionar?\s+(?:um\s+)?(?:novo\s+)?fornecedor',
             r'novo\s+fornecedor',
             r'cadastrar?\s+fornecedor'
+        ],
+        # Free-text search, last so named listings win ("procurar obras ativas")
+        'search_all': [
+            r'busca\s+\S',
+            r'buscar\s+\S',
+            r'busque\s+\S',
+            r'procur[ae]r?\s+\S',
+            r'pesquis[ae]r?\s+\S'
         ]
     }
     
+    _matcher: Optional[re.Pattern] = None
+    _prefilter: Optional[re.Pattern] = None
+    _group_operations: Dict[str, Tuple[int, str]] = {}
+    
+    @staticmethod
+    def _literal_prefix(pattern: str) -> str:
+        """Leading letters every match of `pattern` must start with"""
+        prefix = ""
+        for index, char in enumerate(pattern):
+            if not char.isalpha():
+                break
+            if index + 1 < len(pattern) and pattern[index + 1] in "?*{":
+                break
+            prefix += char
+        return prefix
+    
+    @classmethod
+    def compile_patterns(cls) -> None:
+        """
+        Compile every pattern into a single alternation regex, built once at
+        import. Each operation is a named group, in priority order, so the
+        match found at a given position is the highest-priority operation
+        starting there. A literal prefilter built from the patterns' leading
+        words finds the candidate positions, so the full alternation only
+        runs where a match can start. Call again after changing
+        OPERATION_PATTERNS.
+        """
+        groups = []
+        group_operations = {}
+        prefixes = set()
+        for priority, (operation, patterns) in enumerate(cls.OPERATION_PATTERNS.items()):
+            name = f"op{priority}"
+            normalized = [pattern.translate(ACCENT_TABLE) for pattern in patterns]
+            groups.append(f"(?P<{name}>{'|'.join(f'(?:{pattern})' for pattern in normalized)})")
+            group_operations[name] = (priority, operation)
+            prefixes.update(cls._literal_prefix(pattern) for pattern in normalized)
+        cls._matcher = re.compile("|".join(groups))
+        cls._group_operations = group_operations
+        # Without a literal prefix for every pattern, scan with the matcher itself
+        cls._prefilter = None if "" in prefixes else re.compile(
+            "|".join(sorted(prefixes, key=len, reverse=True))
+        )
+    
     @classmethod
     def detect_operation(cls, message: str) -> Optional[str]:
         """Detect which operation the user wants based on message"""
-        message_lower = message.lower()
+        text = normalize_message(message)
+        scanner = cls._prefilter or cls._matcher
+        best = None
+        candidate = scanner.search(text)
+        while candidate:
+            start = candidate.start()
+            match = cls._matcher.match(text, start)
+            if match:
+                priority, operation = cls._group_operations[match.lastgroup]
+                if best is None or priority < best[0]:
+                    best = (priority, operation)
+                    if priority == 0:
+                        break
+            # Resume one character later rather than at the end of the match,
+            # so a lower-priority match cannot hide an overlapping better one
+            candidate = scanner.search(text, start + 1)
         
-        for operation, patterns in cls.OPERATION_PATTERNS.items():            for pattern in patterns:
-                if re.search(pattern, message_lower):
-                    return operation
+        return best[1] if best else None
+    
+    @classmethod
+    def detect_operations(cls, message: str) -> List[str]:
+        """
+        Every operation asked for in the message, in the order they appear
+        ("obras ativas e fornecedores" gives both). Where matches overlap,
+        the highest-priority one wins, as in detect_operation.
+        """
+        text = normalize_message(message)
+        scanner = cls._prefilter or cls._matcher
+        matches = []
+        candidate = scanner.search(text)
+        while candidate:
+            start = candidate.start()
+            match = cls._matcher.match(text, start)
+            if match:
+                priority, operation = cls._group_operations[match.lastgroup]
+                matches.append((priority, start, match.end(), operation))
+            candidate = scanner.search(text, start + 1)
         
-        return None
+        kept = []
+        for priority, start, end, operation in sorted(matches):
+            if all(end <= other[1] or start >= other[2] for other in kept):
+                kept.append((priority, start, end, operation))
+        operations = []
+        for _, _, _, operation in sorted(kept, key=lambda kept_match: kept_match[1]):
+            if operation not in operations:
+                operations.append(operation)
+        return operations
+
+OperationMapping.compile_patterns()
 
 class ChatAgent:
     """
@@ -77,54 +216,420 @@ class ChatAgent:
     def __init__(self, 
                  db_ops: SecureDatabaseOperations,
                  cache: 'CacheService',
-                 user_llm_config: UserLLMConfig):
+                 user_llm_config: UserLLMConfig,
+                 response_cache: Optional['LLMResponseCache'] = None,
+                 history: Optional['OperationHistory'] = None,
+                 conversations: Optional['ConversationStore'] = None):
         self.db_ops = db_ops
         self.cache = cache
+        self.response_cache = response_cache
+        self.config = user_llm_config
+        self.router = LLMRouter()
+        # Cached answers are scoped by model; routed answers share one scope
+        self.model = "auto" if user_llm_config.auto_routing else user_llm_config.preferred_model.value
         self.llm_client = OpenRouterClient(user_llm_config)
-        self.operation_history = []
+        self.history = history
+        self.conversations = conversations
         
-    async def process_message(self, user_id: str, message: str) -> Dict[str, Any]:
+    async def process_message(self, user_id: str, message: str,
+                              cursor: Optional[str] = None,
+                              raw: bool = False,
+                              conversation_id: str = DEFAULT_CONVERSATION) -> Dict[str, Any]:
         """
         Process user message and return appropriate response
+        List operations return one page; pass the previous response's
+        `data.next_cursor` with the same message to get the next one.
+        Questions naming several operations run them all concurrently (see
+        _run_operations); cursors only apply to single-operation questions.
+        
+        With raw=True a cache hit comes back as {"operation_performed",
+        "from_cache", "raw"}, where "raw" is the cached {"response", "data"}
+        object as JSON bytes, so the API can send it without re-encoding.
         """
-        logger.info(f"Processing message for user {user_id}: {message[:50]}...")
+        logger.info("Processing message for user {}: {}...", user_id, message[:50])
         
         try:
-            # 1. Detect operation from message
-            operation = OperationMapping.detect_operation(message)
+            # 1. Detect the operations asked for in the message
+            operations = OperationMapping.detect_operations(message)
             
-            if not operation:
+            if not operations:
                 # Use LLM for complex queries or when no pattern matches
-                return await self._handle_complex_query(user_id, message)            
-            # 2. Check cache first
-            cached_result = await self.cache.get(operation, user_id)
-            if cached_result:
-                logger.info(f"Returning cached result for {operation}")
-                return {
-                    "response": self._format_response(operation, cached_result),
-                    "operation_performed": operation,
-                    "data": cached_result,
-                    "from_cache": True
-                }
+                return await self._handle_complex_query(user_id, message, conversation_id=conversation_id)
             
-            # 3. Execute operation
-            result = await self._execute_operation(operation, user_id, message)
+            if len(operations) > 1:
+                return await self._run_operations(user_id, message, operations)
+            operation = operations[0]
             
-            # 4. Cache the result
-            if result and not isinstance(result, Exception):
-                await self.cache.set(operation, user_id, result)
+            # 2. Check cache first; each page is cached under its own key.
+            # Entries hold the formatted answer next to the data.
+            if raw:
+                params = self._cache_params(operation, message, cursor)
+                cached_raw = await self.cache.get_raw(operation, user_id, params)
+                # Only {"response", "data"} objects can be sent as-is; any
+                # other value under the key is handled as a miss
+                if cached_raw is not None and cached_raw.lstrip().startswith(b"{"):
+                    logger.info("Returning cached result for {}", operation)
+                    self._record_history(user_id, operation, message, True, from_cache=True)
+                    return {"operation_performed": operation, "from_cache": True, "raw": cached_raw}
             
-            # 5. Format response
-            response = self._format_response(operation, result)
+            # 3. Execute operation (or read it from the cache) and log it
+            entry = await self._run_operation(user_id, operation, message, cursor, check_cache=not raw)
             
-            # 6. Log operation
-            self.operation_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "user_id": user_id,
-                "operation": operation,
-                "message": message,
-                "success": not isinstance(result, Exception)
-            })
+            return {
+                "response": entry["response"],
+                "operation_performed": operation,
+                "data": entry["data"],
+                "from_cache": entry["from_cache"]
+            }
             
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
             return {
-                "response": response,
\ No newline at end of file
+                "response": "Desculpe, ocorreu um erro ao processar sua mensagem. Tente novamente.",
+                "operation_performed": None,
+                "data": None,
+                "error": str(e)
+            }
+    
+    async def stream_message(self, user_id: str, message: str,
+                             cursor: Optional[str] = None,
+                             conversation_id: str = DEFAULT_CONVERSATION) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_message.
+        Pre-defined operations yield a single "result" event; free-form
+        questions stream the LLM answer as "token" events and end with "done".
+        """
+        if OperationMapping.detect_operation(message):
+            yield {"type": "result", **await self.process_message(user_id, message, cursor)}
+            return
+        
+        started = time.perf_counter()
+        context = await self._load_context(user_id, conversation_id)
+        has_history = self._has_history(context)
+        cached = None if has_history else await self._cached_llm_answer(user_id, message)
+        if cached is not None:
+            yield {"type": "result", **await self._handle_complex_query(
+                user_id, message, cached, conversation_id, context
+            )}
+            return
+        
+        models = await self._select_models(user_id, message)
+        if not models:
+            yield {"type": "result", **self._budget_exceeded_response()}
+            return
+        
+        logger.info("Streaming LLM answer for user {}: {}...", user_id, message[:50])
+        available_operations = list(OperationMapping.OPERATION_PATTERNS.keys())
+        messages = [
+            *self.llm_client.create_secure_prompt(user_id, available_operations, structured=False),
+            *(self.conversations.history_messages(context) if has_history else []),
+            {"role": "user", "content": message}
+        ]
+        for index, model in enumerate(models):
+            tokens = []
+            try:
+                async for event in self.llm_client.stream_completion(messages, model):
+                    if event["type"] == "token":
+                        tokens.append(event["content"])
+                    elif event["type"] == "done":
+                        await self._record_spend(user_id, event)
+                        await self._remember_turn(user_id, conversation_id, context,
+                                                  message, "".join(tokens), event, started)
+                        if self.response_cache and not has_history:
+                            await self.response_cache.set(user_id, self.model, message, {
+                                "operation": None,
+                                "response": "".join(tokens),
+                                "tokens_used": event.get("tokens_used"),
+                                "model_used": event.get("model_used")
+                            }, time.perf_counter() - started)
+                    yield event
+                return
+            except httpx.HTTPError as e:
+                # Once tokens reached the client the answer can't be swapped
+                if tokens or index == len(models) - 1:
+                    raise
+                logger.warning(f"Model {model} failed ({e}), failing over to {models[index + 1]}")
+    
+    async def _cached_llm_answer(self, user_id: str, message: str) -> Optional[Dict[str, Any]]:
+        """Previous LLM answer for an equivalent question, if still valid"""
+        if not self.response_cache:
+            return None
+        cached = await self.response_cache.get(user_id, self.model, message)
+        if cached is not None:
+            logger.info("Returning cached LLM answer for user {}", user_id)
+        return cached
+    
+    async def _handle_complex_query(self, user_id: str, message: str,
+                                    llm_result: Optional[Dict[str, Any]] = None,
+                                    conversation_id: str = DEFAULT_CONVERSATION,
+                                    context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Handle queries that don't match a pre-defined pattern using the LLM
+        Earlier turns of the conversation are sent along; cached answers
+        are only used (and stored) for questions asked without history.
+        """
+        started = time.perf_counter()
+        if context is None:
+            context = await self._load_context(user_id, conversation_id)
+        has_history = self._has_history(context)
+        if llm_result is None and not has_history:
+            llm_result = await self._cached_llm_answer(user_id, message)
+        if llm_result is None:
+            models = await self._select_models(user_id, message)
+            if not models:
+                return self._budget_exceeded_response()
+            available_operations = list(OperationMapping.OPERATION_PATTERNS.keys())
+            history = self.conversations.history_messages(context) if has_history else None
+            llm_result = await self._with_failover(models, lambda model: self.llm_client.process_query(
+                message, user_id, available_operations, model, history
+            ))
+            await self._record_spend(user_id, llm_result)
+            if self.response_cache and not has_history:
+                await self.response_cache.set(
+                    user_id, self.model, message, llm_result, time.perf_counter() - started
+                )
+        
+        operation = llm_result.get("operation")
+        if operation in OperationMapping.OPERATION_PATTERNS:
+            result = await self._execute_operation(operation, user_id, message)
+            response = {
+                "response": self._format_response(operation, result),
+                "operation_performed": operation,
+                "data": result,
+                "tokens_used": llm_result.get("tokens_used"),
+                "model_used": llm_result.get("model_used")
+            }
+        else:
+            response = {
+                "response": llm_result.get("response", ""),
+                "operation_performed": None,
+                "data": None,
+                "tokens_used": llm_result.get("tokens_used"),
+                "model_used": llm_result.get("model_used")
+            }
+        await self._remember_turn(user_id, conversation_id, context,
+                                  message, response["response"], llm_result, started)
+        return response
+    
+    # ============= CONVERSATION CONTEXT =============
+    
+    async def _load_context(self, user_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+        if self.conversations is None:
+            return None
+        return await self.conversations.load(user_id, conversation_id)
+    
+    @staticmethod
+    def _has_history(context: Optional[Dict[str, Any]]) -> bool:
+        return bool(context and (context["turns"] or context["summary"]))
+    
+    async def _remember_turn(self, user_id: str, conversation_id: str,
+                             context: Optional[Dict[str, Any]], question: str, answer: str,
+                             llm_result: Dict[str, Any], started: float) -> None:
+        """Store the exchange in the conversation, with its prompt size and latency"""
+        if context is None:
+            return
+        stats = {
+            "model": llm_result.get("model_used"),
+            "prompt_tokens": llm_result.get("prompt_tokens"),
+            "cached_tokens": llm_result.get("cached_tokens"),
+            "history_tokens": self.conversations.history_tokens(context),
+            "latency_ms": round((time.perf_counter() - started) * 1000)
+        }
+        logger.info("Turn for user {} ({}): {} prompt tokens ({} cached), {} from history, {}ms",
+                    user_id, conversation_id, stats["prompt_tokens"], stats["cached_tokens"],
+                    stats["history_tokens"], stats["latency_ms"])
+        await self.conversations.append(user_id, conversation_id, context, question, answer, stats)
+    
+    async def _select_models(self, user_id: str, message: str) -> List[str]:
+        """
+        Models to try for a free-form question, in order.
+        Without auto routing this is just the preferred model; an empty list
+        means the user's spend caps leave no model affordable.
+        """
+        max_cost = self.config.max_cost_per_query
+        if self.config.daily_budget_usd:
+            remaining = self.config.daily_budget_usd - await self._get_spend(user_id)
+            if remaining <= 0:
+                return []
+            max_cost = remaining if max_cost is None else min(max_cost, remaining)
+        
+        if not self.config.auto_routing:
+            return [self.config.preferred_model.value]
+        
+        routing = self.router.route(message, self.config.max_latency_ms, max_cost)
+        logger.info("Routing for user {}: {} ({})", user_id, routing['models'], routing['reason'])
+        return routing["models"]
+    
+    async def _with_failover(self, models: List[str],
+                             call: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Call the LLM with each model in turn until one answers"""
+        for index, model in enumerate(models):
+            try:
+                return await call(model)
+            except httpx.HTTPError as e:
+                if index == len(models) - 1:
+                    raise
+                logger.warning(f"Model {model} failed ({e}), failing over to {models[index + 1]}")
+    
+    @staticmethod
+    def _spend_key(user_id: str) -> str:
+        return f"llm_spend:{user_id}:{date.today().isoformat()}"
+    
+    async def _get_spend(self, user_id: str) -> float:
+        """USD spent on LLM calls by the user today"""
+        try:
+            return float(await self.cache.redis.get(self._spend_key(user_id)) or 0)
+        except Exception as e:
+            logger.error(f"Error reading LLM spend: {e}")
+            return 0.0
+    
+    async def _record_spend(self, user_id: str, llm_result: Dict[str, Any]) -> None:
+        """Add the cost of an answer to today's spend, when the user set a budget"""
+        if not self.config.daily_budget_usd or not llm_result.get("tokens_used"):
+            return
+        cost = self.router.cost_for_tokens(llm_result.get("model_used"), llm_result["tokens_used"])
+        try:
+            async with self.cache.redis.pipeline(transaction=False) as pipe:
+                pipe.incrbyfloat(self._spend_key(user_id), cost)
+                pipe.expire(self._spend_key(user_id), int(timedelta(days=2).total_seconds()))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording LLM spend: {e}")
+    
+    @staticmethod
+    def _budget_exceeded_response() -> Dict[str, Any]:
+        return {
+            "response": BUDGET_EXCEEDED_MESSAGE,
+            "operation_performed": None,
+            "data": None
+        }
+    
+    def _record_history(self, user_id: str, operation: str, message: str,
+                        success: bool, from_cache: bool = False) -> None:
+        """Queue the operation in the shared history (written in the background)"""
+        if self.history is not None:
+            self.history.record(user_id, operation, message, success, from_cache)
+    
+    @staticmethod
+    def _cache_params(operation: str, message: str, cursor: Optional[str]) -> Optional[Dict[str, str]]:
+        """What besides operation and user tells cache entries apart"""
+        params = {"cursor": cursor} if cursor else {}
+        if operation == 'search_all':
+            params["q"] = extract_search_term(message).lower()
+        return params or None
+    
+    async def _run_operation(self, user_id: str, operation: str, message: str,
+                             cursor: Optional[str] = None, check_cache: bool = True) -> Dict[str, Any]:
+        """
+        Answer one operation from the cache, or execute, format and cache it.
+        Concurrent misses for the same operation/user share a single execution.
+        Returns {"response", "data", "success", "from_cache"}.
+        """
+        params = self._cache_params(operation, message, cursor)
+        if check_cache:
+            cached_entry = await self.cache.get(operation, user_id, params)
+            if cached_entry is not None:
+                logger.info("Returning cached result for {}", operation)
+                self._record_history(user_id, operation, message, True, from_cache=True)
+                return {**cached_entry, "success": True, "from_cache": True}
+        
+        async def fetch():
+            result = await self._execute_operation(operation, user_id, message, cursor)
+            failed = isinstance(result, Exception)
+            entry = {
+                "response": self._format_response(operation, result),
+                "data": None if failed else result
+            }
+            if result and not failed:
+                await self.cache.set(operation, user_id, entry, params)
+            return {**entry, "success": not failed}
+        
+        entry = await self.cache.coalesce(operation, user_id, fetch, params)
+        self._record_history(user_id, operation, message, entry.get("success", True))
+        return {**entry, "from_cache": False}
+    
+    async def _run_operations(self, user_id: str, message: str, operations: List[str]) -> Dict[str, Any]:
+        """
+        Run the operations of a compound question concurrently, at most
+        CHAT_USER_CONCURRENCY at a time per user, and merge the answers.
+        Each operation is cached under its own key, as if asked alone;
+        list operations return their first page ("data" maps operation
+        to result).
+        """
+        limit = user_limit(user_id)
+        
+        async def run(operation: str) -> Dict[str, Any]:
+            async with limit:
+                return await self._run_operation(user_id, operation, message)
+        
+        entries = await asyncio.gather(*(run(operation) for operation in operations))
+        return {
+            "response": "\n\n".join(entry["response"] for entry in entries),
+            "operation_performed": ", ".join(operations),
+            "operations_performed": operations,
+            "data": {operation: entry["data"] for operation, entry in zip(operations, entries)},
+            "from_cache": all(entry["from_cache"] for entry in entries)
+        }
+    
+    async def _execute_operation(self, operation: str, user_id: str, message: str,
+                                 cursor: Optional[str] = None) -> Any:
+        """Execute a pre-defined secure operation"""
+        try:
+            if operation == 'get_obras_ativas':
+                return await self.db_ops.get_obras_by_status(user_id, 'Em andamento', cursor)
+            elif operation == 'get_obras_todas':
+                return await self.db_ops.get_all_obras(user_id, cursor)
+            elif operation == 'get_obras_finalizadas':
+                return await self.db_ops.get_obras_by_status(user_id, 'Finalizada', cursor)
+            elif operation == 'get_custos_obra':
+                return await self.db_ops.get_custos_obras(user_id)
+            elif operation == 'get_fornecedores':
+                return await self.db_ops.get_fornecedores(user_id, cursor)
+            elif operation == 'search_all':
+                return await self.db_ops.search(user_id, extract_search_term(message), cursor)
+            elif operation in ('create_obra', 'create_fornecedor'):
+                # Creation needs structured data, collected by the frontend forms
+                return None
+            return None
+        except SecureOperationError as e:
+            logger.error(f"Secure operation {operation} failed: {e}")
+            return e
+    
+    def _format_response(self, operation: str, result: Any) -> str:
+        """Format operation result as a natural language response"""
+        if isinstance(result, Exception):
+            return f"Não foi possível concluir a operação: {result}"
+        
+        if operation == 'create_obra':
+            return "Para criar uma nova obra, informe nome, responsável e cliente no formulário de cadastro."
+        if operation == 'create_fornecedor':
+            return "Para cadastrar um novo fornecedor, informe nome, CNPJ e contato no formulário de cadastro."
+        
+        # List operations return a page: {"items": [...], "next_cursor": ...}
+        more = ""
+        if isinstance(result, dict) and "items" in result:
+            if result.get("next_cursor"):
+                more = "\n\nHá mais resultados - carregue a próxima página para ver."
+            result = result["items"]
+        
+        if not result:
+            return "Nenhum registro encontrado."
+        
+        if operation == 'search_all':
+            lines = [
+                f"- {SEARCH_LABELS.get(item.get('tipo'), item.get('tipo'))}: {item.get('titulo')}"
+                + (f" ({item['detalhe']})" if item.get('detalhe') else "")
+                for item in result
+            ]
+            return f"Encontrei {len(result)} resultado(s):\n" + "\n".join(lines) + more
+        if operation.startswith('get_obras'):
+            lines = [f"- {obra.get('nome')} ({obra.get('status')})" for obra in result]
+            return f"Encontrei {len(result)} obra(s):\n" + "\n".join(lines) + more
+        if operation == 'get_fornecedores':
+            lines = [f"- {fornecedor.get('nome')}" for fornecedor in result]
+            return f"Encontrei {len(result)} fornecedor(es):\n" + "\n".join(lines) + more
+        if operation == 'get_custos_obra':
+            lines = [f"- {item.get('nome')}: R$ {item.get('gasto_total', 0):,.2f}" for item in result]
+            return "Custos por obra:\n" + "\n".join(lines)
+        
+        return json.dumps(result, ensure_ascii=False, default=str)
@@ -0,0 +1,136 @@
+"""
+Conversation Context Module
+Per-conversation LLM history in Redis, compacted to a fixed token budget
+"""
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+import redis.asyncio as redis
+from loguru import logger
+from app.services.token_counter import TokenCounter, get_token_counter
+
+# Tokens of history (summary + turns) sent along with each question
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "2000"))
+# Share of the budget the summary of dropped turns may use
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+# Longer answers are cut before being stored as context
+CONTEXT_MAX_TURN_TOKENS = int(os.getenv("CONTEXT_MAX_TURN_TOKENS", "600"))
+CONTEXT_TTL = int(os.getenv("CONTEXT_TTL", "86400"))
+CONTEXT_TURN_STATS = 20
+
+DEFAULT_CONVERSATION = "default"
+CONVERSATION_ID = re.compile(r"^[\w-]{1,64}$")
+SUMMARY_HEADER = "Resumo da conversa até aqui:"
+
+class ConversationStore:
+    """
+    Stores each conversation as one JSON document:
+    {"summary": str, "summary_tokens": int, "turns": [...], "stats": [...]}
+
+    Turns carry their token count, so compaction never re-tokenizes.
+    After each turn, the oldest turns are folded into the summary until
+    summary + turns fit in `max_tokens`. The summary keeps a short line per
+    dropped exchange and loses its oldest lines past `summary_tokens`.
+    That is extractive and costs no extra LLM call. The summary is sent as
+    a second system message, so the system prompt stays an identical
+    prefix across turns. Concurrent turns in the same conversation are
+    last-write-wins.
+    """
+
+    def __init__(self, redis_client: redis.Redis,
+                 counter: Optional[TokenCounter] = None,
+                 max_tokens: int = CONTEXT_MAX_TOKENS,
+                 summary_tokens: int = CONTEXT_SUMMARY_TOKENS,
+                 max_turn_tokens: int = CONTEXT_MAX_TURN_TOKENS,
+                 ttl: int = CONTEXT_TTL):
+        self.redis = redis_client
+        self.counter = counter or get_token_counter()
+        self.max_tokens = max_tokens
+        self.summary_tokens = min(summary_tokens, max_tokens)
+        self.max_turn_tokens = max_turn_tokens
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: str, conversation_id: str) -> str:
+        return f"conversation:{user_id}:{conversation_id}"
+
+    @staticmethod
+    def _empty() -> Dict[str, Any]:
+        return {"summary": "", "summary_tokens": 0, "turns": [], "stats": []}
+
+    async def load(self, user_id: str, conversation_id: str = DEFAULT_CONVERSATION) -> Dict[str, Any]:
+        """The stored context, or an empty one (also when Redis fails)"""
+        try:
+            stored = await self.redis.get(self._key(user_id, conversation_id))
+            return json.loads(stored) if stored else self._empty()
+        except Exception as e:
+            logger.error(f"Conversation context load error: {e}")
+            return self._empty()
+
+    def history_messages(self, context: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Messages to place between the system prompt and the new question"""
+        messages = []
+        if context["summary"]:
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{context['summary']}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in context["turns"])
+        return messages
+
+    def history_tokens(self, context: Dict[str, Any]) -> int:
+        return context["summary_tokens"] + sum(turn["tokens"] for turn in context["turns"])
+
+    async def append(self, user_id: str, conversation_id: str, context: Dict[str, Any],
+                     question: str, answer: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a question/answer pair, compact to the budget and save"""
+        for role, content in (("user", question), ("assistant", answer)):
+            content, tokens = self._truncate(content or "")
+            context["turns"].append({"role": role, "content": content, "tokens": tokens})
+        self._compact(context)
+
+        context["stats"] = (context["stats"] + [{**stats, "timestamp": time.time()}])[-CONTEXT_TURN_STATS:]
+        try:
+            await self.redis.setex(self._key(user_id, conversation_id), self.ttl,
+                                   json.dumps(context, ensure_ascii=False))
+        except Exception as e:
+            logger.error(f"Conversation context save error: {e}")
+        return context
+
+    async def clear(self, user_id: str, conversation_id: str = DEFAULT_CONVERSATION) -> None:
+        await self.redis.delete(self._key(user_id, conversation_id))
+
+    def _truncate(self, content: str):
+        tokens = self.counter.count(content)
+        if tokens <= self.max_turn_tokens:
+            return content, tokens
+        # Proportional cut, then re-count what is left
+        content = content[:int(len(content) * self.max_turn_tokens / tokens)] + " [...]"
+        return content, self.counter.count(content)
+
+    def _compact(self, context: Dict[str, Any]) -> None:
+        turns = context["turns"]
+        turn_tokens = sum(turn["tokens"] for turn in turns)
+        if turn_tokens + context["summary_tokens"] <= self.max_tokens:
+            return
+
+        # Drop whole exchanges, oldest first, leaving room for the summary;
+        # the newest exchange stays even if it alone is over budget
+        dropped = []
+        while len(turns) > 2 and turn_tokens > self.max_tokens - self.summary_tokens:
+            for turn in (turns.pop(0), turns.pop(0)):
+                turn_tokens -= turn["tokens"]
+                dropped.append(turn)
+
+        lines = context["summary"].splitlines() if context["summary"] else []
+        lines.extend(self._summary_line(turn) for turn in dropped)
+        budget = min(self.summary_tokens, max(0, self.max_tokens - turn_tokens))
+        while lines and self.counter.count("\n".join(lines)) > budget:
+            lines.pop(0)
+        context["summary"] = "\n".join(lines)
+        context["summary_tokens"] = self.counter.count(context["summary"])
+
+    @staticmethod
+    def _summary_line(turn: Dict[str, Any]) -> str:
+        speaker = "Usuário" if turn["role"] == "user" else "Assistente"
+        text = " ".join(turn["content"].split())
+        return f"- {speaker}: {text[:120]}{'...' if len(text) > 120 else ''}"
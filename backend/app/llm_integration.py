@@ -4,11 +4,33 @@ Allows users to choose their preferred LLM and use their own API key
 """
 import httpx
 import json
-from typing import Dict, List, Optional, Any
+import os
+import time
+from typing import Dict, List, Optional, Any, AsyncIterator
 from pydantic import BaseModel, Field
 from enum import Enum
 import asyncio
 from loguru import logger
+from app.monitoring import (
+    llm_connect_duration, llm_time_to_first_byte, llm_time_to_first_token, llm_prompt_tokens, track_llm
+)
+from app.services.llm_router import get_model_health
+from app.services.prompt_templates import prompt_registry
+from app.services.token_counter import get_token_counter
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Connection pool and retry settings for OpenRouter calls
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+
+# Status codes worth retrying: rate limiting and transient upstream errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
 class LLMProvider(str, Enum):
     """Supported LLM providers via OpenRouter"""
@@ -29,38 +51,295 @@ class UserLLMConfig(BaseModel):
     preferred_model: LLMProvider = Field(default=LLMProvider.GPT_35_TURBO)
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     max_tokens: Optional[int] = Field(default=2000)
+    auto_routing: bool = Field(default=False, description="Let LLMRouter pick the model per query")
+    max_latency_ms: Optional[int] = Field(default=None, ge=100, description="p95 latency cap for auto routing")
+    max_cost_per_query: Optional[float] = Field(default=None, gt=0, description="USD cap per query")
+    daily_budget_usd: Optional[float] = Field(default=None, gt=0, description="USD cap per day")
+
+class LLMHTTPPool:
+    """
+    Process-wide pooled HTTP/2 client for OpenRouter.
+
+    The Authorization header is sent per request, so a single connection
+    pool serves every user's API key and TLS sessions are reused across
+    chat requests. Created and closed by the FastAPI lifespan.
+    """
+
+    def __init__(self,
+                 max_connections: int = LLM_POOL_MAX_CONNECTIONS,
+                 max_keepalive: int = LLM_POOL_MAX_KEEPALIVE,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 retry_backoff: float = LLM_RETRY_BACKOFF,
+                 http2: bool = True):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+
+    async def post(self, url: str, headers: Dict[str, str], payload: Dict[str, Any],
+                   model: str, stream: bool = False) -> httpx.Response:
+        """
+        POST with retry/backoff, recording connect time and time to first byte.
+        With stream=True the body is left unread and the caller must close
+        the response; only failures before the response headers are retried.
+        """
+        for attempt in range(self.max_retries + 1):
+            timings: Dict[str, float] = {}
+
+            async def trace(event_name: str, info: Dict[str, Any]) -> None:
+                if event_name == "connection.connect_tcp.started":
+                    timings["connect_started"] = time.perf_counter()
+                elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                    timings["connected"] = time.perf_counter()
+                elif event_name.endswith("send_request_headers.started"):
+                    timings["request_sent"] = time.perf_counter()
+                elif event_name.endswith("receive_response_headers.complete"):
+                    timings["first_byte"] = time.perf_counter()
+
+            try:
+                request = self.client.build_request(
+                    "POST", url, headers=headers, json=payload, extensions={"trace": trace}
+                )
+                response = await self.client.send(request, stream=stream)
+                self._observe(model, timings)
+                if response.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    return response
+                if stream:
+                    await response.aclose()
+                logger.warning(f"OpenRouter returned {response.status_code}, retrying ({attempt + 1}/{self.max_retries})")
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"OpenRouter connection error: {e}, retrying ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+
+    @staticmethod
+    def _observe(model: str, timings: Dict[str, float]) -> None:
+        if "connect_started" in timings and "connected" in timings:
+            llm_connect_duration.labels(model=model).observe(
+                timings["connected"] - timings["connect_started"]
+            )
+        else:
+            # Reused keep-alive connection
+            llm_connect_duration.labels(model=model).observe(0)
+        if "request_sent" in timings and "first_byte" in timings:
+            llm_time_to_first_byte.labels(model=model).observe(
+                timings["first_byte"] - timings["request_sent"]
+            )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+_http_pool: Optional[LLMHTTPPool] = None
+
+def set_http_pool(pool: Optional[LLMHTTPPool]) -> None:
+    """Install the process-wide pool (called from the FastAPI lifespan)"""
+    global _http_pool
+    _http_pool = pool
+
+def get_http_pool() -> LLMHTTPPool:
+    """Return the process-wide pool, creating one outside the app lifespan"""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = LLMHTTPPool()
+    return _http_pool
+
+def observe_prompt_tokens(model: str, messages: List[Dict[str, str]], actual: Optional[int]) -> None:
+    """Track prompt size and correct the token counter with the provider's count"""
+    counter = get_token_counter()
+    counter.calibrate(model, messages, actual)
+    llm_prompt_tokens.labels(model=model).observe(actual or counter.count_messages(messages, model))
+
+def cached_tokens(usage: Dict[str, Any]) -> Optional[int]:
+    """Prompt tokens the provider served from its prompt cache (OpenRouter usage)"""
+    return (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+
+def with_cache_breakpoint(messages: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    """
+    OpenAI, DeepSeek and Gemini cache repeated prompt prefixes on their own;
+    Anthropic models only cache up to an explicit cache_control breakpoint,
+    placed here at the end of the static system prefix.
+    """
+    if not model.startswith("anthropic/") or not messages or messages[0]["role"] != "system":
+        return messages
+    first = {
+        "role": "system",
+        "content": [{"type": "text", "text": messages[0]["content"],
+                     "cache_control": {"type": "ephemeral"}}]
+    }
+    return [first, *messages[1:]]
+
 class OpenRouterClient:
     """
     OpenRouter client for LLM interactions
     Implements secure prompt engineering based on Gemini recommendations
     """
     
-    def __init__(self, config: UserLLMConfig):
+    def __init__(self, config: UserLLMConfig, http_pool: Optional[LLMHTTPPool] = None):
         self.config = config
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.http_pool = http_pool or get_http_pool()
+        self.base_url = OPENROUTER_URL
         self.headers = {
             "Authorization": f"Bearer {config.openrouter_api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "https://gestao-obras-ai.com",
-            "X-Title": "Agente IA Gestão de Obras"
+            "X-Title": "Agente IA Gestao de Obras"  # header values must be ASCII
+        }
+        
+    def create_secure_prompt(self, user_id: str, available_operations: List[str],
+                             structured: bool = True) -> List[Dict[str, str]]:
+        """
+        System messages that prevent SQL injection and ensure data isolation:
+        the shared prefix (same bytes for every user, so providers can reuse
+        their prompt cache) followed by the user's own context.
+        With structured=False the model answers in plain text, for streaming
+        """
+        template = prompt_registry.get("operations_json" if structured else "answer_text")
+        return template.messages(tuple(available_operations), user_id)
+    
+    @track_llm
+    async def chat_completion(self, messages: List[Dict[str, str]],
+                              model: Optional[str] = None) -> Dict[str, Any]:
+        """Send a chat completion request to OpenRouter (default: the user's preferred model)"""
+        model = model or self.config.preferred_model.value
+        payload = {
+            "model": model,
+            "messages": with_cache_breakpoint(messages, model),
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+            "usage": {"include": True}
+        }
+        
+        started = time.perf_counter()
+        try:
+            response = await self.http_pool.post(self.base_url, self.headers, payload, model)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            get_model_health().record_error(model)
+            logger.error(f"OpenRouter request failed: {e}")
+            raise
+        get_model_health().record_success(model, time.perf_counter() - started)
+        
+        usage = data.get("usage", {})
+        observe_prompt_tokens(model, messages, usage.get("prompt_tokens"))
+        return {
+            "content": data["choices"][0]["message"]["content"],
+            "tokens_used": usage.get("total_tokens"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_tokens": cached_tokens(usage),
+            "completion_tokens": usage.get("completion_tokens"),
+            "model_used": data.get("model", model)
+        }
+    
+    @track_llm
+    async def stream_completion(self, messages: List[Dict[str, str]],
+                                model: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat completion from OpenRouter (`stream: true`).
+        Yields {"type": "token", "content": ...} per delta and a final
+        {"type": "done", ...} event with usage and time to first token.
+        """
+        model = model or self.config.preferred_model.value
+        payload = {
+            "model": model,
+            "messages": with_cache_breakpoint(messages, model),
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+            "stream": True,
+            "usage": {"include": True}
         }
         
-    async def create_secure_prompt(self, user_message: str, user_id: str, available_operations: List[str]) -> str:
+        started = time.perf_counter()
+        ttft = None
+        usage: Dict[str, Any] = {}
+        model_used = model
+        try:
+            response = await self.http_pool.post(self.base_url, self.headers, payload, model, stream=True)
+        except httpx.HTTPError:
+            get_model_health().record_error(model)
+            raise
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # Skips blank separators and keep-alive comments (": OPENROUTER PROCESSING")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                model_used = chunk.get("model", model_used)
+                choices = chunk.get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                        llm_time_to_first_token.labels(model=model).observe(ttft)
+                    yield {"type": "token", "content": content}
+        except httpx.HTTPError as e:
+            get_model_health().record_error(model)
+            logger.error(f"OpenRouter stream failed: {e}")
+            raise
+        finally:
+            await response.aclose()
+        get_model_health().record_success(model, time.perf_counter() - started)
+        observe_prompt_tokens(model, messages, usage.get("prompt_tokens"))
+        
+        yield {
+            "type": "done",
+            "tokens_used": usage.get("total_tokens"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "cached_tokens": cached_tokens(usage),
+            "completion_tokens": usage.get("completion_tokens"),
+            "model_used": model_used,
+            "time_to_first_token": ttft
+        }
+    
+    async def process_query(self, user_message: str, user_id: str,
+                            available_operations: List[str],
+                            model: Optional[str] = None,
+                            history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """
-        Create a secure prompt that prevents SQL injection and ensures data isolation
+        Ask the LLM to pick an operation (or answer directly) for a message
+        `history` (see ConversationStore.history_messages) goes between the
+        system prompt and the question
         """
-        system_prompt = f"""Você é um assistente especializado em gestão de obras da construção civil.
+        completion = await self.chat_completion([
+            *self.create_secure_prompt(user_id, available_operations),
+            *(history or []),
+            {"role": "user", "content": user_message}
+        ], model)
         
-REGRAS CRÍTICAS DE SEGURANÇA:
-1. Você NUNCA gera SQL diretamente
-2. Você só pode usar as operações pré-definidas listadas abaixo
-3. O user_id '{user_id}' já está automaticamente aplicado em todas as operações
-4. NUNCA tente acessar dados de outros usuários
-5. Se não houver operação adequada, informe educadamente que não é possível
-
-OPERAÇÕES DISPONÍVEIS:
-{chr(10).join(f'- {op}' for op in available_operations)}
-
-FORMATO DE RESPOSTA:
-{{
-    "operation": "nome_da_operacao",
\ No newline at end of file
+        parsed = self._parse_response(completion["content"])
+        return {
+            "operation": parsed.get("operation"),
+            "parameters": parsed.get("parameters", {}),
+            "response": parsed.get("response", completion["content"]),
+            "tokens_used": completion["tokens_used"],
+            "prompt_tokens": completion["prompt_tokens"],
+            "cached_tokens": completion["cached_tokens"],
+            "model_used": completion["model_used"]
+        }
+    
+    @staticmethod
+    def _parse_response(content: str) -> Dict[str, Any]:
+        """Extract the JSON object from the LLM answer, if there is one"""
+        start, end = content.find("{"), content.rfind("}")
+        if start == -1 or end == -1:
+            return {"response": content}
+        try:
+            return json.loads(content[start:end + 1])
+        except json.JSONDecodeError:
+            return {"response": content}
@@ -2,23 +2,42 @@
 Main FastAPI Application
 Implements secure architecture based on Gemini 2.0 Pro analysis
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+import json
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from jose import jwt, JWTError
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import redis.asyncio as redis
 from loguru import logger
 from contextlib import asynccontextmanager
 
 # Import our modules
-from app.secure_operations import SecureDatabaseOperations, ObraCreate
-from app.llm_integration import OpenRouterClient, UserLLMConfig, LLMProvider
+from app.secure_operations import (
+    SecureDatabaseOperations, SecureOperationError, ObraCreate, IMPORT_MODELS, IMPORT_MAX_BATCH_SIZE
+)
+from app.bulk_import import iter_upload_rows
+from app.llm_integration import (
+    OpenRouterClient, UserLLMConfig, LLMProvider, LLMHTTPPool, set_http_pool
+)
+from app.cache_service import CacheService
+from app.serialization import merge_json
+from app.chat_agent import ChatAgent
+from app.services.response_cache import LLMResponseCache
+from app.operation_history import OperationHistory, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from app.conversation_context import ConversationStore, DEFAULT_CONVERSATION, CONVERSATION_ID
+from app.services.token_counter import get_token_counter
+from app.services.llm_router import get_model_health
+from app.monitoring import (
+    PrometheusMiddleware, generate_metrics, mark_process_dead, configure_logging, LOG_FILE_PATH
+)
+from prometheus_client import CONTENT_TYPE_LATEST
 
 load_dotenv()
 
@@ -28,20 +47,59 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-this")
-# Redis client for caching
+CACHE_L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "1000"))
+CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", str(16 * 1024 * 1024)))
+# Word-set similarity for reusing cached LLM answers (0 = exact matches only)
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0")) or None
+ENABLE_METRICS = os.getenv("ENABLE_METRICS", "true").lower() == "true"
+# Users allowed to read everyone's operation history (comma-separated ids)
+OPERATOR_USER_IDS = {uid.strip() for uid in os.getenv("OPERATOR_USER_IDS", "").split(",") if uid.strip()}
+
+# Redis clients: text for app data, binary for serialized cache entries
 redis_client = None
+cache_redis = None
+cache_service: Optional[CacheService] = None
+db_ops: Optional[SecureDatabaseOperations] = None
+response_cache: Optional[LLMResponseCache] = None
+operation_history: Optional[OperationHistory] = None
+conversation_store: Optional[ConversationStore] = None
+llm_http_pool: Optional[LLMHTTPPool] = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
-    global redis_client
+    global redis_client, cache_redis, cache_service, db_ops, llm_http_pool
+    global response_cache, operation_history, conversation_store
     # Startup
+    configure_logging(LOG_FILE_PATH)
     redis_client = await redis.from_url(REDIS_URL, decode_responses=True)
+    cache_redis = await redis.from_url(REDIS_URL)
     logger.info("Connected to Redis")
+    cache_service = CacheService(
+        cache_redis,
+        l1_max_entries=CACHE_L1_MAX_ENTRIES,
+        l1_max_bytes=CACHE_L1_MAX_BYTES
+    )
+    await cache_service.start_invalidation_listener()
+    db_ops = SecureDatabaseOperations(supabase, cache=cache_service)
+    response_cache = LLMResponseCache(redis_client, cache_service,
+                                      similarity_threshold=LLM_CACHE_SIMILARITY)
+    operation_history = OperationHistory(redis_client)
+    await operation_history.start()
+    conversation_store = ConversationStore(redis_client)
+    llm_http_pool = LLMHTTPPool()
+    set_http_pool(llm_http_pool)
     yield
     # Shutdown
+    await llm_http_pool.close()
+    set_http_pool(None)
+    db_ops.close()
+    await cache_service.close()
+    await operation_history.close()
+    await cache_redis.close()
     await redis_client.close()
     logger.info("Disconnected from Redis")
+    mark_process_dead()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -59,6 +117,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if ENABLE_METRICS:
+    app.add_middleware(PrometheusMiddleware)
 # Security
 security = HTTPBearer()
 
@@ -74,14 +134,22 @@ class LLMConfigRequest(BaseModel):
     openrouter_api_key: str = Field(..., description="OpenRouter API key")
     preferred_model: LLMProvider = Field(default=LLMProvider.GPT_35_TURBO)
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
+    auto_routing: bool = Field(default=False, description="Escolher o modelo por consulta")
+    max_latency_ms: Optional[int] = Field(default=None, ge=100, description="Latência p95 máxima")
+    max_cost_per_query: Optional[float] = Field(default=None, gt=0, description="Custo máximo por consulta (USD)")
+    daily_budget_usd: Optional[float] = Field(default=None, gt=0, description="Orçamento diário (USD)")
 
 class ChatMessage(BaseModel):
     message: str = Field(..., description="User message")
+    cursor: Optional[str] = Field(default=None, description="data.next_cursor of the previous page")
+    conversation_id: str = Field(default=DEFAULT_CONVERSATION, pattern=CONVERSATION_ID.pattern,
+                                 description="Earlier turns of this conversation are sent to the LLM")
 
 class ChatResponse(BaseModel):
     response: str
     operation_performed: Optional[str] = None
-    data: Optional[Dict[str, Any]] = None
+    operations_performed: Optional[List[str]] = None
+    data: Optional[Any] = None
     tokens_used: Optional[int] = None
     model_used: Optional[str] = None
 
@@ -89,4 +157,237 @@ class ChatResponse(BaseModel):
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
     """Validate JWT token and return user info"""
     token = credentials.credentials
-    try:
\ No newline at end of file
+    try:
+        payload = jwt.decode(
+            token,
+            JWT_SECRET,
+            algorithms=["HS256"],
+            audience="authenticated"
+        )
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token inválido"
+            )
+        return {"id": user_id, "email": payload.get("email")}
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido ou expirado"
+        )
+
+async def get_user_llm_config(user_id: str) -> UserLLMConfig:
+    """Load the LLM configuration saved by the user"""
+    stored = await redis_client.get(f"llm_config:{user_id}")
+    if not stored:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Configure seu modelo de IA primeiro"
+        )
+    return UserLLMConfig(**json.loads(stored))
+
+# ============= ROUTES =============
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (all workers in multiprocess mode)"""
+    if not ENABLE_METRICS:
+        raise HTTPException(status_code=404)
+    return Response(content=generate_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/api/auth/login")
+async def login(credentials: UserLogin):
+    """Authenticate with Supabase and return the session tokens"""
+    try:
+        auth_response = supabase.auth.sign_in_with_password({
+            "email": credentials.email,
+            "password": credentials.password
+        })
+        return {
+            "access_token": auth_response.session.access_token,
+            "refresh_token": auth_response.session.refresh_token,
+            "token_type": "bearer",
+            "user": {"id": auth_response.user.id, "email": auth_response.user.email}
+        }
+    except Exception as e:
+        logger.error(f"Login failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciais inválidas"
+        )
+
+@app.post("/api/llm/config")
+async def save_llm_config(config: LLMConfigRequest, user: Dict = Depends(get_current_user)):
+    """Store the user's LLM model and OpenRouter key for this session"""
+    await redis_client.setex(
+        f"llm_config:{user['id']}",
+        int(timedelta(hours=24).total_seconds()),
+        config.model_dump_json()
+    )
+    return {"message": "Configuração salva com sucesso"}
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(chat_message: ChatMessage, user: Dict = Depends(get_current_user)):
+    """Process a chat message with the user's configured LLM"""
+    llm_config = await get_user_llm_config(user["id"])
+    agent = ChatAgent(db_ops, cache_service, llm_config, response_cache,
+                      operation_history, conversation_store)
+    result = await agent.process_message(user["id"], chat_message.message,
+                                         chat_message.cursor, raw=True,
+                                         conversation_id=chat_message.conversation_id)
+    if "raw" in result:
+        # Cache hit: send the stored JSON as-is instead of decoding and re-encoding it
+        body = merge_json({
+            "operation_performed": result["operation_performed"],
+            "tokens_used": None,
+            "model_used": None
+        }, result["raw"])
+        return Response(content=body, media_type="application/json")
+    return ChatResponse(**result)
+
+@app.post("/api/chat/stream")
+async def chat_stream(chat_message: ChatMessage, user: Dict = Depends(get_current_user)):
+    """Process a chat message, relaying LLM tokens as Server-Sent Events"""
+    llm_config = await get_user_llm_config(user["id"])
+    agent = ChatAgent(db_ops, cache_service, llm_config, response_cache,
+                      operation_history, conversation_store)
+    
+    async def event_stream():
+        try:
+            async for event in agent.stream_message(user["id"], chat_message.message,
+                                                    chat_message.cursor,
+                                                    chat_message.conversation_id):
+                event_type = event.pop("type")
+                yield f"event: {event_type}\ndata: {json.dumps(event, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Streaming chat failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': 'Erro ao gerar resposta'})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so tokens reach the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/obras")
+async def create_obra(obra: ObraCreate, user: Dict = Depends(get_current_user)):
+    """Create a new obra for the authenticated user"""
+    try:
+        return await db_ops.create_obra(user["id"], obra)
+    except SecureOperationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.get("/api/obras/dashboards")
+async def obras_dashboards(ids: List[str] = Query(...), user: Dict = Depends(get_current_user)):
+    """Dashboards of several obras in one request (?ids=...&ids=...), keyed by obra id"""
+    try:
+        return await db_ops.get_obras_dashboards(user["id"], ids)
+    except SecureOperationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.get("/api/fluxo-caixa")
+async def fluxo_caixa(inicio: Optional[date] = None,
+                      fim: Optional[date] = None,
+                      granularidade: str = "month",
+                      obra_id: Optional[str] = None,
+                      user: Dict = Depends(get_current_user)):
+    """Cash flow per week, month or quarter (default: the last 12 months, by month)"""
+    fim = fim or date.today()
+    inicio = inicio or fim - timedelta(days=365)
+    try:
+        return await db_ops.get_fluxo_caixa(user["id"], inicio, fim, granularidade, obra_id)
+    except SecureOperationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.post("/api/import/{table}")
+async def bulk_import(table: str,
+                      file: UploadFile = File(...),
+                      batch_size: Optional[int] = Query(default=None, ge=1, le=IMPORT_MAX_BATCH_SIZE),
+                      user: Dict = Depends(get_current_user)):
+    """Import obras or lançamentos from a CSV/XLSX spreadsheet, reporting rejected rows"""
+    if table not in IMPORT_MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Importação disponível para: {', '.join(IMPORT_MODELS)}"
+        )
+    try:
+        rows = iter_upload_rows(file.filename or "", file.file, IMPORT_MODELS[table])
+        report = await db_ops.import_rows(user["id"], table, rows, batch_size)
+    except SecureOperationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        # Unreadable or corrupted spreadsheet (database errors are reported per row)
+        logger.error(f"Import of {file.filename} failed: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Arquivo inválido ou corrompido")
+    finally:
+        await file.close()
+    logger.info(f"Imported {report['inserted']} {table} rows for user {user['id']} "
+                f"({report['failed']} failed, {report['batches']} batches)")
+    return report
+
+@app.get("/api/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str, user: Dict = Depends(get_current_user)):
+    """Context kept for a conversation, with prompt size and latency of its last turns"""
+    if not CONVERSATION_ID.match(conversation_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Conversa inválida")
+    context = await conversation_store.load(user["id"], conversation_id)
+    return {
+        "conversation_id": conversation_id,
+        "turns": len(context["turns"]),
+        "history_tokens": conversation_store.history_tokens(context),
+        "max_tokens": conversation_store.max_tokens,
+        "summary": context["summary"],
+        "stats": context["stats"],
+        "tokenizer": get_token_counter().snapshot()
+    }
+
+@app.delete("/api/conversations/{conversation_id}")
+async def clear_conversation(conversation_id: str, user: Dict = Depends(get_current_user)):
+    """Start the conversation over (the LLM no longer sees earlier turns)"""
+    if not CONVERSATION_ID.match(conversation_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Conversa inválida")
+    await conversation_store.clear(user["id"], conversation_id)
+    return {"message": "Conversa reiniciada"}
+
+@app.get("/api/history")
+async def get_history(cursor: Optional[str] = None,
+                      limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                      user: Dict = Depends(get_current_user)):
+    """The user's chat operations, newest first (pass next_cursor for the next page)"""
+    try:
+        return await operation_history.query(user["id"], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.get("/api/history/all")
+async def get_all_history(cursor: Optional[str] = None,
+                          limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                          user: Dict = Depends(get_current_user)):
+    """Every user's chat operations, for operators listed in OPERATOR_USER_IDS"""
+    if user["id"] not in OPERATOR_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a operadores")
+    try:
+        return {
+            **await operation_history.query(None, cursor, limit),
+            "stats": operation_history.get_stats()
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.get("/api/cache/stats")
+async def cache_stats(user: Dict = Depends(get_current_user)):
+    return {
+        **await cache_service.get_cache_stats(),
+        "llm_responses": response_cache.get_stats()
+    }
+
+@app.get("/api/llm/stats")
+async def llm_stats(user: Dict = Depends(get_current_user)):
+    """Live latency and error rate per model, as seen by this worker"""
+    return get_model_health().snapshot()
@@ -2,28 +2,210 @@
 Monitoring and Logging Service
 Implements comprehensive monitoring based on Gemini recommendations
 """
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, generate_latest, multiprocess
+)
 from loguru import logger
+import functools
+import inspect
+import os
+import queue
+import random
 import sys
-from datetime import datetime
-from typing import Dict, Any
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Any, Optional
 import json
 
-# Configure loguru
-logger.remove()  # Remove default handler
-logger.add(
-    sys.stdout,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
-)
-logger.add(
-    "logs/app_{time:YYYY-MM-DD}.log",
-    rotation="00:00",
-    retention="30 days",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="DEBUG"
+# Set (to an empty, writable directory) before the workers start to share
+# metrics between uvicorn/gunicorn worker processes
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# ============= LOGGING =============
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "logs")
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json (one object per line)
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+# Messages waiting for the writer thread; beyond this they are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+# Pause between partial batches; fewer wake-ups means less GIL contention
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.1"))
+# Fraction of high-frequency debug events (cache hits/misses...) that get logged
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+STDOUT_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+log_messages_dropped = Counter(
+    'log_messages_dropped_total',
+    'Log messages dropped because the writer queue was full',
+    ['sink']
 )
 
+class BatchedSink:
+    """
+    loguru sink that hands formatted messages to a writer thread.
+
+    `write` only appends to a bounded queue and never blocks: when the
+    queue is full (disk or stdout slower than the log rate) the message is
+    dropped and counted, and the next batch starts with a notice. The
+    thread writes whatever has accumulated, up to `batch_size` messages,
+    in a single call, then waits `flush_interval` unless the batch was
+    full. loguru calls `stop` on logger.remove() and at exit, which
+    drains the queue. With `json_logs` (the sink added with serialize=True)
+    the drop notice is a JSON line like the rest of the output.
+    """
+
+    _STOP = object()
+
+    def __init__(self, write_batch: Callable[[str], None], name: str,
+                 max_queue: int = LOG_QUEUE_SIZE, batch_size: int = LOG_BATCH_SIZE,
+                 flush_interval: float = LOG_FLUSH_INTERVAL, json_logs: bool = False):
+        self.write_batch = write_batch
+        self.name = name
+        self.json_logs = json_logs
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._stopping = threading.Event()
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self._dropped_metric = log_messages_dropped.labels(sink=name)
+        self._thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self._thread.start()
+
+    def write(self, message: str) -> None:
+        try:
+            self.queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+            self._dropped_metric.inc()
+
+    def _drop_notice(self, count: int) -> str:
+        now = datetime.now().astimezone()
+        message = f"{count} log messages dropped (queue full)"
+        text = f"{now:%Y-%m-%d %H:%M:%S} | WARNING  | {message}\n"
+        if not self.json_logs:
+            return text
+        # Same layout as loguru's serialize=True output
+        return json.dumps({"text": text, "record": {
+            "level": {"name": "WARNING", "no": 30},
+            "message": message,
+            "name": __name__,
+            "time": {"repr": now.isoformat(), "timestamp": now.timestamp()},
+            "extra": {"sink": self.name, "dropped": count}
+        }}) + "\n"
+
+    def _run(self) -> None:
+        reported = 0
+        stop = False
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Messages can still arrive after stop() queued the sentinel,
+            # so it isn't necessarily the last item; write them too
+            messages = [item for item in batch if item is not self._STOP]
+            stop = stop or len(messages) != len(batch)
+            if self.dropped != reported:
+                messages.insert(0, self._drop_notice(self.dropped - reported))
+                reported = self.dropped
+            if messages:
+                try:
+                    self.write_batch("".join(messages))
+                except Exception as e:
+                    sys.stderr.write(f"Log sink '{self.name}' failed: {e}\n")
+            if stop:
+                if self.queue.empty():
+                    return
+            elif len(batch) < self.batch_size:
+                self._stopping.wait(self.flush_interval)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.queue.put(self._STOP)
+        self._thread.join(timeout=5)
+
+class DailyLogFile:
+    """Appends to {directory}/app_YYYY-MM-DD.log, switching files at midnight"""
+
+    def __init__(self, directory: str, retention_days: int = LOG_RETENTION_DAYS):
+        self.directory = directory
+        self.retention_days = retention_days
+        self._date = None
+        self._file = None
+
+    def __call__(self, text: str) -> None:
+        today = date.today()
+        if today != self._date:
+            self._open(today)
+        self._file.write(text)
+        self._file.flush()
+
+    def _open(self, today: date) -> None:
+        if self._file:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(os.path.join(self.directory, f"app_{today:%Y-%m-%d}.log"), "a", encoding="utf-8")
+        self._date = today
+        self._remove_expired(today)
+
+    def _remove_expired(self, today: date) -> None:
+        oldest = today - timedelta(days=self.retention_days)
+        for filename in os.listdir(self.directory):
+            try:
+                file_date = datetime.strptime(filename, "app_%Y-%m-%d.log").date()
+            except ValueError:
+                continue
+            if file_date < oldest:
+                os.remove(os.path.join(self.directory, filename))
+
+def _write_stdout(text: str) -> None:
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+def configure_logging(log_dir: Optional[str] = None,
+                      json_logs: bool = LOG_FORMAT == "json") -> None:
+    """
+    stdout (LOG_LEVEL) and, when `log_dir` is given, a daily file there
+    (LOG_FILE_LEVEL), both written by background threads so a slow disk or
+    pipe never stalls a request
+    """
+    logger.remove()  # Remove default handler
+    logger.add(
+        BatchedSink(_write_stdout, "stdout", json_logs=json_logs),
+        format=STDOUT_FORMAT,
+        level=LOG_LEVEL,
+        colorize=not json_logs and sys.stdout.isatty(),
+        serialize=json_logs
+    )
+    if log_dir is None:
+        return
+    logger.add(
+        BatchedSink(DailyLogFile(log_dir), "file", json_logs=json_logs),
+        format=FILE_FORMAT,
+        level=LOG_FILE_LEVEL,
+        colorize=False,
+        serialize=json_logs
+    )
+
+def log_sampled(rate: float = LOG_DEBUG_SAMPLE_RATE) -> bool:
+    """
+    Guard for high-frequency debug logs: true for about `rate` of the calls.
+    Checked before the call, so skipped events cost no formatting at all.
+    """
+    return rate >= 1 or random.random() < rate
+
+# stdout only: the file sink is added by the app at startup, so importing
+# this module (scripts, tests) never creates a logs/ directory
+configure_logging()
+
 # Prometheus metrics
 request_count = Counter(
     'api_requests_total',
@@ -48,6 +230,12 @@ llm_tokens_used = Counter(
     ['model', 'type']  # type: prompt or completion
 )
 
+llm_cached_tokens = Counter(
+    'llm_cached_prompt_tokens_total',
+    'Prompt tokens served from the provider prompt cache (part of prompt tokens)',
+    ['model']
+)
+
 cache_operations = Counter(
     'cache_operations_total',
     'Cache operations',
@@ -56,11 +244,238 @@ cache_operations = Counter(
 
 active_users = Gauge(
     'active_users',
-    'Number of active users'
+    'Number of active users',
+    multiprocess_mode='livesum'
 )
 
 database_operations = Counter(
     'database_operations_total',
     'Database operations',
     ['operation', 'table', 'status']
-)
\ No newline at end of file
+)
+
+imported_rows = Counter(
+    'import_rows_total',
+    'Spreadsheet rows handled by bulk import (inserted or failed)',
+    ['table', 'status']
+)
+
+llm_connect_duration = Histogram(
+    'llm_connect_duration_seconds',
+    'Time spent opening a connection to the LLM provider (0 when reused)',
+    ['model']
+)
+
+llm_time_to_first_byte = Histogram(
+    'llm_time_to_first_byte_seconds',
+    'Time from sending the LLM request to receiving response headers',
+    ['model']
+)
+
+llm_prompt_tokens = Histogram(
+    'llm_prompt_tokens',
+    'Prompt size per LLM call (provider count, or our estimate)',
+    ['model'],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+
+llm_request_duration = Histogram(
+    'llm_request_duration_seconds',
+    'Duration of a full LLM call (until the last token when streaming)',
+    ['model'],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+
+llm_time_to_first_token = Histogram(
+    'llm_time_to_first_token_seconds',
+    'Time from sending a streaming LLM request to the first content token',
+    ['model']
+)
+
+# ============= INSTRUMENTATION =============
+
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware filling request_count and request_duration.
+
+    The endpoint label is the route template ("/api/obras/{obra_id}"), not
+    the raw path, and unknown methods/paths collapse into "OTHER" and
+    "unmatched" so clients cannot create new series. Label children are
+    cached per (method, endpoint, status) to keep the per-request cost to
+    a dict lookup plus the counter/histogram updates. For streaming
+    responses the duration covers the whole stream.
+    """
+
+    def __init__(self, app, exclude_paths=("/metrics",)):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+        self._route_paths: Optional[Dict[Any, str]] = None
+        self._children: Dict[tuple, tuple] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._observe(scope, status_code, time.perf_counter() - started)
+
+    def _endpoint(self, scope) -> str:
+        """Route template for the endpoint the router matched (set in scope)"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path
+                for route in getattr(scope.get("app"), "routes", [])
+                if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(endpoint, "unmatched")
+
+    def _observe(self, scope, status_code: int, duration: float) -> None:
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        key = (method, scope.get("endpoint"), status_code)
+        children = self._children.get(key)
+        if children is None:
+            endpoint = self._endpoint(scope)
+            children = (
+                request_count.labels(method=method, endpoint=endpoint, status=str(status_code)),
+                request_duration.labels(method=method, endpoint=endpoint)
+            )
+            self._children[key] = children
+        children[0].inc()
+        children[1].observe(duration)
+
+def track_db_operation(table: Optional[str] = None):
+    """
+    Count calls of a SecureDatabaseOperations coroutine in
+    database_operations (operation = method name). Without `table` the
+    label comes from the method's `table` argument, so only use that on
+    methods that receive an already validated table name.
+    """
+    def decorator(func):
+        operation = func.__name__
+        table_position = list(inspect.signature(func).parameters).index("table") if table is None else None
+
+        children: Dict[str, tuple] = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            label = table or kwargs.get("table") or args[table_position]
+            success_error = children.get(label)
+            if success_error is None:
+                success_error = children[label] = (
+                    database_operations.labels(operation=operation, table=label, status="success"),
+                    database_operations.labels(operation=operation, table=label, status="error")
+                )
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                success_error[1].inc()
+                raise
+            success_error[0].inc()
+            return result
+        return wrapper
+    return decorator
+
+def track_cache(operation: str):
+    """
+    Count CacheService calls in cache_operations. A None result is a miss
+    for "get"; False is an error for "set". Only for methods that report
+    their errors in the result: CacheService.get_raw and get_many count
+    hits, misses and errors themselves, since a Redis error there also
+    returns None.
+    """
+    def decorator(func):
+        hit = cache_operations.labels(operation=operation, result="hit")
+        miss = cache_operations.labels(operation=operation, result="miss")
+        success = cache_operations.labels(operation=operation, result="success")
+        error = cache_operations.labels(operation=operation, result="error")
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            if operation == "get":
+                (miss if result is None else hit).inc()
+            else:
+                (success if result else error).inc()
+            return result
+        return wrapper
+    return decorator
+
+def _record_llm_usage(model: str, usage: Dict[str, Any]) -> None:
+    llm_request_count.labels(model=model, status="success").inc()
+    for token_type in ("prompt", "completion"):
+        tokens = usage.get(f"{token_type}_tokens")
+        if tokens:
+            llm_tokens_used.labels(model=model, type=token_type).inc(tokens)
+    if usage.get("cached_tokens"):
+        llm_cached_tokens.labels(model=model).inc(usage["cached_tokens"])
+
+def track_llm(func):
+    """
+    Count OpenRouterClient completions in llm_request_count and
+    llm_tokens_used, labelled with the requested model. Works for
+    coroutines returning the usage and for streams ending in a "done" event.
+    """
+    def model_for(client, args, kwargs) -> str:
+        model = kwargs.get("model") or (args[1] if len(args) > 1 else None)
+        return model or client.config.preferred_model.value
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def stream_wrapper(self, *args, **kwargs):
+            model = model_for(self, args, kwargs)
+            started = time.perf_counter()
+            try:
+                async for event in func(self, *args, **kwargs):
+                    if event.get("type") == "done":
+                        _record_llm_usage(model, event)
+                        llm_request_duration.labels(model=model).observe(time.perf_counter() - started)
+                    yield event
+            except Exception:
+                llm_request_count.labels(model=model, status="error").inc()
+                raise
+        return stream_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        model = model_for(self, args, kwargs)
+        started = time.perf_counter()
+        try:
+            result = await func(self, *args, **kwargs)
+        except Exception:
+            llm_request_count.labels(model=model, status="error").inc()
+            raise
+        _record_llm_usage(model, result)
+        llm_request_duration.labels(model=model).observe(time.perf_counter() - started)
+        return result
+    return wrapper
+
+# ============= EXPOSITION =============
+
+def generate_metrics() -> bytes:
+    """Prometheus text output; aggregates every worker in multiprocess mode"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges on shutdown (multiprocess mode only)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,197 @@
+"""
+Operation History Module
+Bounded in-memory buffer plus batched, asynchronous persistence to Redis Streams
+"""
+import asyncio
+import os
+import re
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import redis.asyncio as redis
+from loguru import logger
+
+# Last entries kept in memory by each worker (fallback when Redis is down)
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "1000"))
+# Entries per XADD pipeline; a full batch is written right away
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+# Partial batches are written at least this often (seconds)
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+# Entries waiting to be written; the oldest are dropped beyond this
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+# Stream lengths (trimmed approximately on write)
+HISTORY_USER_MAXLEN = int(os.getenv("HISTORY_USER_MAXLEN", "1000"))
+HISTORY_GLOBAL_MAXLEN = int(os.getenv("HISTORY_GLOBAL_MAXLEN", "100000"))
+HISTORY_MESSAGE_CHARS = 200
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+GLOBAL_STREAM = "operation_history"
+STREAM_ID = re.compile(r"^\d+-\d+$")
+
+class OperationHistory:
+    """
+    Records chat operations without touching Redis on the request path.
+
+    `record` appends to two deques: `recent`, a ring buffer with this
+    worker's last entries, and the pending queue drained by a background
+    task. The task writes with one pipeline per batch, as soon as
+    HISTORY_BATCH_SIZE entries are waiting or every HISTORY_FLUSH_INTERVAL
+    seconds. Each entry goes to the user's stream and to a global stream
+    for operators. Reads page through the streams newest first, using the
+    entry id as cursor, so history written in the last flush interval is
+    not visible yet.
+    """
+
+    def __init__(self, redis_client: redis.Redis,
+                 buffer_size: int = HISTORY_BUFFER_SIZE,
+                 batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL,
+                 max_pending: int = HISTORY_MAX_PENDING):
+        self.redis = redis_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent: deque = deque(maxlen=buffer_size)
+        self._pending: deque = deque(maxlen=max_pending)
+        self._wakeup = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flush_errors": 0}
+
+    @staticmethod
+    def _stream_key(user_id: str) -> str:
+        return f"{GLOBAL_STREAM}:{user_id}"
+
+    def record(self, user_id: str, operation: Optional[str], message: str,
+               success: bool, from_cache: bool = False) -> None:
+        """Queue an entry; never waits on Redis"""
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_id,
+            "operation": operation or "",
+            "message": message[:HISTORY_MESSAGE_CHARS],
+            "success": "1" if success else "0",
+            "from_cache": "1" if from_cache else "0"
+        }
+        self.recent.append(entry)
+        if len(self._pending) == self._pending.maxlen:
+            self.stats["dropped"] += 1
+        self._pending.append(entry)
+        self.stats["recorded"] += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write everything pending, one pipeline per batch"""
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for entry in batch:
+                        pipe.xadd(self._stream_key(entry["user_id"]), entry,
+                                  maxlen=HISTORY_USER_MAXLEN, approximate=True)
+                        pipe.xadd(GLOBAL_STREAM, entry,
+                                  maxlen=HISTORY_GLOBAL_MAXLEN, approximate=True)
+                    await pipe.execute()
+            except asyncio.CancelledError:
+                # close() cancelled the writer mid-write: keep the batch so
+                # its final flush writes it
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                self._requeue(batch)
+                self.stats["flush_errors"] += 1
+                logger.error(f"Operation history flush failed: {e}")
+                break
+            written += len(batch)
+        self.stats["written"] += written
+        return written
+
+    def _requeue(self, batch: List[Dict[str, str]]) -> None:
+        """
+        Put a batch that was not written back ahead of newer entries. If
+        they no longer fit, the deque drops the newest ones, which are
+        counted as dropped.
+        """
+        overflow = len(self._pending) + len(batch) - self._pending.maxlen
+        if overflow > 0:
+            self.stats["dropped"] += overflow
+        self._pending.extendleft(reversed(batch))
+
+    async def _write_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        """Start the background writer (one task per process)"""
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """Stop the writer and write what is still pending"""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        await self.flush()
+
+    async def query(self, user_id: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = HISTORY_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        One page of history, newest first: the user's stream, or the global
+        one when `user_id` is None. Pass `next_cursor` back to continue.
+        If Redis is unavailable, answers from this worker's buffer.
+        """
+        if cursor is not None and not STREAM_ID.match(cursor):
+            raise ValueError("Cursor inválido")
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        key = self._stream_key(user_id) if user_id else GLOBAL_STREAM
+        try:
+            entries = await self.redis.xrevrange(
+                key, max=f"({cursor}" if cursor else "+", min="-", count=limit + 1
+            )
+        except Exception as e:
+            logger.error(f"Operation history query failed: {e}")
+            return self._query_recent(user_id, limit)
+
+        items = [self._to_item(entry_id, fields) for entry_id, fields in entries[:limit]]
+        return {
+            "items": items,
+            "next_cursor": items[-1]["id"] if len(entries) > limit else None
+        }
+
+    def _query_recent(self, user_id: Optional[str], limit: int) -> Dict[str, Any]:
+        entries = [entry for entry in reversed(self.recent)
+                   if user_id is None or entry["user_id"] == user_id][:limit]
+        return {
+            "items": [self._to_item(None, entry) for entry in entries],
+            "next_cursor": None,
+            "partial": True
+        }
+
+    @staticmethod
+    def _to_item(entry_id: Any, fields: Dict[Any, Any]) -> Dict[str, Any]:
+        fields = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in fields.items()
+        }
+        return {
+            "id": entry_id.decode() if isinstance(entry_id, bytes) else entry_id,
+            "timestamp": fields.get("timestamp"),
+            "user_id": fields.get("user_id"),
+            "operation": fields.get("operation") or None,
+            "message": fields.get("message"),
+            "success": fields.get("success") == "1",
+            "from_cache": fields.get("from_cache") == "1"
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending), "buffered": len(self.recent)}
@@ -3,12 +3,49 @@ Secure Database Operations Module
 Implements secure API calls instead of direct SQL generation
 Based on Gemini 2.0 Pro recommendations
 """
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Set, Tuple, Type
 from uuid import UUID
 from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from supabase import Client
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ValidationError, validator
+import asyncio
+import base64
+import binascii
+import json
+import os
 import re
+from app.monitoring import imported_rows, track_db_operation
+
+# Maximum number of PostgREST calls in flight per worker
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "20"))
+
+# Default number of rows per page for list operations
+DB_PAGE_SIZE = int(os.getenv("DB_PAGE_SIZE", "50"))
+DB_MAX_PAGE_SIZE = 200
+
+# Rows per INSERT in bulk imports
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_BATCH_SIZE = 5000
+# Row errors kept in an import report; the count is always complete
+IMPORT_MAX_ERRORS = 100
+
+# Search terms shorter than this can't use the trigram indexes
+SEARCH_MIN_CHARS = 3
+SEARCH_MAX_CHARS = 100
+SEARCH_ORDER = ['rank', 'tipo', 'id']
+
+# Obras per get_obras_dashboards call
+DASHBOARD_MAX_OBRAS = 100
+
+# Cash-flow series (get_fluxo_caixa_periodo)
+FLUXO_CAIXA_GRANULARIDADES = ('week', 'month', 'quarter')
+FLUXO_CAIXA_MAX_DIAS = 3660
+
+# Columns returned by list operations; detail views can still select more
+OBRA_LIST_COLUMNS = 'id, nome, status, responsavel, cliente, data_inicio, data_termino, created_at'
+FORNECEDOR_LIST_COLUMNS = 'id, nome'
 
 class SecureOperationError(Exception):
     """Custom exception for secure operations"""
@@ -31,51 +68,274 @@ class ObraCreate(BaseModel):
         if v not in allowed:
             raise ValueError(f'Status deve ser um de: {allowed}')
         return v
+
+class LancamentoCreate(BaseModel):
+    obra_id: UUID
+    fornecedor_id: Optional[UUID] = None
+    descricao: str
+    valor: float
+    data_emissao: date
+    data_vencimento: Optional[date] = None
+    numero_documento: Optional[str] = None
+    status: str = "pendente"
+
+    @validator('status')
+    def validate_status(cls, v):
+        allowed = ['pendente', 'pago', 'cancelado']
+        if v not in allowed:
+            raise ValueError(f'Status deve ser um de: {allowed}')
+        return v
+
+# Importable tables and the model each row is validated with
+IMPORT_MODELS: Dict[str, Type[BaseModel]] = {
+    'obras': ObraCreate,
+    'lancamentos_financeiros': LancamentoCreate,
+}
+
+def encode_cursor(row: Dict, fields: List[str]) -> str:
+    """Opaque keyset cursor pointing just after `row`"""
+    payload = json.dumps([str(row[field]) for field in fields])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """Inverse of encode_cursor; rejects anything that isn't one of ours"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise SecureOperationError("Cursor de paginação inválido")
+    if not isinstance(values, list) or len(values) != size \
+            or not all(isinstance(value, str) and '"' not in value and '\\' not in value
+                       for value in values):
+        raise SecureOperationError("Cursor de paginação inválido")
+    return values
+
 class SecureDatabaseOperations:
     """
     Secure database operations class
     All operations are pre-defined and validated
     No direct SQL execution from LLM
+
+    supabase-py only ships a synchronous PostgREST client, so every
+    `.execute()` is offloaded to a bounded thread pool. The semaphore caps
+    the number of in-flight queries so a slow database cannot exhaust the
+    pool or queue unbounded work behind the event loop.
     """
     
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: Client, max_concurrency: Optional[int] = None,
+                 cache: Optional['CacheService'] = None):
         self.client = supabase_client
+        self.cache = cache
+        self.max_concurrency = max_concurrency or DB_MAX_CONCURRENCY
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="supabase"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _execute(self, query) -> Any:
+        """Run a prepared PostgREST query without blocking the event loop"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, query.execute)
+
+    async def _invalidate(self, user_id: str, *tables: str) -> None:
+        """Drop the user's cached reads that depend on the written tables"""
+        if self.cache:
+            await self.cache.invalidate_tables(user_id, tables)
+
+    def close(self) -> None:
+        """Release the worker threads used for database calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _fetch_page(self, query, order: List[str], desc: bool,
+                          cursor: Optional[str], limit: Optional[int]) -> Dict[str, Any]:
+        """
+        Keyset pagination over `order` (unique as a whole, last field `id`).
+        Returns {"items": [...], "next_cursor": str or None}.
+        """
+        limit = min(limit or DB_PAGE_SIZE, DB_MAX_PAGE_SIZE)
+        if cursor:
+            values = decode_cursor(cursor, len(order))
+            op = 'lt' if desc else 'gt'
+            # (a, b) < (x, y)  =>  a < x OR (a = x AND b < y)
+            quoted = [f'"{value}"' for value in values]
+            query = query.or_(
+                f"{order[0]}.{op}.{quoted[0]},"
+                f"and({order[0]}.eq.{quoted[0]},{order[1]}.{op}.{quoted[1]})"
+            )
+        # PostgREST reads a single `order` param, so list both keys in one call
+        direction = 'desc' if desc else 'asc'
+        query = query.order(",".join(f"{field}.{direction}" for field in order))
+        # One extra row tells whether there is a next page
+        result = await self._execute(query.limit(limit + 1))
+        rows = result.data
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "items": rows,
+            "next_cursor": encode_cursor(rows[-1], order) if has_more else None
+        }
         
     # ============= OBRAS OPERATIONS =============
     
-    async def get_obras_by_status(self, user_id: str, status: str) -> List[Dict]:
-        """Get obras filtered by status for a specific user"""
+    @track_db_operation('obras')
+    async def get_obras_by_status(self, user_id: str, status: str,
+                                  cursor: Optional[str] = None,
+                                  limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get one page of obras filtered by status for a specific user, newest first"""
         try:
-            result = self.client.table('obras') \
-                .select('*') \
+            query = self.client.table('obras') \
+                .select(OBRA_LIST_COLUMNS) \
                 .eq('user_id', user_id) \
-                .eq('status', status) \
-                .execute()
-            return result.data
+                .eq('status', status)
+            return await self._fetch_page(query, ['created_at', 'id'], True, cursor, limit)
+        except SecureOperationError:
+            raise
         except Exception as e:
             raise SecureOperationError(f"Erro ao buscar obras: {str(e)}")
     
-    async def get_all_obras(self, user_id: str) -> List[Dict]:
-        """Get all obras for a specific user"""
+    @track_db_operation('obras')
+    async def get_all_obras(self, user_id: str, cursor: Optional[str] = None,
+                            limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get one page of obras for a specific user, newest first"""
         try:
-            result = self.client.table('obras') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .order('created_at', desc=True) \
-                .execute()
-            return result.data        except Exception as e:
+            query = self.client.table('obras') \
+                .select(OBRA_LIST_COLUMNS) \
+                .eq('user_id', user_id)
+            return await self._fetch_page(query, ['created_at', 'id'], True, cursor, limit)
+        except SecureOperationError:
+            raise
+        except Exception as e:
             raise SecureOperationError(f"Erro ao buscar todas as obras: {str(e)}")
     
+    @track_db_operation('obras')
     async def create_obra(self, user_id: str, obra_data: ObraCreate) -> Dict:
         """Create a new obra with validation"""
         try:
-            data = obra_data.dict()
+            # Round-trip through JSON so dates are sent as ISO strings
+            data = json.loads(obra_data.json())
             data['user_id'] = user_id
-            result = self.client.table('obras').insert(data).execute()
+            result = await self._execute(self.client.table('obras').insert(data))
+            await self._invalidate(user_id, 'obras')
             return result.data[0] if result.data else None
         except Exception as e:
             raise SecureOperationError(f"Erro ao criar obra: {str(e)}")
     
+    async def import_rows(self, user_id: str, table: str,
+                          rows: Iterator[Tuple[int, Dict[str, Any]]],
+                          batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bulk insert rows parsed from a spreadsheet.
+
+        `rows` yields (line number, raw row) and is consumed one batch at a
+        time in a worker thread, so files are never fully loaded. Each row
+        is validated with the table's model; valid rows go in a single
+        INSERT per batch. If a batch is rejected it is split until the
+        offending lines are isolated, and only those are reported. The
+        user's cache is invalidated once per batch that inserted something.
+        """
+        model = IMPORT_MODELS.get(table)
+        if model is None:
+            raise SecureOperationError(f"Importação não suportada para: {table}")
+        batch_size = min(batch_size or IMPORT_BATCH_SIZE, IMPORT_MAX_BATCH_SIZE)
+
+        report = {"inserted": 0, "failed": 0, "batches": 0, "errors": []}
+
+        def fail(line: int, error: str):
+            report["failed"] += 1
+            if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                report["errors"].append({"row": line, "error": error})
+
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(None, lambda: list(islice(rows, batch_size)))
+            if not chunk:
+                break
+            report["batches"] += 1
+
+            valid: List[Tuple[int, Dict[str, Any]]] = []
+            for line, raw in chunk:
+                try:
+                    record = model(**raw).dict()
+                except ValidationError as e:
+                    fail(line, "; ".join(
+                        f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                    ))
+                    continue
+                record['user_id'] = user_id
+                valid.append((line, json.loads(json.dumps(record, default=str))))
+
+            if table == 'lancamentos_financeiros':
+                valid = await self._check_references(user_id, valid, fail)
+
+            inserted = await self._insert_batch(table, valid, fail)
+            report["inserted"] += inserted
+            if inserted:
+                await self._invalidate(user_id, table)
+        # Counted here, once per import: the bisection in _insert_batch may
+        # take many requests to settle one batch
+        imported_rows.labels(table=table, status="inserted").inc(report["inserted"])
+        imported_rows.labels(table=table, status="failed").inc(report["failed"])
+        report["errors"].sort(key=lambda error: error["row"])
+        return report
+
+    async def _insert_batch(self, table: str, valid: List[Tuple[int, Dict[str, Any]]], fail) -> int:
+        """
+        Insert a batch in one request. If it is rejected, split it in halves
+        and retry, so a bad row costs O(log n) extra requests to isolate.
+        """
+        if not valid:
+            return 0
+        try:
+            await self._execute(self.client.table(table).insert(
+                [record for _, record in valid], returning='minimal'
+            ))
+            return len(valid)
+        except Exception as e:
+            if len(valid) == 1:
+                fail(valid[0][0], str(e))
+                return 0
+            middle = len(valid) // 2
+            return await self._insert_batch(table, valid[:middle], fail) + \
+                await self._insert_batch(table, valid[middle:], fail)
+
+    @track_db_operation('lancamentos_financeiros')
+    async def _check_references(self, user_id: str, valid: List[Tuple[int, Dict[str, Any]]],
+                                fail) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Drop lançamentos pointing at obras or fornecedores the user doesn't
+        own (one query per table and batch, run concurrently)
+        """
+        obra_ids = list({record['obra_id'] for _, record in valid})
+        fornecedor_ids = list({record['fornecedor_id'] for _, record in valid if record.get('fornecedor_id')})
+        if not obra_ids:
+            return valid
+        owned_obras, owned_fornecedores = await asyncio.gather(
+            self._owned_ids('obras', user_id, obra_ids),
+            self._owned_ids('fornecedores', user_id, fornecedor_ids)
+        )
+        allowed = []
+        for line, record in valid:
+            if record['obra_id'] not in owned_obras:
+                fail(line, f"obra_id: obra não encontrada ({record['obra_id']})")
+            elif record.get('fornecedor_id') and record['fornecedor_id'] not in owned_fornecedores:
+                fail(line, f"fornecedor_id: fornecedor não encontrado ({record['fornecedor_id']})")
+            else:
+                allowed.append((line, record))
+        return allowed
+
+    async def _owned_ids(self, table: str, user_id: str, ids: List[str]) -> Set[str]:
+        """Subset of `ids` that belongs to the user in `table`"""
+        if not ids:
+            return set()
+        query = self.client.table(table) \
+            .select('id') \
+            .eq('user_id', user_id) \
+            .in_('id', ids)
+        result = await self._execute(query)
+        return {row['id'] for row in result.data}
+
+    @track_db_operation('obras')
     async def update_obra_status(self, user_id: str, obra_id: str, new_status: str) -> Dict:
         """Update obra status with validation"""
         allowed_status = ['Em andamento', 'Paralisada', 'Finalizada']
@@ -83,13 +343,174 @@ class SecureDatabaseOperations:
             raise SecureOperationError(f"Status inválido: {new_status}")
         
         try:
-            result = self.client.table('obras') \
+            query = self.client.table('obras') \
                 .update({'status': new_status, 'updated_at': datetime.now().isoformat()}) \
                 .eq('id', obra_id) \
-                .eq('user_id', user_id) \
-                .execute()
+                .eq('user_id', user_id)
+            result = await self._execute(query)
+            await self._invalidate(user_id, 'obras')
             return result.data[0] if result.data else None
         except Exception as e:
             raise SecureOperationError(f"Erro ao atualizar status: {str(e)}")
     
-    # ============= FINANCIAL OPERATIONS =============
\ No newline at end of file
+    # ============= FINANCIAL OPERATIONS =============
+    
+    @track_db_operation('obra_financeiro')
+    async def get_custos_obras(self, user_id: str) -> List[Dict]:
+        """
+        Get total spend per obra for a specific user, read from the per-obra
+        rollup (one row per obra, kept by triggers) instead of summing every
+        lançamento here
+        """
+        try:
+            query = self.client.table('obra_financeiro') \
+                .select('obra_id, gasto_total, obras(nome)') \
+                .eq('user_id', user_id) \
+                .neq('gasto_total', 0) \
+                .order('gasto_total', desc=True)
+            result = await self._execute(query)
+            return [
+                {
+                    'obra_id': row['obra_id'],
+                    'nome': (row.get('obras') or {}).get('nome'),
+                    'gasto_total': float(row['gasto_total'] or 0)
+                }
+                for row in result.data
+            ]
+        except Exception as e:
+            raise SecureOperationError(f"Erro ao buscar custos: {str(e)}")
+    
+    @track_db_operation('dashboards')
+    async def get_obras_dashboards(self, user_id: str, obra_ids: List[str]) -> Dict[str, Any]:
+        """
+        Dashboard of each obra, keyed by obra id (same shape as
+        get_obra_dashboard; obras the user doesn't own are left out).
+        Dashboards are cached one per obra, and the obras missing from the
+        cache are fetched together in a single get_obras_dashboards() call.
+        """
+        try:
+            ids = list(dict.fromkeys(str(UUID(str(obra_id))) for obra_id in obra_ids))
+        except ValueError:
+            raise SecureOperationError("ID de obra inválido")
+        if len(ids) > DASHBOARD_MAX_OBRAS:
+            raise SecureOperationError(f"Máximo de {DASHBOARD_MAX_OBRAS} obras por consulta")
+        
+        dashboards: Dict[str, Any] = {}
+        if self.cache and ids:
+            cached = await self.cache.get_many('obra_dashboard', user_id,
+                                               [{"obra_id": obra_id} for obra_id in ids])
+            dashboards = {obra_id: dashboard for obra_id, dashboard in zip(ids, cached)
+                          if dashboard is not None}
+        
+        missing = [obra_id for obra_id in ids if obra_id not in dashboards]
+        if missing:
+            try:
+                result = await self._execute(self.client.rpc(
+                    'get_obras_dashboards', {"p_user_id": user_id, "p_obra_ids": missing}
+                ))
+            except Exception as e:
+                raise SecureOperationError(f"Erro ao buscar dashboards: {str(e)}")
+            fetched = result.data or {}
+            if self.cache and fetched:
+                await self.cache.set_many('obra_dashboard', user_id, [
+                    ({"obra_id": obra_id}, dashboard) for obra_id, dashboard in fetched.items()
+                ])
+            dashboards.update(fetched)
+        
+        return {obra_id: dashboards[obra_id] for obra_id in ids if obra_id in dashboards}
+    
+    @track_db_operation('fluxo_caixa')
+    async def get_fluxo_caixa(self, user_id: str, inicio: date, fim: date,
+                              granularidade: str = 'month',
+                              obra_id: Optional[str] = None) -> List[Dict]:
+        """
+        Cash flow between `inicio` and `fim` (inclusive), one item per
+        week, month or quarter with lançamentos. Whole months come from the
+        monthly summary table, so long ranges stay cheap; results are
+        cached until the user's lançamentos change.
+        """
+        if granularidade not in FLUXO_CAIXA_GRANULARIDADES:
+            raise SecureOperationError(
+                f"Granularidade deve ser uma de: {', '.join(FLUXO_CAIXA_GRANULARIDADES)}"
+            )
+        if fim < inicio:
+            raise SecureOperationError("Data final anterior à inicial")
+        if (fim - inicio).days > FLUXO_CAIXA_MAX_DIAS:
+            raise SecureOperationError(f"Intervalo máximo de {FLUXO_CAIXA_MAX_DIAS} dias")
+        if obra_id is not None:
+            try:
+                obra_id = str(UUID(str(obra_id)))
+            except ValueError:
+                raise SecureOperationError("ID de obra inválido")
+        
+        params = {
+            "inicio": inicio.isoformat(), "fim": fim.isoformat(),
+            "granularidade": granularidade, "obra_id": obra_id
+        }
+        if self.cache:
+            cached = await self.cache.get('fluxo_caixa', user_id, params)
+            if cached is not None:
+                return cached
+        try:
+            result = await self._execute(self.client.rpc('get_fluxo_caixa_periodo', {
+                "p_user_id": user_id,
+                "p_inicio": params["inicio"],
+                "p_fim": params["fim"],
+                "p_granularidade": granularidade,
+                "p_obra_id": obra_id
+            }))
+        except Exception as e:
+            raise SecureOperationError(f"Erro ao buscar fluxo de caixa: {str(e)}")
+        
+        periodos = result.data or []
+        if self.cache:
+            await self.cache.set('fluxo_caixa', user_id, periodos, params)
+        return periodos
+    
+    # ============= FORNECEDORES OPERATIONS =============
+    
+    @track_db_operation('fornecedores')
+    async def get_fornecedores(self, user_id: str, cursor: Optional[str] = None,
+                               limit: Optional[int] = None) -> Dict[str, Any]:
+        """Get one page of fornecedores for a specific user, by name"""
+        try:
+            query = self.client.table('fornecedores') \
+                .select(FORNECEDOR_LIST_COLUMNS) \
+                .eq('user_id', user_id)
+            return await self._fetch_page(query, ['nome', 'id'], False, cursor, limit)
+        except SecureOperationError:
+            raise
+        except Exception as e:
+            raise SecureOperationError(f"Erro ao buscar fornecedores: {str(e)}")
+    
+    # ============= SEARCH =============
+    
+    @track_db_operation('busca')
+    async def search(self, user_id: str, query: str, cursor: Optional[str] = None,
+                     limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        One page of obras, fornecedores and lançamentos matching `query`,
+        most relevant first. Accents and case are ignored and close spellings
+        match (see buscar() in analytics_functions.sql).
+        Items are {"tipo", "id", "titulo", "detalhe", "rank"}.
+        """
+        term = " ".join(query.split())[:SEARCH_MAX_CHARS]
+        if len(term) < SEARCH_MIN_CHARS:
+            raise SecureOperationError(f"Digite ao menos {SEARCH_MIN_CHARS} caracteres para buscar")
+        limit = min(limit or DB_PAGE_SIZE, DB_MAX_PAGE_SIZE)
+        params = {"p_user_id": user_id, "p_query": term, "p_limite": limit + 1}
+        if cursor:
+            rank, tipo, row_id = decode_cursor(cursor, len(SEARCH_ORDER))
+            params.update(p_cursor_rank=rank, p_cursor_tipo=tipo, p_cursor_id=row_id)
+        try:
+            result = await self._execute(self.client.rpc('buscar', params))
+        except Exception as e:
+            raise SecureOperationError(f"Erro na busca: {str(e)}")
+        
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "items": rows,
+            "next_cursor": encode_cursor(rows[-1], SEARCH_ORDER) if has_more else None
+        }
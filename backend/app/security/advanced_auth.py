@@ -2,28 +2,246 @@
 # Combina JWT do Supabase com tokens de sessão próprios
 
 from datetime import datetime, timedelta
-from typing import Optional, Dict
-import jwt
+from typing import Optional, Dict, Iterable
+from jose import jwt, JWTError
+import asyncio
 import secrets
+import time
+import uuid
 from fastapi import HTTPException, Security
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import redis
+import redis.asyncio as redis
 from supabase import create_client
 import hashlib
 import json
 
+# Limite de requisições (janela deslizante) e de sessões em uma única ida
+# ao Redis. As duas checagens e as escritas acontecem de forma atômica.
+#
+# KEYS[1] = rate:{user_id}      sorted set: id da requisição -> timestamp (ms)
+# KEYS[2] = sessions:{user_id}  sorted set: id da sessão -> expiração (ms)
+# ARGV    = agora (ms), janela (ms), limite de requisições, máximo de sessões,
+#           id da sessão, id da requisição, modo ('check' ou 'create'),
+#           duração da sessão (ms)
+#
+# Retorna {status, restantes, retry_after_ms, sessões ativas}
+#   status  1 = liberado, 0 = limite de requisições,
+#          -1 = sessão inexistente/expirada, -2 = limite de sessões
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local max_sessions = tonumber(ARGV[4])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local sessions = redis.call('ZCARD', KEYS[2])
+if ARGV[7] == 'create' then
+    if sessions >= max_sessions then
+        return {-2, 0, 0, sessions}
+    end
+elseif not redis.call('ZSCORE', KEYS[2], ARGV[5]) then
+    return {-1, 0, 0, sessions}
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, 0, tonumber(oldest[2]) + window - now, sessions}
+end
+
+redis.call('ZADD', KEYS[1], now, ARGV[6])
+redis.call('PEXPIRE', KEYS[1], window)
+if ARGV[7] == 'create' then
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[8]), ARGV[5])
+    sessions = sessions + 1
+end
+redis.call('PEXPIRE', KEYS[2], tonumber(ARGV[8]))
+return {1, limit - count - 1, 0, sessions}
+"""
+
 class SecureAuthSystem:
     """Sistema de autenticação com múltiplas camadas de segurança"""
-    
-    def __init__(self, supabase_url: str, supabase_key: str, 
+
+    def __init__(self, supabase_url: str, supabase_key: str,
                  jwt_secret: str, redis_client: redis.Redis):
         self.supabase = create_client(supabase_url, supabase_key)
         self.jwt_secret = jwt_secret
         self.redis = redis_client
         self.security = HTTPBearer()
-        
+
         # Configurações de segurança
         self.SESSION_DURATION = 3600  # 1 hora
         self.REFRESH_THRESHOLD = 300  # 5 minutos
         self.MAX_SESSIONS_PER_USER = 5
         self.RATE_LIMIT_REQUESTS = 100  # por hora
+        self.RATE_LIMIT_WINDOW = 3600  # segundos
+
+        # EVALSHA com fallback automático para EVAL
+        self._admit = self.redis.register_script(ADMIT_SCRIPT)
+
+    async def _run_admit(self, user_id: str, session_id: str, mode: str = "check") -> Dict:
+        """Executa o script de limite/sessões para uma requisição"""
+        status, remaining, retry_after_ms, sessions = await self._admit(
+            keys=[f"rate:{user_id}", f"sessions:{user_id}"],
+            args=[
+                int(time.time() * 1000),
+                self.RATE_LIMIT_WINDOW * 1000,
+                self.RATE_LIMIT_REQUESTS,
+                self.MAX_SESSIONS_PER_USER,
+                session_id,
+                uuid.uuid4().hex,
+                mode,
+                self.SESSION_DURATION * 1000
+            ]
+        )
+
+        if status == -1:
+            raise HTTPException(status_code=401, detail="Sessão expirada ou encerrada")
+        if status == -2:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Limite de {self.MAX_SESSIONS_PER_USER} sessões ativas atingido"
+            )
+        if status == 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Limite de requisições atingido",
+                headers={"Retry-After": str(max(1, -(-retry_after_ms // 1000)))}
+            )
+        return {"remaining": remaining, "sessions": sessions}
+
+    async def create_session(self, supabase_token: str) -> Dict:
+        """
+        Troca um token do Supabase por um token de sessão próprio,
+        respeitando o limite de sessões ativas do usuário.
+        """
+        try:
+            user_response = await asyncio.to_thread(self.supabase.auth.get_user, supabase_token)
+        except Exception:
+            user_response = None
+        if not user_response or not user_response.user:
+            raise HTTPException(status_code=401, detail="Token do Supabase inválido")
+
+        user_id = user_response.user.id
+        session_id = secrets.token_urlsafe(16)
+        await self._run_admit(user_id, session_id, mode="create")
+
+        now = datetime.utcnow()
+        session_token = jwt.encode(
+            {
+                "sub": user_id,
+                "sid": session_id,
+                "email": user_response.user.email,
+                "iat": now,
+                "exp": now + timedelta(seconds=self.SESSION_DURATION),
+                "type": "session"
+            },
+            self.jwt_secret,
+            algorithm="HS256"
+        )
+        return {
+            "session_token": session_token,
+            "token_type": "bearer",
+            "expires_in": self.SESSION_DURATION
+        }
+
+    def decode_session(self, session_token: str) -> Dict:
+        """Valida a assinatura e a validade do token de sessão (local)"""
+        try:
+            claims = jwt.decode(session_token, self.jwt_secret, algorithms=["HS256"])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Token de sessão inválido")
+        if claims.get("type") != "session" or "sid" not in claims:
+            raise HTTPException(status_code=401, detail="Token de sessão inválido")
+        return claims
+
+    async def validate_request(self, session_token: str) -> Dict:
+        """
+        Valida o token de sessão e aplica o limite de requisições.
+        Uma única ida ao Redis por requisição.
+        """
+        claims = self.decode_session(session_token)
+        limits = await self._run_admit(claims["sub"], claims["sid"])
+        return {
+            "id": claims["sub"],
+            "email": claims.get("email"),
+            "session_id": claims["sid"],
+            "rate_limit_remaining": limits["remaining"],
+            "needs_refresh": claims["exp"] - time.time() < self.REFRESH_THRESHOLD
+        }
+
+    async def get_current_user(
+        self, credentials: HTTPAuthorizationCredentials = Security(HTTPBearer())
+    ) -> Dict:
+        """Dependency para rotas que não passam pelo RateLimitMiddleware"""
+        return await self.validate_request(credentials.credentials)
+
+    async def revoke_session(self, user_id: str, session_id: str):
+        """Encerra uma sessão (logout)"""
+        await self.redis.zrem(f"sessions:{user_id}", session_id)
+
+    async def revoke_all_sessions(self, user_id: str):
+        """Encerra todas as sessões do usuário"""
+        await self.redis.delete(f"sessions:{user_id}")
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que valida o token de sessão e aplica o limite de
+    requisições antes da rota. O usuário validado fica em
+    request.state.user e o saldo vai no header X-RateLimit-Remaining.
+    """
+
+    def __init__(self, app, auth_system: SecureAuthSystem,
+                 exempt_paths: Iterable[str] = ("/health", "/docs", "/openapi.json", "/api/auth/")):
+        self.app = app
+        self.auth = auth_system
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            return await self.app(scope, receive, send)
+
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode()
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            response = JSONResponse({"detail": "Não autenticado"}, status_code=401)
+            return await response(scope, receive, send)
+
+        try:
+            user = await self.auth.validate_request(token)
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            return await response(scope, receive, send)
+
+        scope.setdefault("state", {})["user"] = user
+        remaining = str(user["rate_limit_remaining"]).encode()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-ratelimit-remaining", remaining))
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+# Exemplo de uso:
+"""
+from fastapi import FastAPI, Request
+import redis.asyncio as redis
+from app.security.advanced_auth import SecureAuthSystem, RateLimitMiddleware
+
+redis_client = redis.from_url(REDIS_URL, decode_responses=True)
+auth_system = SecureAuthSystem(SUPABASE_URL, SUPABASE_SERVICE_KEY, JWT_SECRET, redis_client)
+
+app = FastAPI()
+app.add_middleware(RateLimitMiddleware, auth_system=auth_system)
+
+@app.post("/api/auth/session")
+async def create_session(supabase_token: str):
+    return await auth_system.create_session(supabase_token)
+
+@app.get("/api/obras")
+async def listar_obras(request: Request):
+    user = request.state.user
+"""
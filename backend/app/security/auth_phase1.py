@@ -1,11 +1,18 @@
 # Configuração de Segurança - Fase 1 (MVP)
 # Implementação simples usando apenas Supabase Auth
 
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client, Client
+from gotrue.errors import AuthApiError
+from jose import jwt, JOSEError, JWTError
+from collections import OrderedDict
+import asyncio
+import hashlib
+import httpx
 import os
+import time
 from datetime import datetime
 import logging
 
@@ -17,12 +24,135 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
+# Verificação local dos JWT do Supabase
+# Projetos com chave simétrica usam o JWT secret (HS256); projetos com
+# chaves assimétricas publicam as chaves públicas no endpoint JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET") or os.getenv("JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+)
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+# Algoritmos aceitos para chaves do JWKS; o `alg` do cabeçalho do token não
+# é confiável e nunca escolhe o algoritmo sozinho
+JWKS_ALGORITHMS = ["RS256", "ES256"]
+JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+# De quanto em quanto tempo um token em cache é conferido no Supabase (revogação)
+AUTH_REVALIDATE_INTERVAL = int(os.getenv("AUTH_REVALIDATE_INTERVAL", "300"))
+AUTH_CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+
 # Inicializar cliente Supabase
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 # Security scheme para FastAPI
 security = HTTPBearer()
 
+class JWKSCache:
+    """
+    Chaves públicas do Supabase em memória.
+    Recarrega após JWKS_CACHE_TTL ou quando aparece um `kid` desconhecido
+    (rotação de chave), no máximo uma vez a cada JWKS_MIN_REFRESH_INTERVAL.
+    """
+    
+    def __init__(self, url: str = SUPABASE_JWKS_URL):
+        self.url = url
+        self.keys: Dict[str, Dict] = {}
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def get_key(self, kid: Optional[str]) -> Optional[Dict]:
+        expired = time.monotonic() - self.fetched_at > JWKS_CACHE_TTL
+        if expired or kid not in self.keys:
+            await self._refresh(force=expired)
+        return self.keys.get(kid)
+    
+    async def _refresh(self, force: bool = False):
+        async with self._lock:
+            if not force and time.monotonic() - self.fetched_at < JWKS_MIN_REFRESH_INTERVAL:
+                return
+            try:
+                async with httpx.AsyncClient(timeout=5) as client:
+                    response = await client.get(self.url)
+                    response.raise_for_status()
+                self.keys = {key.get("kid"): key for key in response.json().get("keys", [])}
+                logger.info(f"JWKS atualizado - {len(self.keys)} chave(s)")
+            except (httpx.HTTPError, ValueError) as e:
+                # Mantém as chaves anteriores se o endpoint falhar
+                logger.error(f"Erro ao carregar JWKS: {str(e)}")
+            self.fetched_at = time.monotonic()
+
+class LocalJWTVerifier:
+    """
+    Valida os JWT do Supabase sem ida à rede.
+    
+    As claims decodificadas ficam em cache por token até o `exp`. A cada
+    AUTH_REVALIDATE_INTERVAL o token é conferido no Supabase
+    (auth.get_user) para detectar sessões revogadas.
+    """
+    
+    def __init__(self, secret: Optional[str] = SUPABASE_JWT_SECRET,
+                 jwks: Optional[JWKSCache] = None,
+                 revalidate_interval: int = AUTH_REVALIDATE_INTERVAL,
+                 max_entries: int = AUTH_CLAIMS_CACHE_SIZE):
+        self.secret = secret
+        self.jwks = jwks or JWKSCache()
+        self.revalidate_interval = revalidate_interval
+        self.max_entries = max_entries
+        # hash do token -> (claims, exp, última conferência remota)
+        self._claims: "OrderedDict[str, Tuple[Dict, float, float]]" = OrderedDict()
+    
+    async def verify(self, token: str) -> Dict:
+        """Retorna as claims do token ou levanta JOSEError (JWTError, JWKError...)"""
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+        
+        cached = self._claims.get(token_hash)
+        if cached and cached[1] > now:
+            claims, exp, checked_at = cached
+            self._claims.move_to_end(token_hash)
+        else:
+            claims = await self._decode(token)
+            exp, checked_at = float(claims["exp"]), now
+            self._store(token_hash, claims, exp, checked_at)
+        
+        if self.revalidate_interval and now - checked_at > self.revalidate_interval:
+            await self._check_revoked(token, token_hash)
+            self._store(token_hash, claims, exp, now)
+        return claims
+    
+    async def _decode(self, token: str) -> Dict:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") == "HS256":
+            if not self.secret:
+                raise JWTError("SUPABASE_JWT_SECRET não configurado")
+            key, algorithms = self.secret, ["HS256"]
+        else:
+            key = await self.jwks.get_key(header.get("kid"))
+            if key is None:
+                raise JWTError(f"Chave de assinatura desconhecida: {header.get('kid')}")
+            # O algoritmo vem da própria chave publicada, não do token
+            algorithms = [key["alg"]] if key.get("alg") in JWKS_ALGORITHMS else JWKS_ALGORITHMS
+        return jwt.decode(token, key, algorithms=algorithms, audience=JWT_AUDIENCE,
+                          options={"require_exp": True, "require_sub": True})
+    
+    async def _check_revoked(self, token: str, token_hash: str):
+        try:
+            await asyncio.to_thread(supabase.auth.get_user, token)
+        except AuthApiError as e:
+            self._claims.pop(token_hash, None)
+            raise JWTError(f"Sessão revogada: {str(e)}")
+        except Exception as e:
+            # Supabase indisponível: segue com a validação local
+            logger.warning(f"Não foi possível conferir revogação: {str(e)}")
+    
+    def _store(self, token_hash: str, claims: Dict, exp: float, checked_at: float):
+        self._claims[token_hash] = (claims, exp, checked_at)
+        self._claims.move_to_end(token_hash)
+        while len(self._claims) > self.max_entries:
+            self._claims.popitem(last=False)
+
+jwt_verifier = LocalJWTVerifier()
+
 class SimpleAuthSystem:
     """
     Sistema de autenticação simples para MVP.
@@ -35,28 +165,27 @@ class SimpleAuthSystem:
     ) -> Dict:
         """
         Valida o token JWT do Supabase e retorna os dados do usuário.
+        A assinatura é verificada localmente (ver LocalJWTVerifier).
         """
         token = credentials.credentials
         
         try:
-            # Validar token com Supabase
-            user_response = supabase.auth.get_user(token)
-            
-            if not user_response or not user_response.user:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Token inválido ou expirado"
-                )
-            
-            user = user_response.user
-            
+            claims = await jwt_verifier.verify(token)
+        except JOSEError as e:
+            logger.warning(f"Token rejeitado: {str(e)}")
+            raise HTTPException(
+                status_code=401,
+                detail="Token inválido ou expirado"
+            )
+        
+        try:
             # Log de acesso (básico)
-            logger.info(f"Acesso autorizado - User ID: {user.id}")
+            logger.info(f"Acesso autorizado - User ID: {claims['sub']}")
             
             return {
-                "id": user.id,
-                "email": user.email,
-                "metadata": user.user_metadata
+                "id": claims["sub"],
+                "email": claims.get("email"),
+                "metadata": claims.get("user_metadata", {})
             }
             
         except Exception as e:
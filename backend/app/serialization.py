@@ -0,0 +1,133 @@
+"""
+Cache Serialization Module
+Pluggable encoders for cached values (json/orjson/msgpack, optional zstd)
+
+Stored entries start with a 3-byte header - NUL, format, compression - so
+the encoding can change without flushing Redis, and headerless entries are
+decoded as plain JSON text. That only covers the encoding: when the shape
+of a cached value changes, bump CACHE_KEY_VERSION in app.cache_service so
+entries of the old shape are not read at all.
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "orjson")
+# Values whose encoded form is at least this big are zstd-compressed (0 disables)
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", "65536"))
+CACHE_ZSTD_LEVEL = int(os.getenv("CACHE_ZSTD_LEVEL", "3"))
+
+HEADER_MAGIC = b"\x00"
+FORMAT_CODES = {"json": b"j", "orjson": b"o", "msgpack": b"m"}
+COMPRESSION_NONE = b"-"
+COMPRESSION_ZSTD = b"z"
+
+def json_dumps(value: Any) -> bytes:
+    """Encode to UTF-8 JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+def json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def merge_json(fields: Dict[str, Any], raw_object: bytes) -> bytes:
+    """
+    Build a JSON object from `fields` plus the members of an already
+    encoded JSON object, without decoding it. Raises ValueError if
+    `raw_object` is not an object (e.g. a list), which can't be merged.
+    """
+    raw_object = raw_object.strip()
+    if not (raw_object.startswith(b"{") and raw_object.endswith(b"}")):
+        raise ValueError("merge_json expects an encoded JSON object")
+    head = json_dumps(fields)
+    if raw_object == b"{}":
+        return head
+    if head == b"{}":
+        return raw_object
+    return head[:-1] + b"," + raw_object[1:]
+
+class CacheSerializer:
+    """
+    Encodes cached values for Redis and turns stored entries back into
+    client-ready JSON bytes.
+
+    With the JSON formats an uncompressed entry is the JSON body itself
+    behind the header, so `to_json` is a slice; compressed entries only
+    need decompressing. msgpack trades that for smaller entries and has
+    to be re-encoded for clients.
+    """
+
+    def __init__(self, format: str = CACHE_SERIALIZER,
+                 compress_threshold: int = CACHE_COMPRESS_THRESHOLD,
+                 zstd_level: int = CACHE_ZSTD_LEVEL):
+        if format not in FORMAT_CODES:
+            raise ValueError(f"Unknown cache serializer: {format}")
+        if format == "orjson" and orjson is None or format == "msgpack" and msgpack is None:
+            logger.warning(f"{format} is not installed, caching with the stdlib json encoder")
+            format = "json"
+        if compress_threshold and zstandard is None:
+            logger.warning("zstandard is not installed, cache compression disabled")
+            compress_threshold = 0
+
+        self.format = format
+        self.compress_threshold = compress_threshold
+        self._compressor = zstandard.ZstdCompressor(level=zstd_level) if compress_threshold else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    def dumps(self, value: Any, json_bytes: Optional[bytes] = None) -> bytes:
+        """Encode `value` for storage; pass `json_bytes` if it is already JSON-encoded"""
+        if self.format == "msgpack":
+            body = msgpack.packb(value, default=str)
+        elif self.format == "orjson":
+            body = json_bytes if json_bytes is not None else json_dumps(value)
+        else:
+            body = json.dumps(value, default=str).encode()
+
+        compression = COMPRESSION_NONE
+        if self.compress_threshold and len(body) >= self.compress_threshold:
+            body = self._compressor.compress(body)
+            compression = COMPRESSION_ZSTD
+        return HEADER_MAGIC + FORMAT_CODES[self.format] + compression + body
+
+    def _split(self, data: bytes):
+        """Return (format code, body) with the body decompressed"""
+        if isinstance(data, str):
+            data = data.encode()  # client created with decode_responses=True
+        if not data.startswith(HEADER_MAGIC):
+            return FORMAT_CODES["json"], data  # legacy plain JSON entry
+        format_code, compression, body = data[1:2], data[2:3], data[3:]
+        if compression == COMPRESSION_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("zstd-compressed cache entry but zstandard is not installed")
+            body = self._decompressor.decompress(body)
+        return format_code, body
+
+    def loads(self, data: bytes) -> Any:
+        format_code, body = self._split(data)
+        if format_code == FORMAT_CODES["msgpack"]:
+            return msgpack.unpackb(body)
+        return json_loads(body)
+
+    def to_json(self, data: bytes) -> bytes:
+        """Client-ready JSON bytes for a stored entry"""
+        format_code, body = self._split(data)
+        if format_code == FORMAT_CODES["msgpack"]:
+            return json_dumps(msgpack.unpackb(body))
+        return body
@@ -1,8 +1,19 @@
 # Sistema de Roteamento Inteligente de LLM
 
+from collections import deque
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Deque, Dict, List, Optional
+import os
 import re
+import statistics
+from app.services.token_counter import get_token_counter
+
+# Janela e limites usados para medir a saúde de cada modelo
+ROUTER_LATENCY_WINDOW = int(os.getenv("ROUTER_LATENCY_WINDOW", "100"))
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.2"))
+ROUTER_SLOW_P95_MS = float(os.getenv("ROUTER_SLOW_P95_MS", "15000"))
+ROUTER_MAX_CANDIDATES = int(os.getenv("ROUTER_MAX_CANDIDATES", "3"))
 
 class LLMModel(Enum):
     """Modelos disponíveis no OpenRouter com seus custos"""
@@ -26,10 +37,63 @@ class QueryComplexity(Enum):
     COMPLEX = "complex"      # Múltiplas tabelas, cálculos
     CREATIVE = "creative"    # Geração de relatórios, insights
 
+class ModelHealth:
+    """
+    Latência e taxa de erro medidas por modelo, em janela deslizante.
+    Uma instância por processo, alimentada pelo OpenRouterClient.
+    """
+    
+    def __init__(self, window: int = ROUTER_LATENCY_WINDOW):
+        self.window = window
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.outcomes: Dict[str, Deque[bool]] = {}
+    
+    def record_success(self, model: str, latency: float):
+        """Registra uma chamada bem-sucedida e sua duração em segundos"""
+        self.latencies.setdefault(model, deque(maxlen=self.window)).append(latency)
+        self.outcomes.setdefault(model, deque(maxlen=self.window)).append(True)
+    
+    def record_error(self, model: str):
+        """Registra uma chamada que falhou (timeout, 429, 5xx...)"""
+        self.outcomes.setdefault(model, deque(maxlen=self.window)).append(False)
+    
+    def percentile(self, model: str, pct: int) -> Optional[float]:
+        """Percentil da latência em ms, ou None sem amostras suficientes"""
+        samples = self.latencies.get(model)
+        if not samples or len(samples) < ROUTER_MIN_SAMPLES:
+            return None
+        return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1] * 1000
+    
+    def error_rate(self, model: str) -> float:
+        outcomes = self.outcomes.get(model)
+        if not outcomes or len(outcomes) < ROUTER_MIN_SAMPLES:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Resumo por modelo para o endpoint de estatísticas"""
+        return {
+            model: {
+                "calls": len(self.outcomes[model]),
+                "p50_ms": self.percentile(model, 50),
+                "p95_ms": self.percentile(model, 95),
+                "error_rate": self.error_rate(model)
+            }
+            for model in self.outcomes
+        }
+
+_model_health = ModelHealth()
+
+def get_model_health() -> ModelHealth:
+    """Retorna as medições compartilhadas pelo processo"""
+    return _model_health
+
 class LLMRouter:
     """Roteador inteligente para seleção de modelo LLM"""
     
-    def __init__(self):
+    def __init__(self, health: Optional[ModelHealth] = None):
+        self.health = health or get_model_health()
+        
         # Padrões para identificar complexidade
         self.simple_patterns = [
             r"listar?",
@@ -98,6 +162,57 @@ class LLMRouter:
             "reason": self._get_reason(complexity)
         }
     
+    def route(self, query: str,
+              max_latency_ms: Optional[float] = None,
+              max_cost: Optional[float] = None) -> Dict:
+        """
+        Escolhe os modelos para uma query, em ordem de tentativa.
+        
+        Parte do modelo indicado por analyze_query e usa as medições ao
+        vivo: se ele está lento (p95 acima do limite do usuário ou de
+        ROUTER_SLOW_P95_MS) ou falhando, passa para trás dos modelos mais
+        rápidos. As alternativas nunca custam mais que o modelo do nível,
+        e nenhum candidato passa de `max_cost`.
+        """
+        analysis = self.analyze_query(query)
+        primary = analysis.get("model", self.complexity_model_map[QueryComplexity.SIMPLE])
+        primary_cost = self._estimate_cost(primary, query)
+        cost_cap = primary_cost if max_cost is None else min(primary_cost, max_cost)
+        
+        candidates = [primary] if primary_cost <= cost_cap else []
+        candidates += [
+            model for model in LLMModel
+            if model != primary and self._estimate_cost(model, query) <= cost_cap
+        ]
+        if not candidates:
+            # Nem o modelo mais barato cabe no limite
+            analysis.update({"models": [], "reason": "Limite de custo por consulta atingido"})
+            return analysis
+        
+        slow_limit = max_latency_ms or ROUTER_SLOW_P95_MS
+        
+        def rank(model: LLMModel):
+            p95 = self.health.percentile(model.value, 95)
+            healthy = (
+                self.health.error_rate(model.value) <= ROUTER_MAX_ERROR_RATE
+                and (p95 is None or p95 <= slow_limit)
+            )
+            if model == primary:
+                return (not healthy, -1.0)
+            # Modelos sem medição ficam depois dos já medidos como rápidos
+            return (not healthy, p95 if p95 is not None else slow_limit)
+        
+        ordered = sorted(candidates, key=rank)[:ROUTER_MAX_CANDIDATES]
+        if ordered[0] != primary:
+            analysis["reason"] = f"{primary.value} lento ou instável - usando {ordered[0].value}"
+        
+        analysis.update({
+            "model": ordered[0],
+            "models": [model.value for model in ordered],
+            "estimated_cost": self._estimate_cost(ordered[0], query)
+        })
+        return analysis
+    
     def _is_direct_query(self, query: str) -> bool:
         """Verifica se a query pode ser respondida sem LLM"""
         direct_queries = [
@@ -141,17 +256,22 @@ class LLMRouter:
         return any(keyword in query for keyword in function_keywords)
     
     def _estimate_tokens(self, query: str) -> int:
-        """Estima número de tokens (aproximado)"""
-        # Regra simples: ~1.3 tokens por palavra em português
-        words = len(query.split())
+        """Estima número de tokens da query com o tokenizer compartilhado"""
         # Adiciona overhead do contexto do sistema
-        return int(words * 1.3) + 500
+        return get_token_counter().count(query) + 500
     
     def _estimate_cost(self, model: LLMModel, query: str) -> float:
         """Estima custo em USD"""
-        tokens = self._estimate_tokens(query)
+        # x2 para input+output
+        return self.cost_for_tokens(model, self._estimate_tokens(query) * 2)
+    
+    def cost_for_tokens(self, model, tokens: int) -> float:
+        """Custo em USD de `tokens` tokens (entrada + saída)"""
+        if isinstance(model, str):
+            # O OpenRouter pode devolver o nome com sufixo de versão
+            model = next((m for m in LLMModel if model.startswith(m.value)), model)
         
-        # Custos por 1k tokens (input + output estimado)
+        # Custos por 1k tokens
         costs = {
             LLMModel.GEMINI_FLASH: 0.00025,
             LLMModel.LLAMA_3_8B: 0.00018,
@@ -163,7 +283,7 @@ class LLMRouter:
         }
         
         cost_per_token = costs.get(model, 0.01) / 1000
-        return tokens * cost_per_token * 2  # x2 para input+output
+        return tokens * cost_per_token
     
     def _get_reason(self, complexity: QueryComplexity) -> str:
         """Retorna explicação da escolha"""
@@ -0,0 +1,93 @@
+# Templates de Prompt do Sistema
+
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Instruções comuns a todos os usuários. Nada que dependa do usuário entra
+# aqui: o texto precisa ser idêntico byte a byte entre chamadas para que o
+# provedor reaproveite o prefixo do prompt (prompt caching).
+BASE_INSTRUCTIONS = """Você é um assistente especializado em gestão de obras da construção civil.
+
+REGRAS CRÍTICAS DE SEGURANÇA:
+1. Você NUNCA gera SQL diretamente
+2. Você só pode usar as operações pré-definidas listadas abaixo
+3. O user_id do usuário atual (informado ao final) já está automaticamente aplicado em todas as operações
+4. NUNCA tente acessar dados de outros usuários
+5. Se não houver operação adequada, informe educadamente que não é possível
+
+OPERAÇÕES DISPONÍVEIS:
+{operations}
+"""
+
+JSON_ANSWER = """
+FORMATO DE RESPOSTA:
+{
+    "operation": "nome_da_operacao",
+    "parameters": {},
+    "response": "resposta em linguagem natural para o usuário"
+}
+
+Se nenhuma operação for necessária, use "operation": null e responda diretamente."""
+
+TEXT_ANSWER = """
+Responda diretamente em linguagem natural, em português, sem JSON."""
+
+USER_CONTEXT = "USUÁRIO ATUAL: user_id '{user_id}'"
+
+class PromptTemplate:
+    """
+    Prompt de sistema em duas partes:
+    - prefixo: instruções + lista de operações, igual para todos os usuários
+      (montado uma vez por lista de operações)
+    - sufixo: dados do usuário, em uma segunda mensagem de sistema
+
+    Assim a primeira mensagem é sempre a mesma e só o sufixo muda.
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str):
+        self.name = name
+        self.prefix_template = prefix
+        self.suffix_template = suffix
+        self.prefix = lru_cache(maxsize=32)(self._build_prefix)
+        self.suffix = lru_cache(maxsize=4096)(self._build_suffix)
+
+    def _build_prefix(self, operations: Tuple[str, ...]) -> str:
+        # replace em vez de format: o template tem chaves do JSON de resposta
+        return self.prefix_template.replace(
+            "{operations}", "\n".join(f"- {op}" for op in operations)
+        )
+
+    def _build_suffix(self, user_id: str) -> str:
+        return self.suffix_template.format(user_id=user_id)
+
+    def messages(self, operations: Tuple[str, ...], user_id: str) -> List[Dict[str, str]]:
+        """Mensagens de sistema: prefixo estático seguido do sufixo do usuário"""
+        return [
+            {"role": "system", "content": self.prefix(operations)},
+            {"role": "system", "content": self.suffix(user_id)}
+        ]
+
+class PromptRegistry:
+    """Templates de prompt por nome, compilados uma vez por processo"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        self._templates[template.name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"Template de prompt desconhecido: {name}") from None
+
+    def names(self) -> List[str]:
+        return list(self._templates)
+
+prompt_registry = PromptRegistry()
+# Escolha de operação com resposta em JSON (process_query)
+prompt_registry.register(PromptTemplate("operations_json", BASE_INSTRUCTIONS + JSON_ANSWER, USER_CONTEXT))
+# Resposta livre em texto, para streaming
+prompt_registry.register(PromptTemplate("answer_text", BASE_INSTRUCTIONS + TEXT_ANSWER, USER_CONTEXT))
@@ -0,0 +1,145 @@
+# Cache de Respostas do LLM
+
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import timedelta
+from typing import Any, Dict, Optional, Set
+
+import redis.asyncio as redis
+from loguru import logger
+
+from app.services.llm_router import LLMModel, LLMRouter
+
+# Palavras que não mudam o sentido da pergunta para fins de cache
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos",
+    "das", "em", "no", "na", "nos", "nas", "por", "para", "pra", "com", "e",
+    "ou", "que", "me", "meu", "minha", "meus", "minhas", "se", "ao", "aos",
+    "favor", "pfv", "oi", "ola",
+}
+
+def normalize_prompt(message: str) -> str:
+    """Normaliza caixa, acentos, pontuação, espaços e stopwords"""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    words = re.findall(r"\w+", text)
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+class LLMResponseCache:
+    """
+    Cache de respostas do LLM por usuário, modelo, mensagem normalizada e
+    versão dos dados do usuário.
+
+    A versão vem de CacheService.get_data_version, que é incrementada a
+    cada invalidação; assim, qualquer escrita nos dados do usuário torna as
+    respostas antigas inalcançáveis (elas expiram pelo TTL).
+
+    Com `similarity_threshold` (desligado por padrão), perguntas quase
+    idênticas (Jaccard entre os conjuntos de palavras normalizadas) também
+    contam como acerto, desde que as palavras diferentes não tenham
+    dígitos: "gastos da obra 12" não reaproveita a resposta da obra 13.
+    """
+
+    def __init__(self, redis_client: redis.Redis, cache_service,
+                 ttl: timedelta = timedelta(hours=1),
+                 similarity_threshold: Optional[float] = None,
+                 max_index_entries: int = 50):
+        self.redis = redis_client
+        self.cache_service = cache_service
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_index_entries = max_index_entries
+        self.router = LLMRouter()
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0,
+                      "latency_saved": 0.0, "usd_saved": 0.0}
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return f"llm_response:{scope}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    async def _scope(self, user_id: str, model: str) -> str:
+        version = await self.cache_service.get_data_version(user_id)
+        return f"{user_id}:{model}:{version}"
+
+    @staticmethod
+    def _similarity(a: Set[str], b: Set[str]) -> float:
+        if not a or not b:
+            return 0.0
+        # Números, datas e códigos mudam a resposta mesmo sendo uma palavra só
+        if any(any(char.isdigit() for char in word) for word in a ^ b):
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    async def get(self, user_id: str, model: str, message: str) -> Optional[Dict[str, Any]]:
+        """Retorna a resposta guardada para a mensagem (ou uma quase idêntica)"""
+        normalized = normalize_prompt(message)
+        if not normalized:
+            return None
+        try:
+            scope = await self._scope(user_id, model)
+            cached = await self.redis.get(self._key(scope, normalized))
+            similar = False
+
+            if not cached and self.similarity_threshold:
+                words = set(normalized.split())
+                best_score, best_prompt = 0.0, None
+                for prompt in await self.redis.lrange(f"llm_response_index:{scope}", 0, -1):
+                    score = self._similarity(words, set(prompt.split()))
+                    if score > best_score:
+                        best_score, best_prompt = score, prompt
+                if best_prompt and best_score >= self.similarity_threshold:
+                    cached = await self.redis.get(self._key(scope, best_prompt))
+                    similar = cached is not None
+
+            if not cached:
+                self.stats["misses"] += 1
+                return None
+
+            entry = json.loads(cached)
+            self.stats["hits"] += 1
+            self.stats["similar_hits"] += int(similar)
+            self.stats["latency_saved"] += entry.get("latency", 0.0)
+            self.stats["usd_saved"] += self._estimate_cost(model, message)
+            return entry
+        except Exception as e:
+            logger.error(f"LLM response cache GET error: {e}")
+            return None
+
+    async def set(self, user_id: str, model: str, message: str,
+                  result: Dict[str, Any], latency: float) -> None:
+        """Guarda a resposta do LLM e o tempo que ela levou para ser gerada"""
+        normalized = normalize_prompt(message)
+        if not normalized:
+            return
+        try:
+            scope = await self._scope(user_id, model)
+            ttl_seconds = int(self.ttl.total_seconds())
+            index_key = f"llm_response_index:{scope}"
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(self._key(scope, normalized), ttl_seconds,
+                           json.dumps({**result, "latency": latency}))
+                if self.similarity_threshold:
+                    pipe.lrem(index_key, 0, normalized)
+                    pipe.lpush(index_key, normalized)
+                    pipe.ltrim(index_key, 0, self.max_index_entries - 1)
+                    pipe.expire(index_key, ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"LLM response cache SET error: {e}")
+
+    def _estimate_cost(self, model: str, message: str) -> float:
+        """Custo evitado, usando a tabela do LLMRouter"""
+        try:
+            llm_model = LLMModel(model)
+        except ValueError:
+            llm_model = model  # fora da tabela: _estimate_cost usa o custo padrão
+        return self.router._estimate_cost(llm_model, message)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
@@ -0,0 +1,100 @@
+# Contagem de tokens para orçamento de contexto
+
+from functools import lru_cache
+from typing import Dict, List, Optional
+import math
+import os
+import re
+import threading
+from loguru import logger
+
+try:
+    import tiktoken
+except ImportError:  # opcional, cai na aproximação abaixo
+    tiktoken = None
+
+# Tokenizer BPE usado como referência (o cache do arquivo fica em TIKTOKEN_CACHE_DIR)
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Custo fixo de cada mensagem no formato de chat (papel + separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMER_TOKENS = 2
+# Peso da última medição do OpenRouter na correção por modelo
+CALIBRATION_WEIGHT = 0.2
+
+WORD_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+class TokenCounter:
+    """
+    Conta tokens de textos e mensagens de chat.
+
+    Usa o tokenizer BPE do tiktoken quando disponível; sem ele, aproxima
+    pelo tamanho das palavras (~4 caracteres por token, pontuação à parte).
+    Cada modelo do OpenRouter tem seu próprio tokenizer, então a contagem
+    é corrigida por modelo com o prompt_tokens devolvido em cada resposta
+    (média móvel da razão real/estimado).
+    """
+
+    def __init__(self, encoding_name: str = TOKENIZER_ENCODING):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                logger.warning(f"Tokenizer {encoding_name} indisponível ({e}), usando aproximação")
+        self._ratios: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Prompts de sistema e turnos se repetem muito entre chamadas
+        self.count = lru_cache(maxsize=4096)(self._count)
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return sum(math.ceil(len(piece) / 4) for piece in WORD_PIECES.findall(text))
+
+    def ratio(self, model: Optional[str]) -> float:
+        return self._ratios.get(model, 1.0) if model else 1.0
+
+    def count_messages(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+        """Tokens de prompt de uma lista de mensagens, corrigidos para o modelo"""
+        raw = self.raw_count_messages(messages)
+        return math.ceil(raw * self.ratio(model))
+
+    def raw_count_messages(self, messages: List[Dict[str, str]]) -> int:
+        return sum(
+            self.count(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+            for message in messages
+        ) + REPLY_PRIMER_TOKENS
+
+    def calibrate(self, model: str, messages: List[Dict[str, str]], actual: Optional[int]) -> None:
+        """Ajusta a correção do modelo com o prompt_tokens real de uma chamada"""
+        if not actual or not model:
+            return
+        estimated = self.raw_count_messages(messages)
+        if not estimated:
+            return
+        observed = min(max(actual / estimated, 0.5), 2.0)
+        with self._lock:
+            current = self._ratios.get(model)
+            self._ratios[model] = observed if current is None else \
+                current + CALIBRATION_WEIGHT * (observed - current)
+
+    def snapshot(self) -> Dict:
+        return {
+            "tokenizer": TOKENIZER_ENCODING if self.exact else "aproximado",
+            "ratios": {model: round(ratio, 3) for model, ratio in self._ratios.items()}
+        }
+
+_token_counter: Optional[TokenCounter] = None
+
+def get_token_counter() -> TokenCounter:
+    """Contador compartilhado pelo processo (carrega o tokenizer uma vez)"""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
@@ -0,0 +1,121 @@
+"""
+Single-flight request coalescing
+Concurrent cache misses for the same key share one fetch, both inside a
+worker (shared future) and across workers (short Redis lock)
+"""
+import redis.asyncio as redis
+import asyncio
+import uuid
+from typing import Optional, Any, Dict, Callable, Awaitable
+from datetime import timedelta
+from loguru import logger
+
+# Deletes the lock only if it is still held by the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    Within a process, the first caller starts `fetch` in a task and every
+    caller awaits that task. Across workers, the first caller takes a short Redis
+    lock; workers that lose the race poll `wait_for` (usually a cache read)
+    until the winner publishes its result, and fall back to fetching
+    themselves if the lock disappears or expires without a result.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None,
+                 lock_ttl: timedelta = timedelta(seconds=5),
+                 poll_interval: float = 0.05):
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced_local": 0, "coalesced_remote": 0}
+
+    async def do(self, key: str,
+                 fetch: Callable[[], Awaitable[Any]],
+                 wait_for: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Run `fetch` once for all concurrent callers of `key`"""
+        self.stats["calls"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced_local"] += 1
+        else:
+            # The fetch runs in its own task, which every caller (the first
+            # one included) only awaits: a caller cancelled mid-flight, e.g.
+            # on client disconnect, doesn't cancel it for the others
+            task = asyncio.ensure_future(self._lead(key, fetch, wait_for))
+            self._inflight[key] = task
+            # Mark the exception as retrieved when nobody else was waiting
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def _lead(self, key: str,
+                    fetch: Callable[[], Awaitable[Any]],
+                    wait_for: Optional[Callable[[], Awaitable[Any]]]) -> Any:
+        try:
+            return await self._run(key, fetch, wait_for)
+        finally:
+            del self._inflight[key]
+
+    async def _run(self, key: str,
+                   fetch: Callable[[], Awaitable[Any]],
+                   wait_for: Optional[Callable[[], Awaitable[Any]]]) -> Any:
+        if self.redis is None or wait_for is None:
+            return await self._execute(fetch)
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(
+                lock_key, token, nx=True, px=int(self.lock_ttl.total_seconds() * 1000)
+            )
+        except Exception as e:
+            logger.error(f"Single-flight lock error: {e}")
+            return await self._execute(fetch)
+
+        if acquired:
+            try:
+                return await self._execute(fetch)
+            finally:
+                await self._release(lock_key, token)
+
+        # Another worker is fetching: wait for its result to show up
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl.total_seconds()
+        try:
+            while loop.time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                result = await wait_for()
+                if result is not None:
+                    self.stats["coalesced_remote"] += 1
+                    return result
+                if not await self.redis.exists(lock_key):
+                    break
+        except Exception as e:
+            logger.error(f"Single-flight wait error: {e}")
+        return await self._execute(fetch)
+
+    async def _execute(self, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["executions"] += 1
+        return await fetch()
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        try:
+            await self.redis.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            logger.error(f"Single-flight unlock error: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return call counters, including how many fetches were saved"""
+        return {
+            **self.stats,
+            "saved": self.stats["coalesced_local"] + self.stats["coalesced_remote"]
+        }
@@ -0,0 +1,193 @@
+-- Benchmark da busca por trigramas (migrations/002_busca.sql)
+-- Gera os dados sintéticos, compara search_all com ILIKE '%termo%' (versão
+-- anterior) e com os índices de trigramas para termos comuns, raros, com e
+-- sem acento e com erro de digitação, e percorre as páginas de buscar().
+--
+-- Execute em um Postgres local (15+) com pg_trgm e unaccent (pacote
+-- contrib), nunca no banco do Supabase:
+--   psql "$DATABASE_URL" -f database/benchmarks/busca.sql
+--   psql "$DATABASE_URL" -v lancamentos=1000000 -f database/benchmarks/busca.sql
+
+\set ON_ERROR_STOP on
+\pset footer off
+
+\ir schema.sql
+-- No Supabase as extensões ficam no schema extensions, que já está no search_path
+SET search_path = bench, public, extensions;
+\timing on
+\ir dados_sinteticos.sql
+\timing off
+
+-- Versão anterior aos índices, para comparação
+CREATE FUNCTION search_all_ilike(p_user_id UUID, p_query TEXT)
+RETURNS JSON AS $$
+BEGIN
+  RETURN json_build_object(
+    'obras', (
+      SELECT json_agg(row_to_json(o))
+      FROM obras o
+      WHERE user_id = p_user_id
+        AND (
+          nome ILIKE '%' || p_query || '%' OR
+          cliente ILIKE '%' || p_query || '%' OR
+          endereco ILIKE '%' || p_query || '%'
+        )
+      LIMIT 5
+    ),
+    'fornecedores', (
+      SELECT json_agg(row_to_json(f))
+      FROM fornecedores f
+      WHERE user_id = p_user_id
+        AND (
+          nome ILIKE '%' || p_query || '%' OR
+          cnpj ILIKE '%' || p_query || '%' OR
+          email ILIKE '%' || p_query || '%'
+        )
+      LIMIT 5
+    ),
+    'lancamentos', (
+      SELECT json_agg(row_to_json(l))
+      FROM lancamentos_financeiros l
+      WHERE user_id = p_user_id
+        AND (
+          descricao ILIKE '%' || p_query || '%' OR
+          numero_documento ILIKE '%' || p_query || '%'
+        )
+      LIMIT 5
+    )
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Linhas devolvidas por search_all (json_agg sem linhas vira null)
+CREATE FUNCTION total_resultados(p_resultado JSON)
+RETURNS INT AS $$
+  SELECT COALESCE(SUM(json_array_length(p_resultado -> chave)), 0)::int
+  FROM unnest(ARRAY['obras', 'fornecedores', 'lancamentos']) chave
+  WHERE json_typeof(p_resultado -> chave) = 'array'
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Usuário com mais lançamentos (a distribuição dos dados é desigual)
+SELECT user_id AS usuario, COUNT(*) AS lancamentos_usuario
+FROM lancamentos_financeiros
+GROUP BY user_id
+ORDER BY COUNT(*) DESC
+LIMIT 1 \gset
+
+-- Um número de documento que existe para esse usuário
+SELECT numero_documento AS documento
+FROM lancamentos_financeiros
+WHERE user_id = :'usuario'
+LIMIT 1 \gset
+
+\echo '[1] Migration (extensões e índices de trigramas)...'
+\timing on
+\ir ../migrations/002_busca.sql
+\timing off
+\ir ../functions/analytics_functions.sql
+ANALYZE obras;
+ANALYZE fornecedores;
+ANALYZE lancamentos_financeiros;
+
+CREATE TEMP TABLE termos (caso TEXT, termo TEXT);
+INSERT INTO termos VALUES
+  ('comum', 'cimento'),
+  ('raro', :'documento'),
+  ('com acento', 'São José'),
+  ('sem acento', 'sao jose'),
+  ('erro de digitação', 'cimnto');
+
+\echo '[2] search_all com ILIKE e com trigramas (usuário com' :lancamentos_usuario 'lançamentos)...'
+SELECT
+  caso,
+  termo,
+  bench_ms(format('SELECT search_all_ilike(%L, %L)', :'usuario', termo), 5) AS ilike_ms,
+  bench_ms(format('SELECT search_all(%L, %L)', :'usuario', termo), 20) AS trigramas_ms,
+  total_resultados(search_all_ilike(:'usuario', termo)) AS resultados_ilike,
+  total_resultados(search_all(:'usuario', termo)) AS resultados_trigramas
+FROM termos;
+
+\echo '[3] Plano de buscar() para um termo raro (deve usar os índices de trigramas)...'
+EXPLAIN (ANALYZE, BUFFERS, COSTS OFF)
+SELECT * FROM buscar(:'usuario', :'documento', 20);
+
+\echo '[4] Páginas de buscar() para "cimento" (cursor = última linha da página)...'
+CREATE TEMP TABLE paginas (pagina INT, ms NUMERIC, linhas INT, rank_min NUMERIC);
+SELECT set_config('bench.usuario', :'usuario', false) \g /dev/null
+DO $$
+DECLARE
+  usuario UUID := current_setting('bench.usuario')::uuid;
+  cursor_rank NUMERIC;
+  cursor_tipo TEXT;
+  cursor_id UUID;
+  inicio TIMESTAMPTZ;
+  linhas INT;
+BEGIN
+  FOR pagina IN 1..5 LOOP
+    inicio := clock_timestamp();
+    CREATE TEMP TABLE pagina_atual ON COMMIT DROP AS
+    SELECT * FROM buscar(usuario, 'cimento', 50, cursor_rank, cursor_tipo, cursor_id);
+    SELECT COUNT(*) INTO linhas FROM pagina_atual;
+    INSERT INTO paginas
+    SELECT pagina, ROUND((EXTRACT(EPOCH FROM clock_timestamp() - inicio) * 1000)::numeric, 3),
+           linhas, MIN(rank)
+    FROM pagina_atual;
+    EXIT WHEN linhas = 0;
+    SELECT rank, tipo, id INTO cursor_rank, cursor_tipo, cursor_id
+    FROM pagina_atual
+    ORDER BY rank, tipo, id
+    LIMIT 1;
+    DROP TABLE pagina_atual;
+  END LOOP;
+END $$;
+SELECT * FROM paginas ORDER BY pagina;
+
+\echo '[5] As listas do usuário acham as mesmas linhas que o filtro sem índice...'
+-- Lançamentos e fornecedores do usuário que casam com o termo, com e sem
+-- o filtro das chaves (chaves_trecho / chaves_parecidas)
+CREATE FUNCTION conferir_chaves(p_user_id UUID, p_termo TEXT)
+RETURNS TABLE (sem_chaves BIGINT, com_chaves BIGINT) AS $$
+DECLARE
+  termo TEXT := normalizar_busca(p_termo);
+  padrao TEXT := padrao_busca(normalizar_busca(p_termo));
+  trecho TEXT[] := chaves_trecho(p_user_id, normalizar_busca(p_termo));
+  parecidas TEXT[];
+BEGIN
+  IF termo ~ '[0-9]' THEN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', '1', true);
+  END IF;
+  parecidas := chaves_parecidas(p_user_id, termo);
+  RETURN QUERY
+  SELECT
+    (SELECT COUNT(*) FROM lancamentos_financeiros l
+     WHERE l.user_id = p_user_id
+       AND (normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, '')) LIKE padrao
+            OR termo <% normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))))
+    + (SELECT COUNT(*) FROM fornecedores f
+       WHERE f.user_id = p_user_id
+         AND (normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')) LIKE padrao
+              OR termo <% normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')))),
+    (SELECT COUNT(*) FROM lancamentos_financeiros l
+     WHERE l.user_id = p_user_id
+       AND (chaves_busca(l.user_id, normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))) @> trecho
+            OR chaves_busca(l.user_id, normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))) && parecidas)
+       AND (normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, '')) LIKE padrao
+            OR termo <% normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))))
+    + (SELECT COUNT(*) FROM fornecedores f
+       WHERE f.user_id = p_user_id
+         AND (chaves_busca(f.user_id, normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, ''))) @> trecho
+              OR chaves_busca(f.user_id, normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, ''))) && parecidas)
+         AND (normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')) LIKE padrao
+              OR termo <% normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, ''))));
+END;
+$$ LANGUAGE plpgsql
+SET pg_trgm.word_similarity_threshold = 0.5;
+
+-- Trecho no meio de uma palavra, várias palavras, separadores nas pontas,
+-- erro de digitação, documento inteiro e só o final dele
+SELECT termo, c.sem_chaves, c.com_chaves,
+       CASE WHEN c.sem_chaves = c.com_chaves THEN 'OK' ELSE 'ERRO' END AS resultado
+FROM unnest(ARRAY[
+  'cimento', 'imen', 'cimnto', 'pedido 2', 'cp-ii - ped', '-ii', 'ii -', 'sao jose', 'jose 0',
+  'fornecedor.com', normalizar_busca(:'documento'), right(:'documento', 5)
+]) termo, conferir_chaves(:'usuario', termo) c;
@@ -0,0 +1,110 @@
+-- Dados sintéticos para os benchmarks (depois de schema.sql)
+-- Tamanho configurável com variáveis do psql, por exemplo:
+--   psql -v usuarios=200 -v lancamentos=1000000 -f ...
+-- Ids derivados de md5 ('usuario:N', 'obra:N', 'fornecedor:N'), então os
+-- benchmarks acham o mesmo usuário e a mesma obra em qualquer escala.
+-- Os lançamentos se concentram nas obras de número baixo: a obra 0 é a
+-- mais movimentada.
+
+\if :{?usuarios}
+\else
+  \set usuarios 1000
+\endif
+\if :{?obras_por_usuario}
+\else
+  \set obras_por_usuario 20
+\endif
+\if :{?fornecedores_por_usuario}
+\else
+  \set fornecedores_por_usuario 50
+\endif
+\if :{?itens_por_obra}
+\else
+  \set itens_por_obra 20
+\endif
+\if :{?lancamentos}
+\else
+  \set lancamentos 10000000
+\endif
+
+\echo 'Gerando' :usuarios 'usuários,' :obras_por_usuario 'obras por usuário,' :lancamentos 'lançamentos...'
+
+SELECT setseed(0.42);
+
+INSERT INTO obras (id, user_id, nome, responsavel, cliente, status, data_inicio, data_termino, endereco, created_at)
+SELECT
+  md5('obra:' || n)::uuid,
+  md5('usuario:' || (n % :usuarios))::uuid,
+  (ARRAY['Residencial', 'Edifício Comercial', 'Galpão Logístico', 'Reforma', 'Condomínio'])[1 + n % 5]
+    || ' ' || (ARRAY['Jardim América', 'Vila Olímpia', 'São João', 'Ipê Amarelo', 'Boa Vista'])[1 + (n / 5) % 5]
+    || ' ' || n,
+  'Responsável ' || (n % 97),
+  (ARRAY['Construtora Ávila', 'Incorporadora Sol', 'João Araújo', 'Mercado Econômico', 'Prefeitura'])[1 + n % 5]
+    || ' ' || (n % 389),
+  (ARRAY['Em andamento', 'Em andamento', 'Paralisada', 'Finalizada'])[1 + n % 4],
+  DATE '2022-01-01' + (n % 900),
+  DATE '2022-01-01' + (n % 900) + 180 + (n % 365),
+  'Rua ' || (ARRAY['das Acácias', 'São Bento', 'Conceição', 'XV de Novembro'])[1 + n % 4] || ', ' || (n % 1000),
+  TIMESTAMPTZ '2022-01-01' + (n % 900) * INTERVAL '1 day' + n * INTERVAL '1 second'
+FROM generate_series(0, :usuarios * :obras_por_usuario - 1) n;
+
+-- O fornecedor N é do usuário N % usuarios
+INSERT INTO fornecedores (id, user_id, nome, cnpj, email, created_at)
+SELECT
+  md5('fornecedor:' || n)::uuid,
+  md5('usuario:' || (n % :usuarios))::uuid,
+  (ARRAY['Cimentos', 'Madeireira', 'Elétrica', 'Hidráulica', 'Aço', 'Tintas', 'Vidraçaria', 'Locação'])[1 + n % 8]
+    || ' ' || (ARRAY['São José', 'Três Irmãos', 'Paraná', 'União', 'Itaú', 'Nordeste'])[1 + (n / 8) % 6]
+    || ' ' || n,
+  lpad((n * 7919 % 100000000)::text, 8, '0') || '0001' || lpad((n % 100)::text, 2, '0'),
+  'contato' || n || '@fornecedor.com.br',
+  TIMESTAMPTZ '2022-01-01' + n * INTERVAL '1 minute'
+FROM generate_series(0, :usuarios * :fornecedores_por_usuario - 1) n;
+
+INSERT INTO itens_orcamento (user_id, obra_id, descricao, valor_total_orcado)
+SELECT
+  md5('usuario:' || (o % :usuarios))::uuid,
+  md5('obra:' || o)::uuid,
+  (ARRAY['Fundação', 'Estrutura', 'Alvenaria', 'Cobertura', 'Instalações elétricas',
+         'Instalações hidráulicas', 'Revestimento', 'Pintura', 'Esquadrias', 'Acabamento'])[1 + k % 10],
+  round((1000 + random() * 50000)::numeric, 2)
+FROM generate_series(0, :usuarios * :obras_por_usuario - 1) o
+CROSS JOIN generate_series(1, :itens_por_obra) k;
+
+INSERT INTO lancamentos_financeiros (
+  user_id, obra_id, fornecedor_id, descricao, valor, data_emissao, data_vencimento,
+  numero_documento, status, created_at
+)
+SELECT
+  md5('usuario:' || (o % :usuarios))::uuid,
+  md5('obra:' || o)::uuid,
+  md5('fornecedor:' || (o % :usuarios + :usuarios * (i % :fornecedores_por_usuario)))::uuid,
+  (ARRAY['Cimento CP-II', 'Areia média', 'Brita 1', 'Aço CA-50', 'Tijolo cerâmico', 'Mão de obra',
+         'Material elétrico', 'Tubos e conexões', 'Tinta acrílica', 'Telhas'])[1 + i % 10] || ' - pedido ' || i,
+  round((50 + r * 20000)::numeric, 2),
+  emissao,
+  emissao + 30,
+  'NF-' || lpad(i::text, 9, '0'),
+  CASE WHEN i % 10 = 0 THEN 'pendente' WHEN i % 10 = 1 THEN 'cancelado' ELSE 'pago' END,
+  emissao::timestamptz + (i % 86400) * INTERVAL '1 second'
+FROM (
+  SELECT
+    i,
+    floor(power(random(), 2) * :usuarios * :obras_por_usuario)::bigint AS o,
+    random() AS r,
+    CURRENT_DATE - 1000 + (i % 1030)::int AS emissao
+  FROM generate_series(1, :lancamentos) i
+) g;
+
+-- Chaves estrangeiras e índices mínimos depois da carga (bem mais rápido)
+ALTER TABLE itens_orcamento ADD FOREIGN KEY (obra_id) REFERENCES obras(id) ON DELETE CASCADE;
+ALTER TABLE lancamentos_financeiros ADD FOREIGN KEY (obra_id) REFERENCES obras(id) ON DELETE CASCADE;
+ALTER TABLE lancamentos_financeiros ADD FOREIGN KEY (fornecedor_id) REFERENCES fornecedores(id);
+CREATE INDEX ON obras (user_id);
+CREATE INDEX ON itens_orcamento (obra_id);
+CREATE INDEX ON lancamentos_financeiros (obra_id);
+
+VACUUM ANALYZE obras;
+VACUUM ANALYZE fornecedores;
+VACUUM ANALYZE itens_orcamento;
+VACUUM ANALYZE lancamentos_financeiros;
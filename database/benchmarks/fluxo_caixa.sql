@@ -0,0 +1,199 @@
+-- Benchmark do fluxo de caixa mensal (migrations/003_fluxo_caixa.sql)
+-- Gera os dados sintéticos, compara get_fluxo_caixa antes e depois do
+-- resumo, mede get_fluxo_caixa_periodo por semana, mês e trimestre e o
+-- custo dos triggers nas escritas, e confere as séries contra a agregação
+-- direta dos lançamentos (intervalos com meses incompletos, depois de
+-- inserts, updates, deletes e lançamentos retroativos). Sai com erro se
+-- divergir.
+--
+-- Execute em um Postgres local (15+), nunca no banco do Supabase:
+--   psql "$DATABASE_URL" -f database/benchmarks/fluxo_caixa.sql
+--   psql "$DATABASE_URL" -v lancamentos=1000000 -f database/benchmarks/fluxo_caixa.sql
+
+\set ON_ERROR_STOP on
+\pset footer off
+
+\ir schema.sql
+\timing on
+\ir dados_sinteticos.sql
+\timing off
+
+-- Versão anterior ao resumo, para comparação (a original aninhava
+-- SUM dentro de json_agg e falhava; aqui com a agregação em subconsulta)
+CREATE FUNCTION get_fluxo_caixa_sem_resumo(p_user_id UUID, p_obra_id UUID DEFAULT NULL)
+RETURNS JSON AS $$
+BEGIN
+  RETURN (
+    SELECT json_agg(
+      json_build_object(
+        'mes', TO_CHAR(m.mes, 'YYYY-MM'),
+        'entradas', 0,
+        'saidas', m.saidas,
+        'num_lancamentos', m.num_lancamentos
+      )
+      ORDER BY m.mes
+    )
+    FROM (
+      SELECT
+        date_trunc('month', data_emissao) AS mes,
+        COALESCE(SUM(CASE WHEN valor < 0 THEN ABS(valor) ELSE valor END), 0) AS saidas,
+        COUNT(*) AS num_lancamentos
+      FROM lancamentos_financeiros
+      WHERE user_id = p_user_id
+        AND (p_obra_id IS NULL OR obra_id = p_obra_id)
+        AND data_emissao >= CURRENT_DATE - INTERVAL '12 months'
+      GROUP BY date_trunc('month', data_emissao)
+    ) m
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+\echo '[1] Migration e carga inicial do resumo...'
+\timing on
+\ir ../migrations/003_fluxo_caixa.sql
+\timing off
+\ir ../functions/analytics_functions.sql
+ANALYZE fluxo_caixa_mensal;
+
+-- Depois da migration: funções SQL validam o corpo na criação
+-- Série calculada direto dos lançamentos, para conferir o resumo
+CREATE FUNCTION fluxo_caixa_direto(p_user_id UUID, p_inicio DATE, p_fim DATE,
+                                   p_granularidade TEXT, p_obra_id UUID DEFAULT NULL)
+RETURNS TABLE (inicio DATE, saidas NUMERIC, num_lancamentos BIGINT) AS $$
+  SELECT date_trunc(p_granularidade, data_emissao)::date, SUM(ABS(valor)), COUNT(*)
+  FROM lancamentos_financeiros
+  WHERE user_id = p_user_id
+    AND (p_obra_id IS NULL OR obra_id = p_obra_id)
+    AND data_emissao BETWEEN p_inicio AND p_fim
+  GROUP BY 1
+$$ LANGUAGE sql;
+
+-- Séries do resumo que não batem com a agregação direta
+CREATE FUNCTION fluxo_caixa_divergencias(p_user_id UUID, p_obra_id UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+  SELECT COUNT(*)
+  FROM (VALUES
+    (CURRENT_DATE - 365, CURRENT_DATE),
+    (date_trunc('month', CURRENT_DATE - 400)::date, (date_trunc('month', CURRENT_DATE) - INTERVAL '1 day')::date),
+    (CURRENT_DATE - 40, CURRENT_DATE - 20),
+    (CURRENT_DATE - 1000, CURRENT_DATE + 30)
+  ) AS intervalos(inicio, fim)
+  CROSS JOIN (VALUES ('week'), ('month'), ('quarter')) AS g(granularidade)
+  CROSS JOIN LATERAL (
+    (
+      SELECT (p ->> 'inicio')::date, (p ->> 'saidas')::numeric, (p ->> 'num_lancamentos')::bigint
+      FROM json_array_elements(get_fluxo_caixa_periodo(
+        p_user_id, intervalos.inicio, intervalos.fim, g.granularidade, p_obra_id
+      )) p
+      EXCEPT ALL
+      SELECT * FROM fluxo_caixa_direto(p_user_id, intervalos.inicio, intervalos.fim, g.granularidade, p_obra_id)
+    )
+    UNION ALL
+    (
+      SELECT * FROM fluxo_caixa_direto(p_user_id, intervalos.inicio, intervalos.fim, g.granularidade, p_obra_id)
+      EXCEPT ALL
+      SELECT (p ->> 'inicio')::date, (p ->> 'saidas')::numeric, (p ->> 'num_lancamentos')::bigint
+      FROM json_array_elements(get_fluxo_caixa_periodo(
+        p_user_id, intervalos.inicio, intervalos.fim, g.granularidade, p_obra_id
+      )) p
+    )
+  ) diferencas
+$$ LANGUAGE sql;
+
+-- Usuário com mais lançamentos (a distribuição dos dados é desigual)
+SELECT user_id AS usuario, COUNT(*) AS lancamentos_usuario
+FROM lancamentos_financeiros
+GROUP BY user_id
+ORDER BY COUNT(*) DESC
+LIMIT 1 \gset
+SELECT obra_id AS obra FROM lancamentos_financeiros WHERE user_id = :'usuario' LIMIT 1 \gset
+SELECT COUNT(*) AS linhas_resumo FROM fluxo_caixa_mensal \gset
+
+\echo '[2] get_fluxo_caixa antes e depois do resumo (usuário com' :lancamentos_usuario 'lançamentos, resumo com' :linhas_resumo 'linhas)...'
+SELECT
+  'usuário, 12 meses' AS consulta,
+  bench_ms(format('SELECT get_fluxo_caixa_sem_resumo(%L)', :'usuario'), 10) AS antes_ms,
+  bench_ms(format('SELECT get_fluxo_caixa(%L)', :'usuario'), 100) AS depois_ms
+UNION ALL
+SELECT
+  'uma obra, 12 meses',
+  bench_ms(format('SELECT get_fluxo_caixa_sem_resumo(%L, %L)', :'usuario', :'obra'), 10),
+  bench_ms(format('SELECT get_fluxo_caixa(%L, %L)', :'usuario', :'obra'), 100);
+
+\echo '[3] get_fluxo_caixa_periodo por granularidade e intervalo...'
+SELECT
+  granularidade,
+  dias,
+  bench_ms(format('SELECT get_fluxo_caixa_periodo(%L, %L, %L, %L)',
+                  :'usuario', CURRENT_DATE - dias, CURRENT_DATE, granularidade), 20) AS periodo_ms,
+  bench_ms(format('SELECT array_agg(f) FROM fluxo_caixa_direto(%L, %L, %L, %L) f',
+                  :'usuario', CURRENT_DATE - dias, CURRENT_DATE, granularidade), 5) AS direto_ms
+FROM (VALUES ('week'), ('month'), ('quarter')) AS g(granularidade)
+CROSS JOIN (VALUES (90), (365), (1000)) AS d(dias)
+ORDER BY granularidade, dias;
+
+\echo '[4] Custo dos triggers nas escritas...'
+CREATE TEMP TABLE lote AS
+SELECT
+  o.user_id, o.id AS obra_id, 'Lançamento de teste ' || k AS descricao,
+  round((100 + random() * 5000)::numeric, 2) AS valor,
+  CURRENT_DATE - (k % 60) AS data_emissao
+FROM generate_series(1, 500) k
+JOIN LATERAL (
+  SELECT id, user_id FROM obras WHERE user_id = :'usuario' ORDER BY id OFFSET k % :obras_por_usuario LIMIT 1
+) o ON true;
+
+\set inserir_lote 'INSERT INTO lancamentos_financeiros (user_id, obra_id, descricao, valor, data_emissao) SELECT user_id, obra_id, descricao, valor, data_emissao FROM lote'
+\set inserir_um 'INSERT INTO lancamentos_financeiros (user_id, obra_id, descricao, valor, data_emissao) SELECT user_id, obra_id, descricao, valor, data_emissao FROM lote LIMIT 1'
+
+ALTER TABLE lancamentos_financeiros DISABLE TRIGGER USER;
+SELECT bench_ms(:'inserir_lote', 20) AS lote_sem_triggers_ms, bench_ms(:'inserir_um', 200) AS um_sem_triggers_ms \gset
+ALTER TABLE lancamentos_financeiros ENABLE TRIGGER USER;
+-- O que entrou sem triggers não está no resumo (só meses recentes)
+SELECT recalcular_fluxo_caixa((CURRENT_DATE - 60)::date) \g /dev/null
+SELECT bench_ms(:'inserir_lote', 20) AS lote_com_triggers_ms, bench_ms(:'inserir_um', 200) AS um_com_triggers_ms \gset
+
+SELECT
+  'insert de 500 lançamentos' AS escrita, :lote_sem_triggers_ms AS sem_triggers_ms, :lote_com_triggers_ms AS com_triggers_ms
+UNION ALL
+SELECT 'insert de 1 lançamento', :um_sem_triggers_ms, :um_com_triggers_ms;
+
+\echo '[5] Séries iguais à agregação direta depois de inserts, updates e deletes...'
+-- Mudança de status não altera o resumo; valor, data e obra sim
+UPDATE lancamentos_financeiros SET status = 'pago'
+WHERE user_id = :'usuario' AND status = 'pendente' AND data_emissao < CURRENT_DATE - 300;
+UPDATE lancamentos_financeiros SET valor = -valor * 2, data_emissao = data_emissao - 200
+WHERE id IN (SELECT id FROM lancamentos_financeiros WHERE obra_id = :'obra' LIMIT 100);
+UPDATE lancamentos_financeiros SET obra_id = (
+  SELECT id FROM obras WHERE user_id = :'usuario' AND id <> :'obra' ORDER BY id LIMIT 1
+)
+WHERE id IN (SELECT id FROM lancamentos_financeiros WHERE obra_id = :'obra' LIMIT 50);
+-- Lançamento retroativo em um mês antigo
+INSERT INTO lancamentos_financeiros (user_id, obra_id, descricao, valor, data_emissao)
+SELECT :'usuario', :'obra', 'Nota antiga', 1234.56, CURRENT_DATE - 700;
+DELETE FROM lancamentos_financeiros
+WHERE id IN (SELECT id FROM lancamentos_financeiros WHERE user_id = :'usuario' LIMIT 100);
+-- Obra apagada: os lançamentos somem em cascata sem erro no trigger
+DELETE FROM obras WHERE id = (
+  SELECT id FROM obras WHERE user_id = :'usuario' AND id <> :'obra' ORDER BY id DESC LIMIT 1
+);
+
+SELECT set_config('bench.usuario', :'usuario', false), set_config('bench.obra', :'obra', false) \g /dev/null
+DO $$
+DECLARE
+  usuario UUID := current_setting('bench.usuario')::uuid;
+  obra UUID := current_setting('bench.obra')::uuid;
+  divergencias BIGINT;
+BEGIN
+  divergencias := fluxo_caixa_divergencias(usuario) + fluxo_caixa_divergencias(usuario, obra);
+  IF divergencias > 0 THEN
+    RAISE EXCEPTION 'ERRO - % períodos do resumo diferentes da agregação direta', divergencias;
+  END IF;
+  IF EXISTS (
+    SELECT 1 FROM fluxo_caixa_mensal r
+    WHERE r.num_lancamentos = 0 OR NOT EXISTS (SELECT 1 FROM obras o WHERE o.id = r.obra_id)
+  ) THEN
+    RAISE EXCEPTION 'ERRO - resumo com meses vazios ou obras apagadas';
+  END IF;
+  RAISE NOTICE 'OK - séries por semana, mês e trimestre conferem com os lançamentos';
+END $$;
@@ -0,0 +1,179 @@
+-- Benchmark do resumo financeiro por obra (migrations/001_obra_financeiro.sql)
+-- Gera os dados sintéticos (10M lançamentos por padrão), compara
+-- compare_obras e get_obra_dashboard antes e depois do resumo, mede o
+-- custo dos triggers nas escritas e confere o resumo contra as somas
+-- depois de inserts, updates e deletes. Compara também os dashboards de
+-- todas as obras de um usuário, um por chamada e em lote
+-- (get_obras_dashboards). Sai com erro se divergir.
+--
+-- Execute em um Postgres local (15+), nunca no banco do Supabase:
+--   psql "$DATABASE_URL" -f database/benchmarks/obra_financeiro.sql
+--   psql "$DATABASE_URL" -v lancamentos=1000000 -f database/benchmarks/obra_financeiro.sql
+
+\set ON_ERROR_STOP on
+\pset footer off
+
+\ir schema.sql
+\timing on
+\ir dados_sinteticos.sql
+\timing off
+
+-- Versões anteriores ao resumo, para comparação
+CREATE FUNCTION compare_obras_sem_resumo(p_user_id UUID, p_obra_ids UUID[])
+RETURNS JSON AS $$
+BEGIN
+  RETURN (
+    SELECT json_agg(json_build_object(
+      'obra_id', o.id, 'nome', o.nome,
+      'orcamento', COALESCE(orcamento.total, 0), 'gasto', COALESCE(gastos.total, 0)
+    ))
+    FROM obras o
+    LEFT JOIN (
+      SELECT obra_id, SUM(valor_total_orcado) as total FROM itens_orcamento GROUP BY obra_id
+    ) orcamento ON o.id = orcamento.obra_id
+    LEFT JOIN (
+      SELECT obra_id, SUM(valor) as total FROM lancamentos_financeiros GROUP BY obra_id
+    ) gastos ON o.id = gastos.obra_id
+    WHERE o.user_id = p_user_id AND o.id = ANY(p_obra_ids)
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION dashboard_financeiro_sem_resumo(p_obra_id UUID, p_user_id UUID)
+RETURNS JSON AS $$
+BEGIN
+  RETURN (
+    SELECT json_build_object(
+      'orcamento_total', COALESCE(SUM(valor_total_orcado), 0),
+      'gasto_total', COALESCE((
+        SELECT SUM(valor) FROM lancamentos_financeiros WHERE obra_id = p_obra_id AND user_id = p_user_id
+      ), 0),
+      'saldo', COALESCE(SUM(valor_total_orcado), 0) - COALESCE((
+        SELECT SUM(valor) FROM lancamentos_financeiros WHERE obra_id = p_obra_id AND user_id = p_user_id
+      ), 0)
+    )
+    FROM itens_orcamento
+    WHERE obra_id = p_obra_id AND user_id = p_user_id
+  );
+END;
+$$ LANGUAGE plpgsql;
+
+\echo '[1] Migration e carga inicial do resumo...'
+\timing on
+\ir ../migrations/001_obra_financeiro.sql
+\timing off
+\ir ../functions/analytics_functions.sql
+
+SELECT md5('usuario:0')::uuid AS usuario, md5('obra:0')::uuid AS obra \gset
+SELECT COUNT(*) AS lancamentos_obra FROM lancamentos_financeiros WHERE obra_id = :'obra' \gset
+
+\echo '[2] Leituras antes e depois do resumo (obra 0 tem' :lancamentos_obra 'lançamentos)...'
+SELECT
+  'compare_obras (' || :obras_por_usuario || ' obras)' AS funcao,
+  bench_ms(format('SELECT compare_obras_sem_resumo(%L, ARRAY(SELECT id FROM obras WHERE user_id = %L))',
+                  :'usuario', :'usuario'), 3) AS antes_ms,
+  bench_ms(format('SELECT compare_obras(%L, ARRAY(SELECT id FROM obras WHERE user_id = %L))',
+                  :'usuario', :'usuario'), 100) AS depois_ms
+UNION ALL
+SELECT
+  'get_obra_dashboard (financeiro)',
+  bench_ms(format('SELECT dashboard_financeiro_sem_resumo(%L, %L)', :'obra', :'usuario'), 20),
+  bench_ms(format('SELECT get_obra_dashboard(%L, %L)', :'obra', :'usuario'), 100);
+
+\echo '[3] Custo dos triggers nas escritas...'
+CREATE TEMP TABLE lote AS
+SELECT
+  o.user_id, o.id AS obra_id, 'Lançamento de teste ' || k AS descricao,
+  round((100 + random() * 5000)::numeric, 2) AS valor,
+  CURRENT_DATE - (k % 60) AS data_emissao, CURRENT_DATE - (k % 60) + 30 AS data_vencimento,
+  CASE WHEN k % 3 = 0 THEN 'pendente' ELSE 'pago' END AS status
+FROM generate_series(1, 500) k
+JOIN LATERAL (
+  SELECT id, user_id FROM obras WHERE user_id = :'usuario' ORDER BY id OFFSET k % :obras_por_usuario LIMIT 1
+) o ON true;
+
+\set inserir_lote 'INSERT INTO lancamentos_financeiros (user_id, obra_id, descricao, valor, data_emissao, data_vencimento, status) SELECT user_id, obra_id, descricao, valor, data_emissao, data_vencimento, status FROM lote'
+\set inserir_um 'INSERT INTO lancamentos_financeiros (user_id, obra_id, descricao, valor, data_emissao, data_vencimento, status) SELECT user_id, obra_id, descricao, valor, data_emissao, data_vencimento, status FROM lote LIMIT 1'
+
+ALTER TABLE lancamentos_financeiros DISABLE TRIGGER USER;
+SELECT bench_ms(:'inserir_lote', 20) AS lote_sem_triggers_ms, bench_ms(:'inserir_um', 200) AS um_sem_triggers_ms \gset
+ALTER TABLE lancamentos_financeiros ENABLE TRIGGER USER;
+-- O que entrou sem triggers não está no resumo
+SELECT recalcular_obra_financeiro(id) FROM obras WHERE user_id = :'usuario' \g /dev/null
+SELECT bench_ms(:'inserir_lote', 20) AS lote_com_triggers_ms, bench_ms(:'inserir_um', 200) AS um_com_triggers_ms \gset
+
+SELECT
+  'insert de 500 lançamentos' AS escrita, :lote_sem_triggers_ms AS sem_triggers_ms, :lote_com_triggers_ms AS com_triggers_ms
+UNION ALL
+SELECT 'insert de 1 lançamento', :um_sem_triggers_ms, :um_com_triggers_ms;
+
+\echo '[4] Resumo igual às somas depois de inserts, updates e deletes...'
+UPDATE lancamentos_financeiros SET status = 'pago'
+WHERE obra_id = :'obra' AND status = 'pendente' AND data_vencimento < CURRENT_DATE - 300;
+UPDATE lancamentos_financeiros SET valor = valor * 2, obra_id = md5('obra:1')::uuid
+WHERE id IN (SELECT id FROM lancamentos_financeiros WHERE obra_id = :'obra' LIMIT 100);
+DELETE FROM lancamentos_financeiros WHERE id IN (SELECT id FROM lancamentos_financeiros WHERE obra_id = md5('obra:2')::uuid LIMIT 100);
+UPDATE itens_orcamento SET valor_total_orcado = valor_total_orcado + 1000 WHERE obra_id = :'obra';
+INSERT INTO itens_orcamento (user_id, obra_id, descricao, valor_total_orcado)
+SELECT :'usuario', :'obra', 'Aditivo', 25000;
+-- Obra apagada: os lançamentos somem em cascata sem erro no trigger
+DELETE FROM obras WHERE id = md5('obra:3')::uuid;
+
+DO $$
+DECLARE
+  divergencias BIGINT;
+BEGIN
+  SELECT COUNT(*) INTO divergencias
+  FROM obras o
+  LEFT JOIN obra_financeiro r ON r.obra_id = o.id
+  CROSS JOIN LATERAL (
+    SELECT
+      COALESCE((SELECT SUM(valor_total_orcado) FROM itens_orcamento WHERE obra_id = o.id), 0) AS orcamento,
+      COALESCE(SUM(l.valor), 0) AS gasto,
+      COUNT(*) FILTER (WHERE l.status = 'pendente') AS pendentes,
+      COUNT(*) FILTER (WHERE l.status = 'pendente' AND l.data_vencimento < CURRENT_DATE) AS vencidos
+    FROM lancamentos_financeiros l
+    WHERE l.obra_id = o.id
+  ) s
+  WHERE (o.user_id = md5('usuario:0')::uuid OR o.id IN (md5('obra:1')::uuid, md5('obra:2')::uuid))
+    AND (COALESCE(r.orcamento_total, 0) <> s.orcamento
+      OR COALESCE(r.gasto_total, 0) <> s.gasto
+      OR COALESCE(r.lancamentos_pendentes, 0) <> s.pendentes
+      OR COALESCE(r.pagamentos_vencidos, 0) <> s.vencidos);
+  IF divergencias > 0 THEN
+    RAISE EXCEPTION 'ERRO - % obras com resumo diferente das somas', divergencias;
+  END IF;
+  IF EXISTS (SELECT 1 FROM obra_financeiro WHERE obra_id = md5('obra:3')::uuid) THEN
+    RAISE EXCEPTION 'ERRO - resumo da obra apagada continua na tabela';
+  END IF;
+  RAISE NOTICE 'OK - resumo confere com as somas';
+END $$;
+
+\echo '[5] Dashboards de todas as obras do usuário: um por chamada e em lote...'
+SELECT
+  :obras_por_usuario AS obras,
+  bench_ms(format(
+    'SELECT get_obra_dashboard(id, user_id) FROM obras WHERE user_id = %L', :'usuario'
+  ), 20) AS uma_por_obra_ms,
+  bench_ms(format(
+    'SELECT get_obras_dashboards(%L, ARRAY(SELECT id FROM obras WHERE user_id = %L))', :'usuario', :'usuario'
+  ), 20) AS em_lote_ms;
+
+DO $$
+DECLARE
+  usuario UUID := md5('usuario:0')::uuid;
+  lote JSON := get_obras_dashboards(usuario, ARRAY(SELECT id FROM obras WHERE user_id = usuario));
+  divergencias BIGINT;
+BEGIN
+  SELECT COUNT(*) INTO divergencias
+  FROM obras o
+  WHERE o.user_id = usuario
+    AND (lote -> o.id::text)::jsonb IS DISTINCT FROM get_obra_dashboard(o.id, usuario)::jsonb;
+  IF divergencias > 0 THEN
+    RAISE EXCEPTION 'ERRO - % dashboards em lote diferentes de get_obra_dashboard', divergencias;
+  END IF;
+  IF get_obras_dashboards(md5('usuario:1')::uuid, ARRAY[md5('obra:0')::uuid])::text <> '{}' THEN
+    RAISE EXCEPTION 'ERRO - dashboard de obra de outro usuário';
+  END IF;
+  RAISE NOTICE 'OK - dashboards em lote iguais aos de get_obra_dashboard';
+END $$;
@@ -0,0 +1,224 @@
+-- Regressão dos planos de consulta do backend e das analytics
+-- Gera os dados sintéticos, aplica todas as migrations e functions e roda
+-- cada consulta de secure_operations.py (na forma SQL que o PostgREST
+-- executa) e cada function de analytics_functions.sql com
+-- EXPLAIN (ANALYZE, BUFFERS). Sai com erro se alguma consulta fizer
+-- varredura sequencial em uma tabela do app ou passar do seu limite de
+-- tempo (mediana de 5 execuções, depois de uma de aquecimento).
+--
+-- O EXPLAIN de uma function só mostra "Function Scan": as varreduras de
+-- dentro dela são contadas em pg_stat_xact_user_tables. Quando algo falha,
+-- os planos internos das consultas com erro são impressos (auto_explain).
+--
+-- Os limites são cerca de 3x a mediana medida com a carga padrão (10M
+-- lançamentos, 1000 usuários) em um Postgres 18 com 1 CPU; com menos
+-- dados as consultas só ficam mais rápidas. Em máquinas mais lentas,
+-- multiplique os limites com -v tolerancia. As buscas mantêm as metas
+-- de tempo de resposta (300ms, 50ms para um documento): "cimento" casa
+-- com um em cada dez lançamentos do usuário, e todos entram no rank.
+--
+-- Execute em um Postgres local (15+) com as extensões do contrib, nunca no
+-- banco do Supabase:
+--   psql "$DATABASE_URL" -f database/benchmarks/regressao_planos.sql
+--   psql "$DATABASE_URL" -v lancamentos=1000000 -f database/benchmarks/regressao_planos.sql
+--   psql "$DATABASE_URL" -v tolerancia=2 -f database/benchmarks/regressao_planos.sql
+
+\set ON_ERROR_STOP on
+\pset footer off
+
+\if :{?tolerancia}
+\else
+  \set tolerancia 1
+\endif
+
+\ir schema.sql
+-- No Supabase as extensões ficam no schema extensions, que já está no search_path
+SET search_path = bench, public, extensions;
+\timing on
+\ir dados_sinteticos.sql
+\timing off
+
+\echo '[1] Migrations e functions...'
+\timing on
+\ir ../migrations/001_obra_financeiro.sql
+\ir ../migrations/002_busca.sql
+\ir ../migrations/003_fluxo_caixa.sql
+\ir ../migrations/004_indices.sql
+\timing off
+\ir ../functions/analytics_functions.sql
+ANALYZE obras;
+ANALYZE fornecedores;
+ANALYZE itens_orcamento;
+ANALYZE lancamentos_financeiros;
+ANALYZE obra_financeiro;
+ANALYZE fluxo_caixa_mensal;
+
+-- Tabelas que nunca devem ser lidas por inteiro
+CREATE FUNCTION tabelas_do_app()
+RETURNS OID[] AS $$
+  SELECT ARRAY[
+    'obras', 'fornecedores', 'itens_orcamento', 'lancamentos_financeiros',
+    'obra_financeiro', 'fluxo_caixa_mensal'
+  ]::regclass[]::oid[]
+$$ LANGUAGE sql STABLE;
+
+-- Mediana do tempo de execução, blocos lidos (cache + disco) e tabelas
+-- com varredura sequencial de uma consulta
+CREATE FUNCTION medir_plano(p_consulta TEXT, p_tabelas OID[], p_repeticoes INT DEFAULT 5)
+RETURNS TABLE (ms NUMERIC, blocos BIGINT, seq_scans TEXT[]) AS $$
+DECLARE
+  plano JSON;
+  tempos NUMERIC[] := '{}';
+  antes JSONB;
+BEGIN
+  EXECUTE p_consulta;
+  SELECT jsonb_object_agg(relid::text, seq_scan) INTO antes
+  FROM pg_stat_xact_user_tables
+  WHERE relid = ANY(p_tabelas);
+
+  FOR i IN 1..p_repeticoes LOOP
+    EXECUTE 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' || p_consulta INTO plano;
+    tempos := tempos || (plano -> 0 ->> 'Execution Time')::numeric;
+  END LOOP;
+
+  ms := ROUND((SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY t) FROM unnest(tempos) t)::numeric, 3);
+  blocos := COALESCE((plano -> 0 -> 'Plan' ->> 'Shared Hit Blocks')::bigint, 0)
+          + COALESCE((plano -> 0 -> 'Plan' ->> 'Shared Read Blocks')::bigint, 0);
+  seq_scans := ARRAY(
+    SELECT s.relname || ' (' || (s.seq_scan - COALESCE((antes ->> s.relid::text)::bigint, 0)) || 'x)'
+    FROM pg_stat_xact_user_tables s
+    WHERE s.relid = ANY(p_tabelas)
+      AND s.seq_scan > COALESCE((antes ->> s.relid::text)::bigint, 0)
+    ORDER BY s.relname
+  );
+  RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Usuário e obra com mais lançamentos (a distribuição dos dados é desigual)
+SELECT md5('usuario:0')::uuid AS usuario, md5('obra:0')::uuid AS obra \gset
+SELECT COUNT(*) AS lancamentos_usuario FROM lancamentos_financeiros WHERE user_id = :'usuario' \gset
+SELECT numero_documento AS documento FROM lancamentos_financeiros WHERE obra_id = :'obra' LIMIT 1 \gset
+-- Cursores da segunda página das listagens
+SELECT created_at AS obras_criacao, id AS obras_id
+FROM obras WHERE user_id = :'usuario' ORDER BY created_at DESC, id DESC OFFSET 9 LIMIT 1 \gset
+SELECT nome AS fornecedores_nome, id AS fornecedores_id
+FROM fornecedores WHERE user_id = :'usuario' ORDER BY nome, id OFFSET 24 LIMIT 1 \gset
+
+-- consulta: SQL completo; limite_ms: mediana máxima; tabelas: as que não
+-- podem ter varredura sequencial (NULL = todas as do app)
+CREATE TEMP TABLE casos (
+  caso TEXT PRIMARY KEY,
+  consulta TEXT NOT NULL,
+  limite_ms NUMERIC NOT NULL,
+  tabelas TEXT[]
+);
+
+-- SecureDatabaseOperations: os filtros e a ordem que o PostgREST gera
+INSERT INTO casos (caso, consulta, limite_ms) VALUES
+  ('get_all_obras', format(
+    'SELECT id, nome, status, responsavel, cliente, data_inicio, data_termino, created_at FROM obras '
+    'WHERE user_id = %L ORDER BY created_at DESC, id DESC LIMIT 51', :'usuario'), 2),
+  ('get_all_obras (cursor)', format(
+    'SELECT id, nome, status, responsavel, cliente, data_inicio, data_termino, created_at FROM obras '
+    'WHERE user_id = %L AND (created_at < %L OR (created_at = %L AND id < %L)) '
+    'ORDER BY created_at DESC, id DESC LIMIT 11',
+    :'usuario', :'obras_criacao', :'obras_criacao', :'obras_id'), 2),
+  ('get_obras_by_status', format(
+    'SELECT id, nome, status, responsavel, cliente, data_inicio, data_termino, created_at FROM obras '
+    'WHERE user_id = %L AND status = %L ORDER BY created_at DESC, id DESC LIMIT 51',
+    :'usuario', 'Em andamento'), 2),
+  ('get_fornecedores', format(
+    'SELECT id, nome FROM fornecedores WHERE user_id = %L ORDER BY nome, id LIMIT 51', :'usuario'), 2),
+  ('get_fornecedores (cursor)', format(
+    'SELECT id, nome FROM fornecedores WHERE user_id = %L AND (nome > %L OR (nome = %L AND id > %L)) '
+    'ORDER BY nome, id LIMIT 51',
+    :'usuario', :'fornecedores_nome', :'fornecedores_nome', :'fornecedores_id'), 2),
+  ('import_rows (obras do usuário)', format(
+    'SELECT id FROM obras WHERE user_id = %L AND id IN (%L, %L, %L)',
+    :'usuario', :'obra', md5('obra:1000')::uuid, md5('obra:1')::uuid), 2),
+  ('search (buscar)', format('SELECT * FROM buscar(%L, %L, 21)', :'usuario', 'cimento'), 300),
+  ('search (buscar, página 2)', format(
+    'SELECT * FROM buscar(%L, %L, 21, 0.5, %L, %L)', :'usuario', 'cimento', 'lancamento', 'ffffffff-ffff-ffff-ffff-ffffffffffff'), 300);
+
+-- get_custos_obras: resumo por obra (obra_financeiro) com o nome da obra
+INSERT INTO casos (caso, consulta, limite_ms) VALUES
+  ('get_custos_obras', format(
+    'SELECT r.obra_id, r.gasto_total, o.obras FROM obra_financeiro r '
+    'LEFT JOIN LATERAL (SELECT json_build_object(''nome'', ob.nome) AS obras FROM obras ob WHERE ob.id = r.obra_id) o ON true '
+    'WHERE r.user_id = %L AND r.gasto_total <> 0 ORDER BY r.gasto_total DESC', :'usuario'), 2);
+
+-- analytics_functions.sql
+INSERT INTO casos (caso, consulta, limite_ms) VALUES
+  ('get_obra_dashboard', format('SELECT get_obra_dashboard(%L, %L)', :'obra', :'usuario'), 3),
+  ('get_obras_dashboards', format(
+    'SELECT get_obras_dashboards(%L, ARRAY(SELECT id FROM obras WHERE user_id = %L))', :'usuario', :'usuario'), 6),
+  ('get_fornecedores_analytics', format('SELECT get_fornecedores_analytics(%L, 3)', :'usuario'), 50),
+  ('get_fluxo_caixa', format('SELECT get_fluxo_caixa(%L)', :'usuario'), 8),
+  ('get_fluxo_caixa (obra)', format('SELECT get_fluxo_caixa(%L, %L)', :'usuario', :'obra'), 8),
+  ('get_fluxo_caixa_periodo (semanas, 1 ano)', format(
+    'SELECT get_fluxo_caixa_periodo(%L, %L, %L, %L)', :'usuario', CURRENT_DATE - 365, CURRENT_DATE, 'week'), 100),
+  ('get_fluxo_caixa_periodo (meses, 3 anos)', format(
+    'SELECT get_fluxo_caixa_periodo(%L, %L, %L, %L)', :'usuario', CURRENT_DATE - 1000, CURRENT_DATE, 'month'), 15),
+  ('get_fluxo_caixa_periodo (trimestres, obra)', format(
+    'SELECT get_fluxo_caixa_periodo(%L, %L, %L, %L, %L)',
+    :'usuario', CURRENT_DATE - 1000, CURRENT_DATE, 'quarter', :'obra'), 15),
+  ('compare_obras', format(
+    'SELECT compare_obras(%L, ARRAY(SELECT id FROM obras WHERE user_id = %L))', :'usuario', :'usuario'), 3),
+  ('search_all (termo comum)', format('SELECT search_all(%L, %L)', :'usuario', 'cimento'), 300),
+  ('search_all (documento)', format('SELECT search_all(%L, %L)', :'usuario', :'documento'), 50),
+  ('search_all (sem acento)', format('SELECT search_all(%L, %L)', :'usuario', 'sao jose'), 50);
+
+SELECT COUNT(*) AS total FROM casos \gset
+\echo '[2] Planos de' :total 'consultas (usuário com' :lancamentos_usuario 'lançamentos, tolerância' :tolerancia 'x)...'
+CREATE TEMP TABLE resultados AS
+SELECT
+  c.caso,
+  m.ms,
+  c.limite_ms * :tolerancia AS limite_ms,
+  m.blocos,
+  m.seq_scans,
+  m.ms <= c.limite_ms * :tolerancia AND cardinality(m.seq_scans) = 0 AS ok
+FROM casos c
+CROSS JOIN LATERAL medir_plano(
+  c.consulta,
+  COALESCE(c.tabelas::regclass[]::oid[], tabelas_do_app())
+) m;
+
+SELECT
+  caso,
+  ms,
+  limite_ms,
+  blocos,
+  array_to_string(seq_scans, ', ') AS seq_scans,
+  CASE WHEN ok THEN 'OK' ELSE 'ERRO' END AS resultado
+FROM resultados
+ORDER BY ok, caso;
+
+SELECT COUNT(*) FILTER (WHERE NOT ok) AS falhas, COUNT(*) FILTER (WHERE NOT ok) > 0 AS falhou FROM resultados \gset
+
+\if :falhou
+  \echo '[3] Planos internos das consultas com erro (auto_explain)...'
+  LOAD 'auto_explain';
+  SET auto_explain.log_min_duration = 0;
+  SET auto_explain.log_analyze = on;
+  SET auto_explain.log_buffers = on;
+  SET auto_explain.log_nested_statements = on;
+  SET client_min_messages = log;
+  SELECT c.caso, m.ms
+  FROM casos c
+  JOIN resultados r USING (caso)
+  CROSS JOIN LATERAL medir_plano(c.consulta, tabelas_do_app(), 1) m
+  WHERE NOT r.ok;
+  RESET client_min_messages;
+\endif
+
+SELECT set_config('bench.falhas', :'falhas', false), set_config('bench.total', :'total', false) \g /dev/null
+DO $$
+BEGIN
+  IF current_setting('bench.falhas')::int > 0 THEN
+    RAISE EXCEPTION 'ERRO - % de % consultas com varredura sequencial ou acima do limite',
+      current_setting('bench.falhas'), current_setting('bench.total');
+  END IF;
+  RAISE NOTICE 'OK - % consultas usam índices e ficaram dentro do limite', current_setting('bench.total');
+END $$;
@@ -0,0 +1,78 @@
+-- Tabelas mínimas para benchmarks em um Postgres local (não no Supabase)
+-- Mesmas colunas usadas pelo backend e por functions/analytics_functions.sql,
+-- em um schema próprio: DROP SCHEMA bench CASCADE remove tudo.
+
+DROP SCHEMA IF EXISTS bench CASCADE;
+CREATE SCHEMA bench;
+SET search_path = bench, public;
+
+-- As políticas RLS das migrations usam auth.uid() do Supabase
+DO $$ BEGIN
+  IF to_regprocedure('auth.uid()') IS NULL THEN
+    CREATE SCHEMA IF NOT EXISTS auth;
+    CREATE FUNCTION auth.uid() RETURNS UUID LANGUAGE sql STABLE AS 'SELECT NULL::uuid';
+  END IF;
+END $$;
+
+CREATE TABLE obras (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL,
+  nome TEXT NOT NULL,
+  responsavel TEXT,
+  cliente TEXT,
+  status TEXT NOT NULL DEFAULT 'Em andamento',
+  data_inicio DATE,
+  data_termino DATE,
+  endereco TEXT,
+  tamanho_obra TEXT,
+  tamanho_terreno TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE fornecedores (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL,
+  nome TEXT NOT NULL,
+  cnpj TEXT,
+  email TEXT,
+  telefone TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE itens_orcamento (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL,
+  obra_id UUID NOT NULL,
+  descricao TEXT,
+  valor_total_orcado NUMERIC(14, 2),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE lancamentos_financeiros (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL,
+  obra_id UUID NOT NULL,
+  fornecedor_id UUID,
+  descricao TEXT NOT NULL,
+  valor NUMERIC(14, 2) NOT NULL,
+  data_emissao DATE NOT NULL,
+  data_vencimento DATE,
+  numero_documento TEXT,
+  status TEXT NOT NULL DEFAULT 'pendente',
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Tempo médio (ms) de um comando, depois de uma execução de aquecimento
+CREATE FUNCTION bench_ms(p_sql TEXT, p_repeticoes INT DEFAULT 20)
+RETURNS NUMERIC AS $$
+DECLARE
+  inicio TIMESTAMPTZ;
+BEGIN
+  EXECUTE p_sql;
+  inicio := clock_timestamp();
+  FOR i IN 1..p_repeticoes LOOP
+    EXECUTE p_sql;
+  END LOOP;
+  RETURN ROUND((EXTRACT(EPOCH FROM clock_timestamp() - inicio) * 1000 / p_repeticoes)::numeric, 3);
+END;
+$$ LANGUAGE plpgsql;
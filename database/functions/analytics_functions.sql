@@ -2,9 +2,12 @@
 -- Evitam processamento linha por linha, retornam dados agregados
 
 -- 1. Dashboard Resumo da Obra
+-- Totais lidos do resumo obra_financeiro (migrations/001_obra_financeiro.sql)
 CREATE OR REPLACE FUNCTION get_obra_dashboard(p_obra_id UUID, p_user_id UUID)
 RETURNS JSON AS $$
 BEGIN
+  PERFORM atualizar_vencidos_obras(ARRAY[p_obra_id]);
+
   RETURN json_build_object(
     'info_basica', (
       SELECT json_build_object(
@@ -22,25 +25,19 @@ BEGIN
     ),
     'financeiro', (
       SELECT json_build_object(
-        'orcamento_total', COALESCE(SUM(valor_total_orcado), 0),
-        'gasto_total', COALESCE((
-          SELECT SUM(valor) 
-          FROM lancamentos_financeiros 
-          WHERE obra_id = p_obra_id AND user_id = p_user_id
-        ), 0),
-        'saldo', COALESCE(SUM(valor_total_orcado), 0) - COALESCE((
-          SELECT SUM(valor) 
-          FROM lancamentos_financeiros 
-          WHERE obra_id = p_obra_id AND user_id = p_user_id
-        ), 0)
+        'orcamento_total', COALESCE(r.orcamento_total, 0),
+        'gasto_total', COALESCE(r.gasto_total, 0),
+        'saldo', COALESCE(r.orcamento_total, 0) - COALESCE(r.gasto_total, 0),
+        'lancamentos_pendentes', COALESCE(r.lancamentos_pendentes, 0),
+        'pagamentos_vencidos', COALESCE(r.pagamentos_vencidos, 0)
       )
-      FROM itens_orcamento
-      WHERE obra_id = p_obra_id AND user_id = p_user_id
+      FROM (SELECT 1) AS uma_linha
+      LEFT JOIN obra_financeiro r ON r.obra_id = p_obra_id AND r.user_id = p_user_id
     ),
     'alertas', (
       SELECT json_agg(alerta)
       FROM (
-        -- Pagamentos vencidos
+        -- Pagamentos vencidos, os mais antigos primeiro
         SELECT json_build_object(
           'tipo', 'pagamento_vencido',
           'mensagem', CONCAT('Pagamento vencido: ', descricao),
@@ -52,6 +49,7 @@ BEGIN
           AND user_id = p_user_id
           AND status = 'pendente'
           AND data_vencimento < CURRENT_DATE
+        ORDER BY data_vencimento
         LIMIT 5
       ) alertas
     )
@@ -59,6 +57,74 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- 1b. Dashboards de várias obras em uma chamada
+-- Mesmo formato de get_obra_dashboard, em um objeto indexado pelo id da
+-- obra, com uma única consulta para todas: info e financeiro vêm de obras
+-- JOIN obra_financeiro e os alertas de cada obra são os 5 primeiros do
+-- índice parcial de pendentes. Obras inexistentes ou de outro usuário
+-- ficam de fora.
+CREATE OR REPLACE FUNCTION get_obras_dashboards(p_user_id UUID, p_obra_ids UUID[])
+RETURNS JSON AS $$
+DECLARE
+  obra_ids UUID[];
+BEGIN
+  SELECT array_agg(id) INTO obra_ids
+  FROM obras
+  WHERE user_id = p_user_id AND id = ANY(p_obra_ids);
+
+  IF obra_ids IS NULL THEN
+    RETURN '{}'::json;
+  END IF;
+
+  PERFORM atualizar_vencidos_obras(obra_ids);
+
+  RETURN (
+    SELECT json_object_agg(o.id, json_build_object(
+      'info_basica', json_build_object(
+        'nome', o.nome,
+        'cliente', o.cliente,
+        'status', o.status,
+        'progresso', COALESCE(
+          ROUND((o.data_inicio::date - CURRENT_DATE) * 100.0 / 
+          NULLIF(o.data_termino::date - o.data_inicio::date, 0)), 0
+        ),
+        'dias_restantes', o.data_termino::date - CURRENT_DATE
+      ),
+      'financeiro', json_build_object(
+        'orcamento_total', COALESCE(r.orcamento_total, 0),
+        'gasto_total', COALESCE(r.gasto_total, 0),
+        'saldo', COALESCE(r.orcamento_total, 0) - COALESCE(r.gasto_total, 0),
+        'lancamentos_pendentes', COALESCE(r.lancamentos_pendentes, 0),
+        'pagamentos_vencidos', COALESCE(r.pagamentos_vencidos, 0)
+      ),
+      'alertas', alertas.lista
+    ))
+    FROM obras o
+    LEFT JOIN obra_financeiro r ON r.obra_id = o.id AND r.user_id = p_user_id
+    LEFT JOIN LATERAL (
+      -- Pagamentos vencidos, os mais antigos primeiro
+      SELECT json_agg(json_build_object(
+        'tipo', 'pagamento_vencido',
+        'mensagem', CONCAT('Pagamento vencido: ', v.descricao),
+        'valor', v.valor,
+        'dias_atraso', CURRENT_DATE - v.data_vencimento::date
+      ) ORDER BY v.data_vencimento) AS lista
+      FROM (
+        SELECT descricao, valor, data_vencimento
+        FROM lancamentos_financeiros
+        WHERE obra_id = o.id
+          AND user_id = p_user_id
+          AND status = 'pendente'
+          AND data_vencimento < CURRENT_DATE
+        ORDER BY data_vencimento
+        LIMIT 5
+      ) v
+    ) alertas ON true
+    WHERE o.id = ANY(obra_ids)
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- 2. Análise de Fornecedores
 CREATE OR REPLACE FUNCTION get_fornecedores_analytics(p_user_id UUID, p_periodo_meses INT DEFAULT 3)
 RETURNS JSON AS $$
@@ -67,19 +133,28 @@ BEGIN
     'top_fornecedores', (
       SELECT json_agg(
         json_build_object(
-          'nome', f.nome,
-          'total_gasto', COALESCE(SUM(l.valor), 0),
-          'num_transacoes', COUNT(l.id),
-          'ticket_medio', COALESCE(AVG(l.valor), 0)
+          'nome', t.nome,
+          'total_gasto', t.total_gasto,
+          'num_transacoes', t.num_transacoes,
+          'ticket_medio', t.ticket_medio
         )
-        ORDER BY SUM(l.valor) DESC
+        ORDER BY t.total_gasto DESC
       )
-      FROM fornecedores f
-      LEFT JOIN lancamentos_financeiros l ON f.id = l.fornecedor_id
-      WHERE f.user_id = p_user_id
-        AND l.created_at >= CURRENT_DATE - INTERVAL '1 month' * p_periodo_meses
-      GROUP BY f.id, f.nome
-      LIMIT 10
+      FROM (
+        SELECT
+          f.nome,
+          COALESCE(SUM(l.valor), 0) AS total_gasto,
+          COUNT(*) AS num_transacoes,
+          COALESCE(AVG(l.valor), 0) AS ticket_medio
+        FROM fornecedores f
+        JOIN lancamentos_financeiros l ON f.id = l.fornecedor_id
+        WHERE f.user_id = p_user_id
+          AND l.user_id = p_user_id
+          AND l.created_at >= CURRENT_DATE - INTERVAL '1 month' * p_periodo_meses
+        GROUP BY f.id, f.nome
+        ORDER BY SUM(l.valor) DESC
+        LIMIT 10
+      ) t
     ),
     'resumo_periodo', (
       SELECT json_build_object(
@@ -96,24 +171,104 @@ END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 -- 3. Fluxo de Caixa Mensal
+-- Últimos 12 meses, lidos do resumo mensal (migrations/003_fluxo_caixa.sql)
 CREATE OR REPLACE FUNCTION get_fluxo_caixa(p_user_id UUID, p_obra_id UUID DEFAULT NULL)
 RETURNS JSON AS $$
 BEGIN
   RETURN (
     SELECT json_agg(
       json_build_object(
-        'mes', TO_CHAR(date_trunc('month', data_emissao), 'YYYY-MM'),
+        'mes', p.periodo ->> 'periodo',
         'entradas', 0, -- Futura implementação
-        'saidas', COALESCE(SUM(CASE WHEN valor < 0 THEN ABS(valor) ELSE valor END), 0),
-        'num_lancamentos', COUNT(*)
+        'saidas', p.periodo -> 'saidas',
+        'num_lancamentos', p.periodo -> 'num_lancamentos'
       )
-      ORDER BY date_trunc('month', data_emissao)
+      ORDER BY p.ordem
     )
-    FROM lancamentos_financeiros
-    WHERE user_id = p_user_id
-      AND (p_obra_id IS NULL OR obra_id = p_obra_id)
-      AND data_emissao >= CURRENT_DATE - INTERVAL '12 months'
-    GROUP BY date_trunc('month', data_emissao)
+    FROM json_array_elements(get_fluxo_caixa_periodo(
+      p_user_id,
+      (CURRENT_DATE - INTERVAL '12 months')::date,
+      (date_trunc('month', CURRENT_DATE) + INTERVAL '1 month - 1 day')::date,
+      'month',
+      p_obra_id
+    )) WITH ORDINALITY AS p(periodo, ordem)
+  );
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 3b. Fluxo de caixa de um intervalo por semana, mês ou trimestre
+-- Meses inteiros do intervalo vêm do resumo mensal (fluxo_caixa_mensal);
+-- semanas e as pontas de meses incompletos vêm dos lançamentos, por faixa
+-- de data_emissao (idx_lancamentos_user_emissao). Períodos sem
+-- lançamentos ficam de fora.
+CREATE OR REPLACE FUNCTION get_fluxo_caixa_periodo(
+  p_user_id UUID,
+  p_inicio DATE,
+  p_fim DATE,
+  p_granularidade TEXT DEFAULT 'month',
+  p_obra_id UUID DEFAULT NULL
+)
+RETURNS JSON AS $$
+DECLARE
+  -- Meses inteiros dentro do intervalo: [primeiro_mes, fim_meses)
+  primeiro_mes DATE := (date_trunc('month', p_inicio - 1) + INTERVAL '1 month')::date;
+  fim_meses DATE := date_trunc('month', p_fim + 1)::date;
+  formato TEXT;
+BEGIN
+  formato := CASE p_granularidade
+    WHEN 'week' THEN 'IYYY-"W"IW'
+    WHEN 'month' THEN 'YYYY-MM'
+    WHEN 'quarter' THEN 'YYYY-"T"Q'
+  END;
+  IF formato IS NULL THEN
+    RAISE EXCEPTION 'Granularidade inválida: % (use week, month ou quarter)', p_granularidade;
+  END IF;
+
+  -- Semanas não cabem em meses: tudo vem dos lançamentos
+  IF p_granularidade = 'week' OR primeiro_mes >= fim_meses THEN
+    primeiro_mes := p_fim + 1;
+    fim_meses := p_fim + 1;
+  END IF;
+
+  RETURN (
+    SELECT json_agg(
+      json_build_object(
+        'periodo', TO_CHAR(periodos.inicio, formato),
+        'inicio', periodos.inicio,
+        'entradas', 0, -- Futura implementação
+        'saidas', periodos.saidas,
+        'num_lancamentos', periodos.num_lancamentos
+      )
+      ORDER BY periodos.inicio
+    )
+    FROM (
+      SELECT
+        date_trunc(p_granularidade, valores.dia)::date AS inicio,
+        SUM(valores.saidas) AS saidas,
+        SUM(valores.num_lancamentos) AS num_lancamentos
+      FROM (
+        SELECT mes AS dia, saidas, num_lancamentos
+        FROM fluxo_caixa_mensal
+        WHERE user_id = p_user_id
+          AND (p_obra_id IS NULL OR obra_id = p_obra_id)
+          AND mes >= primeiro_mes AND mes < fim_meses
+        UNION ALL
+        -- Antes dos meses inteiros
+        SELECT data_emissao, ABS(valor), 1
+        FROM lancamentos_financeiros
+        WHERE user_id = p_user_id
+          AND (p_obra_id IS NULL OR obra_id = p_obra_id)
+          AND data_emissao >= p_inicio AND data_emissao < LEAST(primeiro_mes, p_fim + 1)
+        UNION ALL
+        -- Depois dos meses inteiros
+        SELECT data_emissao, ABS(valor), 1
+        FROM lancamentos_financeiros
+        WHERE user_id = p_user_id
+          AND (p_obra_id IS NULL OR obra_id = p_obra_id)
+          AND data_emissao >= fim_meses AND data_emissao <= p_fim
+      ) valores
+      GROUP BY 1
+    ) periodos
   );
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -127,11 +282,11 @@ BEGIN
       json_build_object(
         'obra_id', o.id,
         'nome', o.nome,
-        'orcamento', COALESCE(orcamento.total, 0),
-        'gasto', COALESCE(gastos.total, 0),
+        'orcamento', COALESCE(r.orcamento_total, 0),
+        'gasto', COALESCE(r.gasto_total, 0),
         'eficiencia', CASE 
-          WHEN COALESCE(orcamento.total, 0) > 0 
-          THEN ROUND((COALESCE(gastos.total, 0) / orcamento.total) * 100, 2)
+          WHEN COALESCE(r.orcamento_total, 0) > 0 
+          THEN ROUND((COALESCE(r.gasto_total, 0) / r.orcamento_total) * 100, 2)
           ELSE 0 
         END,
         'dias_projeto', COALESCE(o.data_termino::date - o.data_inicio::date, 0),
@@ -139,16 +294,7 @@ BEGIN
       )
     )
     FROM obras o
-    LEFT JOIN (
-      SELECT obra_id, SUM(valor_total_orcado) as total
-      FROM itens_orcamento
-      GROUP BY obra_id
-    ) orcamento ON o.id = orcamento.obra_id
-    LEFT JOIN (
-      SELECT obra_id, SUM(valor) as total
-      FROM lancamentos_financeiros
-      GROUP BY obra_id
-    ) gastos ON o.id = gastos.obra_id
+    LEFT JOIN obra_financeiro r ON r.obra_id = o.id
     WHERE o.user_id = p_user_id
       AND o.id = ANY(p_obra_ids)
   );
@@ -156,42 +302,154 @@ END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 -- 5. Busca Inteligente
+-- Sem acentos e sem diferenciar maiúsculas, por trecho do texto ou por
+-- palavra parecida (erros de digitação), usando os índices de trigramas
+-- por usuário de migrations/002_busca.sql. Cada expressão
+-- chaves_busca(...) é a mesma do índice correspondente; chaves_trecho e
+-- chaves_parecidas escolhem as listas do usuário a ler, e o LIKE ou o <%
+-- confere cada linha encontrada.
+--
+-- Palavras parecidas a partir de word_similarity 0.5 ("cimnto" acha
+-- "cimento"). Termos com dígitos (notas, CNPJ) só casam por trecho: quase
+-- todos os números de documento do usuário são parecidos entre si, e um
+-- número parecido é outro documento. Termos sem nenhum trigrama de letras
+-- ou dígitos ("x..", "---") não buscam nada.
+
+-- Padrão LIKE para o termo já normalizado, com % e _ escapados
+CREATE OR REPLACE FUNCTION padrao_busca(p_termo TEXT)
+RETURNS TEXT AS $$
+  SELECT '%' || replace(replace(replace(p_termo, '\', '\\'), '%', '\%'), '_', '\_') || '%'
+$$ LANGUAGE sql IMMUTABLE;
+
 CREATE OR REPLACE FUNCTION search_all(p_user_id UUID, p_query TEXT)
 RETURNS JSON AS $$
+DECLARE
+  termo TEXT := normalizar_busca(btrim(p_query));
+  padrao TEXT := padrao_busca(normalizar_busca(btrim(p_query)));
+  trecho TEXT[] := chaves_trecho(p_user_id, normalizar_busca(btrim(p_query)));
+  parecidas TEXT[];
 BEGIN
+  IF termo IS NULL OR length(termo) < 3 OR cardinality(trecho) = 0 THEN
+    RETURN json_build_object('obras', NULL, 'fornecedores', NULL, 'lancamentos', NULL);
+  END IF;
+  IF termo ~ '[0-9]' THEN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', '1', true);
+  END IF;
+  parecidas := chaves_parecidas(p_user_id, termo);
+
   RETURN json_build_object(
     'obras', (
       SELECT json_agg(row_to_json(o))
-      FROM obras o
-      WHERE user_id = p_user_id
-        AND (
-          nome ILIKE '%' || p_query || '%' OR
-          cliente ILIKE '%' || p_query || '%' OR
-          endereco ILIKE '%' || p_query || '%'
-        )
-      LIMIT 5
+      FROM (
+        SELECT *
+        FROM obras
+        WHERE user_id = p_user_id
+          AND (chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, ''))) @> trecho
+               OR chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, ''))) && parecidas)
+          AND (normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, '')) LIKE padrao
+               OR termo <% normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, '')))
+        ORDER BY word_similarity(termo, normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, ''))) DESC
+        LIMIT 5
+      ) o
     ),
     'fornecedores', (
       SELECT json_agg(row_to_json(f))
-      FROM fornecedores f
-      WHERE user_id = p_user_id
-        AND (
-          nome ILIKE '%' || p_query || '%' OR
-          cnpj ILIKE '%' || p_query || '%' OR
-          email ILIKE '%' || p_query || '%'
-        )
-      LIMIT 5
+      FROM (
+        SELECT *
+        FROM fornecedores
+        WHERE user_id = p_user_id
+          AND (chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, ''))) @> trecho
+               OR chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, ''))) && parecidas)
+          AND (normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, '')) LIKE padrao
+               OR termo <% normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, '')))
+        ORDER BY word_similarity(termo, normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, ''))) DESC
+        LIMIT 5
+      ) f
     ),
     'lancamentos', (
       SELECT json_agg(row_to_json(l))
-      FROM lancamentos_financeiros l
-      WHERE user_id = p_user_id
-        AND (
-          descricao ILIKE '%' || p_query || '%' OR
-          numero_documento ILIKE '%' || p_query || '%'
-        )
-      LIMIT 5
+      FROM (
+        SELECT *
+        FROM lancamentos_financeiros
+        WHERE user_id = p_user_id
+          AND (chaves_busca(user_id, normalizar_busca(descricao || ' ' || COALESCE(numero_documento, ''))) @> trecho
+               OR chaves_busca(user_id, normalizar_busca(descricao || ' ' || COALESCE(numero_documento, ''))) && parecidas)
+          AND (normalizar_busca(descricao || ' ' || COALESCE(numero_documento, '')) LIKE padrao
+               OR termo <% normalizar_busca(descricao || ' ' || COALESCE(numero_documento, '')))
+        ORDER BY word_similarity(termo, normalizar_busca(descricao || ' ' || COALESCE(numero_documento, ''))) DESC
+        LIMIT 5
+      ) l
     )
   );
 END;
-$$ LANGUAGE plpgsql SECURITY DEFINER;
+$$ LANGUAGE plpgsql SECURITY DEFINER
+SET pg_trgm.word_similarity_threshold = 0.5;
+
+-- 6. Busca paginada nas três entidades, por relevância
+-- Usada por SecureDatabaseOperations.search. Ordem (rank, tipo, id)
+-- decrescente; o cursor é a última linha da página anterior.
+CREATE OR REPLACE FUNCTION buscar(
+  p_user_id UUID,
+  p_query TEXT,
+  p_limite INT DEFAULT 20,
+  p_cursor_rank NUMERIC DEFAULT NULL,
+  p_cursor_tipo TEXT DEFAULT NULL,
+  p_cursor_id UUID DEFAULT NULL
+)
+RETURNS TABLE (tipo TEXT, id UUID, titulo TEXT, detalhe TEXT, rank NUMERIC) AS $$
+#variable_conflict use_column
+DECLARE
+  termo TEXT := normalizar_busca(btrim(p_query));
+  padrao TEXT := padrao_busca(normalizar_busca(btrim(p_query)));
+  trecho TEXT[] := chaves_trecho(p_user_id, normalizar_busca(btrim(p_query)));
+  parecidas TEXT[];
+BEGIN
+  IF termo IS NULL OR length(termo) < 3 OR cardinality(trecho) = 0 THEN
+    RETURN;
+  END IF;
+  IF termo ~ '[0-9]' THEN
+    PERFORM set_config('pg_trgm.word_similarity_threshold', '1', true);
+  END IF;
+  parecidas := chaves_parecidas(p_user_id, termo);
+
+  RETURN QUERY
+  SELECT r.tipo, r.id, r.titulo, r.detalhe, r.rank
+  FROM (
+    SELECT
+      'obra'::text AS tipo, o.id, o.nome AS titulo, o.cliente AS detalhe,
+      ROUND(word_similarity(termo, normalizar_busca(o.nome || ' ' || COALESCE(o.cliente, '') || ' ' || COALESCE(o.endereco, '')))::numeric, 4) AS rank
+    FROM obras o
+    WHERE o.user_id = p_user_id
+      AND (chaves_busca(o.user_id, normalizar_busca(o.nome || ' ' || COALESCE(o.cliente, '') || ' ' || COALESCE(o.endereco, ''))) @> trecho
+           OR chaves_busca(o.user_id, normalizar_busca(o.nome || ' ' || COALESCE(o.cliente, '') || ' ' || COALESCE(o.endereco, ''))) && parecidas)
+      AND (normalizar_busca(o.nome || ' ' || COALESCE(o.cliente, '') || ' ' || COALESCE(o.endereco, '')) LIKE padrao
+           OR termo <% normalizar_busca(o.nome || ' ' || COALESCE(o.cliente, '') || ' ' || COALESCE(o.endereco, '')))
+    UNION ALL
+    SELECT
+      'fornecedor'::text, f.id, f.nome, f.cnpj,
+      ROUND(word_similarity(termo, normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')))::numeric, 4)
+    FROM fornecedores f
+    WHERE f.user_id = p_user_id
+      AND (chaves_busca(f.user_id, normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, ''))) @> trecho
+           OR chaves_busca(f.user_id, normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, ''))) && parecidas)
+      AND (normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')) LIKE padrao
+           OR termo <% normalizar_busca(f.nome || ' ' || COALESCE(f.cnpj, '') || ' ' || COALESCE(f.email, '')))
+    UNION ALL
+    SELECT
+      'lancamento'::text, l.id, l.descricao,
+      CONCAT(l.numero_documento, ' - R$ ', l.valor, ' - ', TO_CHAR(l.data_emissao, 'DD/MM/YYYY')),
+      ROUND(word_similarity(termo, normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, '')))::numeric, 4)
+    FROM lancamentos_financeiros l
+    WHERE l.user_id = p_user_id
+      AND (chaves_busca(l.user_id, normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))) @> trecho
+           OR chaves_busca(l.user_id, normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, ''))) && parecidas)
+      AND (normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, '')) LIKE padrao
+           OR termo <% normalizar_busca(l.descricao || ' ' || COALESCE(l.numero_documento, '')))
+  ) r
+  WHERE p_cursor_rank IS NULL
+     OR (r.rank, r.tipo, r.id) < (p_cursor_rank, p_cursor_tipo, p_cursor_id)
+  ORDER BY r.rank DESC, r.tipo DESC, r.id DESC
+  LIMIT LEAST(GREATEST(p_limite, 1), 201);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER
+SET pg_trgm.word_similarity_threshold = 0.5;
@@ -0,0 +1,269 @@
+-- Resumo financeiro por obra, mantido por triggers
+-- compare_obras e get_obra_dashboard leem uma linha por obra em vez de
+-- somar itens_orcamento e lancamentos_financeiros a cada chamada.
+--
+-- Os triggers são por comando (FOR EACH STATEMENT) com tabelas de
+-- transição: uma importação de 500 lançamentos faz um único UPSERT por
+-- obra afetada, não 500.
+--
+-- pagamentos_vencidos depende da data de hoje, que muda sem nenhuma
+-- escrita. Os triggers aplicam a variação com a data do dia e a leitura
+-- recontam a obra quando vencidos_em ficou para trás (uma vez por dia,
+-- pelo índice parcial de pendentes).
+
+BEGIN;
+
+-- As functions SECURITY DEFINER abaixo guardam o search_path desta sessão
+-- (SET search_path FROM CURRENT) com pg_temp por último: uma tabela
+-- temporária de quem dispara os triggers não substitui as do app.
+SELECT set_config('search_path', current_setting('search_path') || ', pg_temp', true);
+
+CREATE TABLE IF NOT EXISTS obra_financeiro (
+  obra_id UUID PRIMARY KEY REFERENCES obras(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL,
+  orcamento_total NUMERIC NOT NULL DEFAULT 0,
+  gasto_total NUMERIC NOT NULL DEFAULT 0,
+  lancamentos_pendentes BIGINT NOT NULL DEFAULT 0,
+  pagamentos_vencidos BIGINT NOT NULL DEFAULT 0,
+  vencidos_em DATE NOT NULL DEFAULT CURRENT_DATE,
+  atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_obra_financeiro_user ON obra_financeiro (user_id);
+
+-- Recontagem dos vencidos e alertas do dashboard
+CREATE INDEX IF NOT EXISTS idx_lancamentos_pendentes_vencimento
+  ON lancamentos_financeiros (obra_id, data_vencimento)
+  WHERE status = 'pendente';
+
+ALTER TABLE obra_financeiro ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS obra_financeiro_select ON obra_financeiro;
+CREATE POLICY obra_financeiro_select ON obra_financeiro
+  FOR SELECT USING (user_id = auth.uid());
+
+-- Variação de uma obra produzida por um comando
+DO $$ BEGIN
+  CREATE TYPE obra_financeiro_delta AS (
+    obra_id UUID,
+    orcamento NUMERIC,
+    gasto NUMERIC,
+    pendentes BIGINT,
+    vencidos BIGINT
+  );
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Soma as variações na linha de cada obra (criando a linha se preciso)
+CREATE OR REPLACE FUNCTION aplicar_obra_financeiro(p_deltas obra_financeiro_delta[])
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO obra_financeiro AS r (
+    obra_id, user_id, orcamento_total, gasto_total, lancamentos_pendentes, pagamentos_vencidos
+  )
+  SELECT o.id, o.user_id, SUM(d.orcamento), SUM(d.gasto), SUM(d.pendentes), SUM(d.vencidos)
+  FROM unnest(p_deltas) d
+  -- Obras apagadas (ON DELETE CASCADE dos lançamentos) ficam de fora
+  JOIN obras o ON o.id = d.obra_id
+  GROUP BY o.id, o.user_id
+  HAVING SUM(d.orcamento) <> 0 OR SUM(d.gasto) <> 0
+      OR SUM(d.pendentes) <> 0 OR SUM(d.vencidos) <> 0
+  -- Mesma ordem de bloqueio em todos os comandos, sem deadlock entre eles
+  ORDER BY o.id
+  ON CONFLICT (obra_id) DO UPDATE SET
+    orcamento_total = r.orcamento_total + EXCLUDED.orcamento_total,
+    gasto_total = r.gasto_total + EXCLUDED.gasto_total,
+    lancamentos_pendentes = r.lancamentos_pendentes + EXCLUDED.lancamentos_pendentes,
+    pagamentos_vencidos = r.pagamentos_vencidos + EXCLUDED.pagamentos_vencidos,
+    atualizado_em = now();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+CREATE OR REPLACE FUNCTION trg_lancamentos_obra_financeiro()
+RETURNS TRIGGER AS $$
+DECLARE
+  deltas obra_financeiro_delta[] := '{}';
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(
+        obra_id, 0,
+        -COALESCE(SUM(valor), 0)::numeric,
+        -COUNT(*) FILTER (WHERE status = 'pendente'),
+        -COUNT(*) FILTER (WHERE status = 'pendente' AND data_vencimento < CURRENT_DATE)
+      )::obra_financeiro_delta
+      FROM antigos
+      GROUP BY obra_id
+    );
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(
+        obra_id, 0,
+        COALESCE(SUM(valor), 0)::numeric,
+        COUNT(*) FILTER (WHERE status = 'pendente'),
+        COUNT(*) FILTER (WHERE status = 'pendente' AND data_vencimento < CURRENT_DATE)
+      )::obra_financeiro_delta
+      FROM novos
+      GROUP BY obra_id
+    );
+  END IF;
+  PERFORM aplicar_obra_financeiro(deltas);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+CREATE OR REPLACE FUNCTION trg_itens_orcamento_obra_financeiro()
+RETURNS TRIGGER AS $$
+DECLARE
+  deltas obra_financeiro_delta[] := '{}';
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(obra_id, -COALESCE(SUM(valor_total_orcado), 0)::numeric, 0, 0, 0)::obra_financeiro_delta
+      FROM antigos
+      GROUP BY obra_id
+    );
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(obra_id, COALESCE(SUM(valor_total_orcado), 0)::numeric, 0, 0, 0)::obra_financeiro_delta
+      FROM novos
+      GROUP BY obra_id
+    );
+  END IF;
+  PERFORM aplicar_obra_financeiro(deltas);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- Tabelas de transição exigem um trigger por evento
+DROP TRIGGER IF EXISTS obra_financeiro_insert ON lancamentos_financeiros;
+CREATE TRIGGER obra_financeiro_insert
+  AFTER INSERT ON lancamentos_financeiros
+  REFERENCING NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_obra_financeiro();
+
+DROP TRIGGER IF EXISTS obra_financeiro_update ON lancamentos_financeiros;
+CREATE TRIGGER obra_financeiro_update
+  AFTER UPDATE ON lancamentos_financeiros
+  REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_obra_financeiro();
+
+DROP TRIGGER IF EXISTS obra_financeiro_delete ON lancamentos_financeiros;
+CREATE TRIGGER obra_financeiro_delete
+  AFTER DELETE ON lancamentos_financeiros
+  REFERENCING OLD TABLE AS antigos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_obra_financeiro();
+
+DROP TRIGGER IF EXISTS obra_financeiro_insert ON itens_orcamento;
+CREATE TRIGGER obra_financeiro_insert
+  AFTER INSERT ON itens_orcamento
+  REFERENCING NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_itens_orcamento_obra_financeiro();
+
+DROP TRIGGER IF EXISTS obra_financeiro_update ON itens_orcamento;
+CREATE TRIGGER obra_financeiro_update
+  AFTER UPDATE ON itens_orcamento
+  REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_itens_orcamento_obra_financeiro();
+
+DROP TRIGGER IF EXISTS obra_financeiro_delete ON itens_orcamento;
+CREATE TRIGGER obra_financeiro_delete
+  AFTER DELETE ON itens_orcamento
+  REFERENCING OLD TABLE AS antigos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_itens_orcamento_obra_financeiro();
+
+-- Reconta os vencidos das obras cuja contagem é de outro dia.
+-- Escritas concorrentes à recontagem podem deixar o número errado por
+-- uma unidade até a recontagem do dia seguinte.
+CREATE OR REPLACE FUNCTION atualizar_vencidos_obras(p_obra_ids UUID[])
+RETURNS VOID AS $$
+BEGIN
+  UPDATE obra_financeiro r
+  SET pagamentos_vencidos = CASE WHEN r.lancamentos_pendentes = 0 THEN 0 ELSE (
+        SELECT COUNT(*)
+        FROM lancamentos_financeiros l
+        WHERE l.obra_id = r.obra_id
+          AND l.status = 'pendente'
+          AND l.data_vencimento < CURRENT_DATE
+      ) END,
+      vencidos_em = CURRENT_DATE
+  WHERE r.obra_id = ANY(p_obra_ids)
+    AND r.vencidos_em < CURRENT_DATE;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- Recalcula o resumo do zero (todas as obras, ou uma). Usado na carga
+-- inicial e para corrigir divergências, por exemplo depois de um TRUNCATE.
+CREATE OR REPLACE FUNCTION recalcular_obra_financeiro(p_obra_id UUID DEFAULT NULL)
+RETURNS BIGINT AS $$
+DECLARE
+  linhas BIGINT;
+BEGIN
+  INSERT INTO obra_financeiro AS r (
+    obra_id, user_id, orcamento_total, gasto_total, lancamentos_pendentes,
+    pagamentos_vencidos, vencidos_em, atualizado_em
+  )
+  SELECT
+    o.id, o.user_id,
+    COALESCE(orcamento.total, 0), COALESCE(gastos.total, 0),
+    COALESCE(gastos.pendentes, 0), COALESCE(gastos.vencidos, 0),
+    CURRENT_DATE, now()
+  FROM obras o
+  LEFT JOIN (
+    SELECT obra_id, SUM(valor_total_orcado) AS total
+    FROM itens_orcamento
+    WHERE p_obra_id IS NULL OR obra_id = p_obra_id
+    GROUP BY obra_id
+  ) orcamento ON orcamento.obra_id = o.id
+  LEFT JOIN (
+    SELECT
+      obra_id,
+      SUM(valor) AS total,
+      COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
+      COUNT(*) FILTER (WHERE status = 'pendente' AND data_vencimento < CURRENT_DATE) AS vencidos
+    FROM lancamentos_financeiros
+    WHERE p_obra_id IS NULL OR obra_id = p_obra_id
+    GROUP BY obra_id
+  ) gastos ON gastos.obra_id = o.id
+  WHERE p_obra_id IS NULL OR o.id = p_obra_id
+  ON CONFLICT (obra_id) DO UPDATE SET
+    user_id = EXCLUDED.user_id,
+    orcamento_total = EXCLUDED.orcamento_total,
+    gasto_total = EXCLUDED.gasto_total,
+    lancamentos_pendentes = EXCLUDED.lancamentos_pendentes,
+    pagamentos_vencidos = EXCLUDED.pagamentos_vencidos,
+    vencidos_em = EXCLUDED.vencidos_em,
+    atualizado_em = EXCLUDED.atualizado_em;
+  GET DIAGNOSTICS linhas = ROW_COUNT;
+  RETURN linhas;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- Só os triggers e as functions de analytics (SECURITY DEFINER, do mesmo
+-- dono) chamam estas functions. No Supabase os privilégios padrão do
+-- schema public dão EXECUTE a anon e authenticated, o que as exporia em
+-- /rpc: qualquer cliente poderia somar variações no resumo de outro
+-- usuário ou forçar o recálculo da tabela inteira.
+DO $$
+DECLARE
+  papeis TEXT;
+BEGIN
+  SELECT string_agg(', ' || quote_ident(rolname), '') INTO papeis
+  FROM pg_roles
+  WHERE rolname IN ('anon', 'authenticated');
+
+  EXECUTE 'REVOKE EXECUTE ON FUNCTION
+    aplicar_obra_financeiro(obra_financeiro_delta[]),
+    trg_lancamentos_obra_financeiro(),
+    trg_itens_orcamento_obra_financeiro(),
+    atualizar_vencidos_obras(UUID[]),
+    recalcular_obra_financeiro(UUID)
+  FROM PUBLIC' || COALESCE(papeis, '');
+END $$;
+
+-- Carga inicial. CREATE TRIGGER já bloqueou escritas nas duas tabelas
+-- até o COMMIT, então nenhuma escrita fica entre a carga e os triggers.
+SELECT recalcular_obra_financeiro();
+
+COMMIT;
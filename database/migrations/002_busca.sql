@@ -0,0 +1,134 @@
+-- Busca por trigramas em obras, fornecedores e lançamentos
+-- Substitui o ILIKE '%termo%' de search_all (varredura sequencial da
+-- tabela inteira) por índices GIN de trigramas sobre o texto sem acentos
+-- e em minúsculas.
+--
+-- No índice, cada trigrama vem prefixado pelo início do user_id dono da
+-- linha (chaves_busca), então a lista de linhas de cada chave só tem
+-- linhas de um usuário e a busca cresce com os dados do próprio usuário,
+-- não com a tabela. Um índice gin_trgm_ops comum, mesmo começando por
+-- user_id (btree_gin), lê a lista inteira de cada trigrama do termo, com
+-- as linhas de todos os usuários, e só depois cruza com o user_id.
+--
+-- Em tabelas grandes, CREATE INDEX bloqueia escritas enquanto roda: para
+-- evitar, crie os índices antes, um a um, com CREATE INDEX CONCURRENTLY.
+
+CREATE SCHEMA IF NOT EXISTS extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+
+BEGIN;
+
+-- Trigramas prefixados pelos 8 primeiros caracteres do user_id. Dois
+-- usuários com o mesmo prefixo só dividem listas: o filtro por user_id
+-- das buscas continua descartando as linhas do outro. Uma expressão só
+-- (sem subconsulta), para o planner embutir a function no índice.
+CREATE OR REPLACE FUNCTION chaves_usuario(p_user_id UUID, p_trigramas TEXT[])
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$
+  SELECT string_to_array(
+    left(p_user_id::text, 8) || array_to_string(p_trigramas, '|' || left(p_user_id::text, 8)), '|'
+  )
+$$;
+
+-- unaccent() não é IMMUTABLE (depende do search_path), então não pode
+-- entrar em índice. As versões abaixo fixam o schema de tudo o que
+-- chamam, porque o Postgres mantém os índices com um search_path só com
+-- pg_catalog.
+DO $$
+DECLARE
+  esquema TEXT;
+  esquema_trgm TEXT;
+BEGIN
+  SELECT n.nspname INTO esquema
+  FROM pg_extension e
+  JOIN pg_namespace n ON n.oid = e.extnamespace
+  WHERE e.extname = 'unaccent';
+
+  SELECT n.nspname INTO esquema_trgm
+  FROM pg_extension e
+  JOIN pg_namespace n ON n.oid = e.extnamespace
+  WHERE e.extname = 'pg_trgm';
+
+  EXECUTE format($f$
+    CREATE OR REPLACE FUNCTION normalizar_busca(p_texto TEXT)
+    RETURNS TEXT
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $b$ SELECT lower(%1$I.unaccent(%2$L::regdictionary, p_texto)) $b$
+  $f$, esquema, esquema || '.unaccent');
+
+  -- Chaves de um texto no índice
+  EXECUTE format($f$
+    CREATE OR REPLACE FUNCTION chaves_busca(p_user_id UUID, p_texto TEXT)
+    RETURNS TEXT[]
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $b$ SELECT %1$I.chaves_usuario(p_user_id, %2$I.show_trgm(p_texto)) $b$
+  $f$, current_schema(), esquema_trgm);
+END $$;
+
+-- Chaves que toda linha com o termo (já normalizado) como trecho tem: os
+-- trigramas de cada palavra do termo, sem os espaços de borda que o
+-- trecho não garante (a primeira palavra pode estar no meio de uma
+-- palavra do texto, e a última pode continuar). Vazio quando o termo não
+-- tem letras nem dígitos suficientes para formar um trigrama.
+CREATE OR REPLACE FUNCTION chaves_trecho(p_user_id UUID, p_termo TEXT)
+RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$
+  SELECT chaves_usuario(p_user_id, ARRAY(
+    SELECT DISTINCT t
+    FROM (
+      SELECT palavra, n, COUNT(*) OVER () AS palavras
+      FROM regexp_split_to_table(p_termo, '[^[:alnum:]]+') WITH ORDINALITY AS p(palavra, n)
+    ) p, unnest(show_trgm(p.palavra)) t
+    WHERE p.palavra <> ''
+      AND (p.n > 1 OR t NOT LIKE ' %')
+      AND (p.n < p.palavras OR t NOT LIKE '% ')
+  ))
+$$;
+
+-- Chaves de que toda linha com uma palavra parecida com o termo tem pelo
+-- menos uma: com word_similarity >= limiar, a linha divide ao menos
+-- m = teto(limiar * n) dos n trigramas do termo, então tem algum entre
+-- quaisquer n - m + 1 deles (o - 0.0001 cobre o arredondamento do float
+-- e no pior caso pede uma chave a mais). Os trigramas de borda vêm por
+-- último, os com dois espaços ("  c") depois de todos, porque se repetem
+-- em muito mais palavras. Com limiar 1 a linha tem todos os trigramas do
+-- termo, inclusive os de chaves_trecho, que já a encontram: nenhuma chave.
+CREATE OR REPLACE FUNCTION chaves_parecidas(p_user_id UUID, p_termo TEXT)
+RETURNS TEXT[]
+LANGUAGE sql STABLE PARALLEL SAFE STRICT
+AS $$
+  SELECT chaves_usuario(p_user_id, ARRAY(
+    SELECT t
+    FROM unnest(show_trgm(p_termo)) t
+    WHERE current_setting('pg_trgm.word_similarity_threshold')::float8 < 1
+    ORDER BY length(t) - length(replace(t, ' ', '')), t
+    LIMIT cardinality(show_trgm(p_termo))
+      - ceil(cardinality(show_trgm(p_termo))
+             * current_setting('pg_trgm.word_similarity_threshold')::float8 - 0.0001)::int + 1
+  ))
+$$;
+
+-- Índices da versão anterior desta migration (trigramas de todos os
+-- usuários em cada lista)
+DROP INDEX IF EXISTS idx_obras_busca;
+DROP INDEX IF EXISTS idx_fornecedores_busca;
+DROP INDEX IF EXISTS idx_lancamentos_busca;
+
+-- As expressões abaixo precisam ser idênticas às usadas em buscar() e
+-- search_all() para que o planner use os índices
+CREATE INDEX IF NOT EXISTS idx_obras_busca_usuario ON obras USING gin (
+  chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cliente, '') || ' ' || COALESCE(endereco, '')))
+);
+
+CREATE INDEX IF NOT EXISTS idx_fornecedores_busca_usuario ON fornecedores USING gin (
+  chaves_busca(user_id, normalizar_busca(nome || ' ' || COALESCE(cnpj, '') || ' ' || COALESCE(email, '')))
+);
+
+CREATE INDEX IF NOT EXISTS idx_lancamentos_busca_usuario ON lancamentos_financeiros USING gin (
+  chaves_busca(user_id, normalizar_busca(descricao || ' ' || COALESCE(numero_documento, '')))
+);
+
+COMMIT;
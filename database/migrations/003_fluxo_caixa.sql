@@ -0,0 +1,175 @@
+-- Fluxo de caixa mensal por usuário e obra, mantido por triggers
+-- get_fluxo_caixa agrupava os lançamentos por date_trunc('month',
+-- data_emissao) a cada chamada, sem índice que servisse. O resumo guarda
+-- uma linha por (usuário, mês, obra) e get_fluxo_caixa_periodo soma essas
+-- linhas para meses e trimestres inteiros.
+--
+-- Como em 001_obra_financeiro.sql, os triggers são por comando e aplicam
+-- só a variação dos meses tocados: um mês antigo não muda (nem é
+-- recalculado) a menos que um lançamento dele seja alterado, e no uso
+-- normal só o mês corrente recebe escritas. recalcular_fluxo_caixa()
+-- refaz o resumo a partir de um mês (por padrão o corrente).
+
+BEGIN;
+
+-- search_path das functions SECURITY DEFINER: o desta sessão, com pg_temp
+-- por último (como em 001_obra_financeiro.sql)
+SELECT set_config('search_path', current_setting('search_path') || ', pg_temp', true);
+
+CREATE TABLE IF NOT EXISTS fluxo_caixa_mensal (
+  user_id UUID NOT NULL,
+  mes DATE NOT NULL,
+  obra_id UUID NOT NULL REFERENCES obras(id) ON DELETE CASCADE,
+  saidas NUMERIC NOT NULL DEFAULT 0,
+  num_lancamentos BIGINT NOT NULL DEFAULT 0,
+  atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, mes, obra_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_fluxo_caixa_mensal_obra ON fluxo_caixa_mensal (obra_id);
+
+-- Semanas e pontas de meses incompletos vêm direto dos lançamentos, por
+-- faixa de data_emissao (o INCLUDE evita ler a tabela)
+CREATE INDEX IF NOT EXISTS idx_lancamentos_user_emissao
+  ON lancamentos_financeiros (user_id, data_emissao) INCLUDE (obra_id, valor);
+
+ALTER TABLE fluxo_caixa_mensal ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS fluxo_caixa_mensal_select ON fluxo_caixa_mensal;
+CREATE POLICY fluxo_caixa_mensal_select ON fluxo_caixa_mensal
+  FOR SELECT USING (user_id = auth.uid());
+
+-- Variação de um mês de uma obra produzida por um comando
+DO $$ BEGIN
+  CREATE TYPE fluxo_caixa_delta AS (
+    obra_id UUID,
+    mes DATE,
+    saidas NUMERIC,
+    lancamentos BIGINT
+  );
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- Soma as variações nas linhas de cada mês e remove meses que ficaram vazios
+CREATE OR REPLACE FUNCTION aplicar_fluxo_caixa(p_deltas fluxo_caixa_delta[])
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO fluxo_caixa_mensal AS r (user_id, mes, obra_id, saidas, num_lancamentos)
+  SELECT o.user_id, d.mes, o.id, SUM(d.saidas), SUM(d.lancamentos)
+  FROM unnest(p_deltas) d
+  -- Obras apagadas (ON DELETE CASCADE dos lançamentos) ficam de fora
+  JOIN obras o ON o.id = d.obra_id
+  GROUP BY o.user_id, d.mes, o.id
+  HAVING SUM(d.saidas) <> 0 OR SUM(d.lancamentos) <> 0
+  -- Mesma ordem de bloqueio em todos os comandos, sem deadlock entre eles
+  ORDER BY o.user_id, d.mes, o.id
+  ON CONFLICT (user_id, mes, obra_id) DO UPDATE SET
+    saidas = r.saidas + EXCLUDED.saidas,
+    num_lancamentos = r.num_lancamentos + EXCLUDED.num_lancamentos,
+    atualizado_em = now();
+
+  DELETE FROM fluxo_caixa_mensal r
+  USING (SELECT DISTINCT obra_id, mes FROM unnest(p_deltas)) d
+  WHERE r.obra_id = d.obra_id
+    AND r.mes = d.mes
+    AND r.num_lancamentos = 0;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+CREATE OR REPLACE FUNCTION trg_lancamentos_fluxo_caixa()
+RETURNS TRIGGER AS $$
+DECLARE
+  deltas fluxo_caixa_delta[] := '{}';
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(
+        obra_id, date_trunc('month', data_emissao)::date,
+        -COALESCE(SUM(ABS(valor)), 0)::numeric, -COUNT(*)
+      )::fluxo_caixa_delta
+      FROM antigos
+      GROUP BY obra_id, date_trunc('month', data_emissao)
+    );
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    deltas := deltas || ARRAY(
+      SELECT ROW(
+        obra_id, date_trunc('month', data_emissao)::date,
+        COALESCE(SUM(ABS(valor)), 0)::numeric, COUNT(*)
+      )::fluxo_caixa_delta
+      FROM novos
+      GROUP BY obra_id, date_trunc('month', data_emissao)
+    );
+  END IF;
+  PERFORM aplicar_fluxo_caixa(deltas);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- Tabelas de transição exigem um trigger por evento
+DROP TRIGGER IF EXISTS fluxo_caixa_insert ON lancamentos_financeiros;
+CREATE TRIGGER fluxo_caixa_insert
+  AFTER INSERT ON lancamentos_financeiros
+  REFERENCING NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_fluxo_caixa();
+
+DROP TRIGGER IF EXISTS fluxo_caixa_update ON lancamentos_financeiros;
+CREATE TRIGGER fluxo_caixa_update
+  AFTER UPDATE ON lancamentos_financeiros
+  REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_fluxo_caixa();
+
+DROP TRIGGER IF EXISTS fluxo_caixa_delete ON lancamentos_financeiros;
+CREATE TRIGGER fluxo_caixa_delete
+  AFTER DELETE ON lancamentos_financeiros
+  REFERENCING OLD TABLE AS antigos
+  FOR EACH STATEMENT EXECUTE FUNCTION trg_lancamentos_fluxo_caixa();
+
+-- Refaz o resumo dos meses a partir de p_desde (o mês corrente por
+-- padrão; NULL refaz tudo). Meses anteriores não são tocados.
+CREATE OR REPLACE FUNCTION recalcular_fluxo_caixa(
+  p_desde DATE DEFAULT date_trunc('month', CURRENT_DATE)::date
+)
+RETURNS BIGINT AS $$
+DECLARE
+  desde DATE := COALESCE(date_trunc('month', p_desde)::date, '-infinity'::date);
+  linhas BIGINT;
+BEGIN
+  DELETE FROM fluxo_caixa_mensal WHERE mes >= desde;
+
+  INSERT INTO fluxo_caixa_mensal (user_id, mes, obra_id, saidas, num_lancamentos)
+  SELECT o.user_id, date_trunc('month', l.data_emissao)::date, o.id, SUM(ABS(l.valor)), COUNT(*)
+  FROM lancamentos_financeiros l
+  JOIN obras o ON o.id = l.obra_id
+  WHERE l.data_emissao >= desde
+  GROUP BY o.user_id, date_trunc('month', l.data_emissao), o.id
+  ON CONFLICT (user_id, mes, obra_id) DO UPDATE SET
+    saidas = EXCLUDED.saidas,
+    num_lancamentos = EXCLUDED.num_lancamentos,
+    atualizado_em = now();
+  GET DIAGNOSTICS linhas = ROW_COUNT;
+  RETURN linhas;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path FROM CURRENT;
+
+-- Só os triggers chamam estas functions: sem EXECUTE para os clientes do
+-- PostgREST, que poderiam alterar ou apagar o resumo de outro usuário
+DO $$
+DECLARE
+  papeis TEXT;
+BEGIN
+  SELECT string_agg(', ' || quote_ident(rolname), '') INTO papeis
+  FROM pg_roles
+  WHERE rolname IN ('anon', 'authenticated');
+
+  EXECUTE 'REVOKE EXECUTE ON FUNCTION
+    aplicar_fluxo_caixa(fluxo_caixa_delta[]),
+    trg_lancamentos_fluxo_caixa(),
+    recalcular_fluxo_caixa(DATE)
+  FROM PUBLIC' || COALESCE(papeis, '');
+END $$;
+
+-- Carga inicial. CREATE TRIGGER já bloqueou escritas nos lançamentos
+-- até o COMMIT, então nenhuma escrita fica entre a carga e os triggers.
+SELECT recalcular_fluxo_caixa(NULL);
+
+COMMIT;
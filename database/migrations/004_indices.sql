@@ -0,0 +1,68 @@
+-- Índices das consultas do backend e de functions/analytics_functions.sql
+-- Cada índice abaixo serve a uma consulta que antes lia a tabela inteira
+-- ou o índice de user_id e filtrava/ordenava o resto. A suíte
+-- benchmarks/regressao_planos.sql confere que nenhuma delas volta a
+-- fazer varredura sequencial.
+--
+-- Já criados em migrations anteriores:
+--   idx_lancamentos_pendentes_vencimento (001) - alertas e vencidos
+--   idx_*_busca_usuario (002) - busca por trigramas
+--   idx_lancamentos_user_emissao (003) - fluxo de caixa por faixa de datas
+--
+-- Em tabelas grandes, CREATE INDEX bloqueia escritas enquanto roda: para
+-- evitar, crie os índices antes, um a um, com CREATE INDEX CONCURRENTLY.
+
+BEGIN;
+
+-- ============= OBRAS =============
+
+-- get_all_obras: página por (created_at, id) decrescente
+CREATE INDEX IF NOT EXISTS idx_obras_user_criacao
+  ON obras (user_id, created_at DESC, id DESC);
+
+-- get_obras_by_status: mesmo filtro, com status
+CREATE INDEX IF NOT EXISTS idx_obras_user_status_criacao
+  ON obras (user_id, status, created_at DESC, id DESC);
+
+-- ============= FORNECEDORES =============
+
+-- get_fornecedores: página por (nome, id), só com colunas do índice
+CREATE INDEX IF NOT EXISTS idx_fornecedores_user_nome
+  ON fornecedores (user_id, nome, id);
+
+-- ============= LANÇAMENTOS =============
+
+-- Fluxo de caixa de uma obra (get_fluxo_caixa_periodo com p_obra_id) e
+-- custos por obra (get_custos_obras), sem ler a tabela
+CREATE INDEX IF NOT EXISTS idx_lancamentos_user_obra_emissao
+  ON lancamentos_financeiros (user_id, obra_id, data_emissao) INCLUDE (valor);
+
+-- get_fornecedores_analytics: resumo do período do usuário
+CREATE INDEX IF NOT EXISTS idx_lancamentos_user_criacao
+  ON lancamentos_financeiros (user_id, created_at) INCLUDE (fornecedor_id, valor);
+
+-- get_fornecedores_analytics: lançamentos recentes de cada fornecedor
+-- (user_id no INCLUDE para filtrar lançamentos de outros usuários sem ler
+-- a tabela)
+CREATE INDEX IF NOT EXISTS idx_lancamentos_fornecedor_criacao
+  ON lancamentos_financeiros (fornecedor_id, created_at) INCLUDE (valor, user_id);
+
+-- get_obra_dashboard / get_obras_dashboards: 5 pagamentos vencidos mais
+-- antigos da obra. Com só (obra_id, data_vencimento), o filtro por user_id
+-- levava o planner a um BitmapAnd com o índice de busca e a ordenar todos
+-- os pendentes da obra
+CREATE INDEX IF NOT EXISTS idx_lancamentos_user_obra_pendentes
+  ON lancamentos_financeiros (user_id, obra_id, data_vencimento)
+  WHERE status = 'pendente';
+
+-- Chave estrangeira: ON DELETE CASCADE das obras e recálculos por obra
+CREATE INDEX IF NOT EXISTS idx_lancamentos_obra
+  ON lancamentos_financeiros (obra_id);
+
+-- ============= ITENS DE ORÇAMENTO =============
+
+-- Chave estrangeira e soma do orçamento por obra (recalcular_obra_financeiro)
+CREATE INDEX IF NOT EXISTS idx_itens_orcamento_obra
+  ON itens_orcamento (obra_id) INCLUDE (valor_total_orcado);
+
+COMMIT;
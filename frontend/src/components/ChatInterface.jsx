@@ -20,7 +20,10 @@ export default function ChatInterface() {
   const { llmConfig, setLLMConfig } = useLLMConfig();
   const [messages, setMessages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [showLLMConfig, setShowLLMConfig] = useState(!llmConfig);
+  // The backend keeps the LLM context of each conversation id
+  const [conversationId, setConversationId] = useState(() => crypto.randomUUID());
   const messagesEndRef = useRef(null);
 
   // Auto-scroll to bottom
@@ -60,5 +63,195 @@ export default function ChatInterface() {
     setMessages(prev => [...prev, userMessage]);
     setIsLoading(true);
 
+    // Placeholder answer, filled in as tokens arrive from the stream
+    const assistantId = `${userMessage.id}-assistant`;
+    setMessages(prev => [...prev, {
+      id: assistantId,
+      type: 'assistant',
+      content: '',
+      timestamp: new Date(),
+      isStreaming: true
+    }]);
+
+    const updateAssistant = (update) => {
+      setMessages(prev => prev.map(msg =>
+        msg.id === assistantId ? { ...msg, ...update(msg) } : msg
+      ));
+    };
+
+    const handleEvent = (event, data) => {
+      switch (event) {
+        case 'token':
+          setIsLoading(false);
+          updateAssistant(msg => ({ content: msg.content + data.content }));
+          break;
+        case 'result':
+          updateAssistant(() => ({
+            content: data.response,
+            data: data.data,
+            operation: data.operation_performed,
+            request: content
+          }));
+          break;
+        case 'done':
+          updateAssistant(() => ({
+            tokensUsed: data.tokens_used,
+            modelUsed: data.model_used
+          }));
+          break;
+        case 'error':
+          throw new Error(data.detail);
+        default:
+          break;
+      }
+    };
+
     try {
-      const response = await axios.post(
\ No newline at end of file
+      // EventSource only supports GET, so read the SSE stream from fetch
+      const response = await fetch(`${API_URL}/api/chat/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${session?.access_token}`
+        },
+        body: JSON.stringify({ message: content, conversation_id: conversationId })
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`Erro ${response.status}`);
+      }
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += value;
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+          let event = 'message';
+          let data = '';
+          for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+        }
+      }
+    } catch (error) {
+      console.error('Chat error:', error);
+      toast.error('Erro ao processar mensagem');
+      updateAssistant(msg => ({
+        content: msg.content || 'Desculpe, ocorreu um erro ao processar sua mensagem.',
+        isError: true
+      }));
+    } finally {
+      setIsLoading(false);
+      updateAssistant(() => ({ isStreaming: false }));
+    }
+  };
+
+  // List answers come one page at a time; data.next_cursor fetches the next
+  const pagedMessage = [...messages].reverse().find(msg => msg.data?.next_cursor);
+
+  const loadMore = async (message) => {
+    setIsLoadingMore(true);
+    try {
+      const { data } = await axios.post(`${API_URL}/api/chat`, {
+        message: message.request,
+        cursor: message.data.next_cursor
+      }, {
+        headers: { Authorization: `Bearer ${session?.access_token}` }
+      });
+      setMessages(prev => prev.map(msg =>
+        msg.id === message.id ? {
+          ...msg,
+          data: {
+            items: [...(msg.data.items || []), ...(data.data?.items || [])],
+            next_cursor: data.data?.next_cursor || null
+          }
+        } : msg
+      ));
+    } catch (error) {
+      console.error('Load more error:', error);
+      toast.error('Erro ao carregar mais resultados');
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const handleSaveConfig = async (config) => {
+    await axios.post(`${API_URL}/api/llm/config`, config, {
+      headers: { Authorization: `Bearer ${session?.access_token}` }
+    });
+    setLLMConfig(config);
+  };
+
+  const clearChat = () => {
+    setMessages([]);
+    setConversationId(crypto.randomUUID());
+  };
+
+  return (
+    <div className="flex flex-col h-screen bg-gray-50">
+      <header className="flex items-center justify-between px-6 py-4 bg-white border-b">
+        <div className="flex items-center gap-2">
+          <ChartBarIcon className="h-6 w-6 text-blue-600" />
+          <h1 className="text-lg font-semibold text-gray-900">Agente IA - Gestão de Obras</h1>
+        </div>
+        <div className="flex items-center gap-2">
+          {!llmConfig && (
+            <span className="flex items-center gap-1 text-sm text-amber-600">
+              <ExclamationTriangleIcon className="h-5 w-5" />
+              Modelo não configurado
+            </span>
+          )}
+          <button
+            onClick={clearChat}
+            className="p-2 text-gray-500 hover:text-gray-700"
+            title="Limpar conversa"
+          >
+            <ArrowPathIcon className="h-5 w-5" />
+          </button>
+          <button
+            onClick={() => setShowLLMConfig(true)}
+            className="p-2 text-gray-500 hover:text-gray-700"
+            title="Configurar modelo"
+          >
+            <Cog6ToothIcon className="h-5 w-5" />
+          </button>
+        </div>
+      </header>
+
+      <main className="flex-1 overflow-y-auto px-6 py-4">
+        <MessageList messages={messages} isLoading={isLoading} />
+        {pagedMessage && (
+          <div className="flex justify-center py-2">
+            <button
+              onClick={() => loadMore(pagedMessage)}
+              disabled={isLoadingMore}
+              className="px-4 py-2 text-sm text-blue-600 border border-blue-200 rounded-lg hover:bg-blue-50 disabled:opacity-50"
+            >
+              {isLoadingMore
+                ? 'Carregando...'
+                : `Carregar mais (${pagedMessage.data.items?.length || 0} exibidos)`}
+            </button>
+          </div>
+        )}
+        <div ref={messagesEndRef} />
+      </main>
+
+      <MessageInput onSend={sendMessage} disabled={isLoading} />
+
+      <LLMConfiguration
+        isOpen={showLLMConfig}
+        onClose={() => setShowLLMConfig(false)}
+        onSave={handleSaveConfig}
+      />
+    </div>
+  );
+}
@@ -0,0 +1,214 @@
+"""
+Benchmark do custo de autenticação por requisição (security/auth_phase1.py)
+Compara a validação remota original (supabase.auth.get_user a cada
+requisição) com a verificação local do JWT, contra um servidor Supabase
+Auth falso com latência de rede simulada. Também confere rejeição de
+tokens adulterados/expirados, rotação de chave (JWKS), tokens com `alg`
+forjado no cabeçalho e revogação.
+
+Execute: python scripts/bench_auth.py
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwk, jwt
+
+REDE_MS = float(os.getenv("BENCH_AUTH_RTT_MS", "20"))
+REQUISICOES = 200
+SECRET = "segredo-de-teste-do-benchmark-com-32-bytes"
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+class FakeAuthHandler(BaseHTTPRequestHandler):
+    """Simula GET /auth/v1/user e o endpoint JWKS do Supabase"""
+
+    protocol_version = "HTTP/1.1"
+    jwks = {"keys": []}
+    revogados = set()
+
+    def do_GET(self):
+        time.sleep(REDE_MS / 1000)
+        if self.path.endswith("/jwks.json"):
+            return self._json(200, FakeAuthHandler.jwks)
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token in FakeAuthHandler.revogados:
+            return self._json(401, {"code": 401, "msg": "invalid JWT"})
+        self._json(200, {
+            "id": USER_ID, "aud": "authenticated", "email": "user@example.com",
+            "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z"
+        })
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAuthHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ["SUPABASE_SERVICE_KEY"] = "a.b.c"
+os.environ["SUPABASE_JWT_SECRET"] = SECRET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.security import auth_phase1
+from app.security.auth_phase1 import auth, supabase
+
+
+def token(exp_em=3600, key=SECRET, algorithm="HS256", kid=None):
+    claims = {"sub": USER_ID, "email": "user@example.com", "aud": "authenticated",
+              "exp": int(time.time()) + exp_em, "user_metadata": {}}
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(claims, key, algorithm=algorithm, headers=headers)
+
+
+async def legacy_get_current_user(credentials):
+    """Dependency original: uma chamada síncrona ao Supabase por requisição"""
+    user = supabase.auth.get_user(credentials.credentials).user
+    return {"id": user.id, "email": user.email, "metadata": user.user_metadata}
+
+
+async def medir(dependency, tokens):
+    tempos = []
+    for valor in tokens:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=valor)
+        started = time.perf_counter()
+        await dependency(credentials)
+        tempos.append((time.perf_counter() - started) * 1000)
+    return tempos
+
+
+async def rejeitado(valor):
+    """True só se o token for recusado com 401 (qualquer outra exceção vira 500)"""
+    try:
+        await auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=valor))
+        return False
+    except HTTPException as e:
+        return e.status_code == 401
+    except Exception as e:
+        print(f"   {type(e).__name__} não tratado: {e}")
+        return False
+
+
+def forjado(algorithm, kid, segredo=b""):
+    """Token com o `alg` pedido no cabeçalho, assinado por HMAC com `segredo` (ou sem assinatura)"""
+    def b64(dados):
+        return base64.urlsafe_b64encode(dados).decode().rstrip("=")
+    claims = {"sub": USER_ID, "aud": "authenticated", "exp": int(time.time()) + 3600}
+    corpo = f"{b64(json.dumps({'alg': algorithm, 'typ': 'JWT', 'kid': kid}).encode())}." \
+            f"{b64(json.dumps(claims).encode())}"
+    if algorithm == "none":
+        return corpo + "."
+    digest = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}[algorithm]
+    return f"{corpo}.{b64(hmac.new(segredo, corpo.encode(), digest).digest())}"
+
+
+async def benchmark():
+    print(f"[1] Custo por requisição (rede simulada: {REDE_MS:.0f}ms, {REQUISICOES} requisições)")
+    # Poucos usuários fazendo várias requisições, como no uso real
+    tokens = [token(exp_em=3600 + i % 10) for i in range(REQUISICOES)]
+    print(f"{'dependency':<28} | {'p50':>9} | {'p95':>9} | {'max':>9}")
+    for nome, dependency in [("remota (original)", legacy_get_current_user),
+                             ("local (JWT + cache)", auth.get_current_user)]:
+        tempos = await medir(dependency, tokens)
+        quantis = statistics.quantiles(tempos, n=100)
+        print(f"{nome:<28} | {quantis[49]:>7.3f}ms | {quantis[94]:>7.3f}ms | {max(tempos):>7.3f}ms")
+    print()
+
+
+async def verificacoes():
+    ok = True
+
+    print("[2] Tokens adulterados, expirados e de outro segredo...")
+    valido = token()
+    casos = [valido[:-2] + "xx", token(exp_em=-10), token(key="outro-segredo-qualquer-de-32-bytes")]
+    if all([await rejeitado(valor) for valor in casos]):
+        print("   OK - todos rejeitados com 401\n")
+    else:
+        print("   ERRO - algum token inválido foi aceito\n")
+        ok = False
+
+    print("[3] Rotação de chave assimétrica (JWKS)...")
+    for kid in ("chave-1", "chave-2"):
+        privada = ec.generate_private_key(ec.SECP256R1())
+        publica = jwk.construct(privada.public_key(), "ES256").to_dict()
+        FakeAuthHandler.jwks = {"keys": [{**publica, "kid": kid}]}
+        # Passa do intervalo mínimo entre recargas, sem vencer o TTL
+        auth_phase1.jwt_verifier.jwks.fetched_at = time.monotonic() - auth_phase1.JWKS_MIN_REFRESH_INTERVAL - 1
+        if await rejeitado(token(key=privada, algorithm="ES256", kid=kid)):
+            print(f"   ERRO - token assinado com {kid} rejeitado\n")
+            ok = False
+            break
+    else:
+        print("   OK - nova chave carregada pelo kid desconhecido\n")
+
+    print("[4] Algoritmo forjado no cabeçalho, com o kid de uma chave conhecida...")
+    # A chave pública usada como segredo HMAC (confusão de algoritmo)
+    publica_pem = privada.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    forjados = [
+        forjado("HS384", kid, publica_pem),
+        forjado("HS512", kid, publica_pem),
+        forjado("none", kid),
+        token(key=rsa.generate_private_key(65537, 2048).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ), algorithm="RS256", kid=kid),
+    ]
+    if all([await rejeitado(valor) for valor in forjados]):
+        print("   OK - HS384, HS512, none e RS256 com chave ES256 rejeitados com 401\n")
+    else:
+        print("   ERRO - algum token forjado foi aceito ou deu erro 500\n")
+        ok = False
+
+    print("[5] Revogação conferida no intervalo configurado...")
+    auth_phase1.jwt_verifier.revalidate_interval = 0.2
+    revogado = token(exp_em=7200)
+    aceito_antes = not await rejeitado(revogado)
+    FakeAuthHandler.revogados.add(revogado)
+    aceito_em_cache = not await rejeitado(revogado)
+    await asyncio.sleep(0.3)
+    if aceito_antes and aceito_em_cache and await rejeitado(revogado):
+        print("   OK - aceito até a próxima conferência, rejeitado depois\n")
+    else:
+        print("   ERRO - revogação não detectada\n")
+        ok = False
+    return ok
+
+
+async def main():
+    await benchmark()
+    return await verificacoes()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("   BENCHMARK DE AUTENTICAÇÃO")
+    print("=" * 60)
+    print()
+
+    ok = asyncio.run(main())
+    server.shutdown()
+    if not ok:
+        sys.exit(1)
@@ -0,0 +1,261 @@
+"""
+Benchmark da importação em lote (SecureDatabaseOperations.import_rows)
+Sobe um PostgREST falso local (latência por requisição + custo por linha)
+e compara inserir obras uma a uma com create_obra contra a importação de
+uma planilha CSV em lotes de tamanhos diferentes. Também confere o
+relatório de falhas parciais, a invalidação de cache por lote, a
+conversão das células pelo tipo de cada campo, a recusa de lançamentos
+com obra ou fornecedor de outro usuário e a contagem de linhas nas
+métricas.
+
+Execute: python scripts/bench_bulk_import.py [linhas] [latencia_ms]
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from supabase import create_client
+from app.secure_operations import SecureDatabaseOperations, ObraCreate, LancamentoCreate
+from app.bulk_import import iter_csv_rows, iter_xlsx_rows
+from app.monitoring import database_operations, imported_rows
+
+LINHAS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+LATENCY_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+CUSTO_POR_LINHA_MS = 0.02
+# A cada 500 linhas, uma com status inválido (rejeitada na validação) e
+# uma que o banco recusa (simula violação de constraint)
+INVALIDAS = 500
+# Obras e fornecedores do usuário "user-1" (o resto é de outros usuários)
+OBRA_PROPRIA, OBRA_ALHEIA = str(uuid.uuid4()), str(uuid.uuid4())
+FORNECEDOR_PROPRIO, FORNECEDOR_ALHEIO = str(uuid.uuid4()), str(uuid.uuid4())
+DO_USUARIO = {"obras": {OBRA_PROPRIA}, "fornecedores": {FORNECEDOR_PROPRIO}}
+
+
+class StubPostgrestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubPostgrestHandler(BaseHTTPRequestHandler):
+    """
+    Aceita INSERTs em lote; recusa o lote inteiro se alguma obra se chamar
+    'RECUSADA'. SELECTs de id em obras/fornecedores devolvem só os do usuário.
+    """
+
+    inseridas = 0
+    requisicoes = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        rows = body if isinstance(body, list) else [body]
+        time.sleep((LATENCY_MS + CUSTO_POR_LINHA_MS * len(rows)) / 1000)
+        with StubPostgrestHandler.lock:
+            StubPostgrestHandler.requisicoes += 1
+        if any(row.get("nome") == "RECUSADA" for row in rows):
+            return self._reply(409, {"code": "23505", "message": "duplicate key value", "details": None, "hint": None})
+        with StubPostgrestHandler.lock:
+            StubPostgrestHandler.inseridas += len(rows)
+        self._reply(201, None)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        tabela = url.path.rsplit("/", 1)[-1]
+        filtros = parse_qs(url.query)
+        pedidos = filtros["id"][0][len("in.("):-1].split(",")
+        self._reply(200, [{"id": id_} for id_ in pedidos if id_ in DO_USUARIO.get(tabela, ())])
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ContadorCache:
+    """Conta as invalidações feitas pela importação"""
+
+    def __init__(self):
+        self.invalidacoes = 0
+
+    async def invalidate_tables(self, user_id, tables):
+        self.invalidacoes += 1
+
+
+def gerar_csv(linhas):
+    buffer = io.StringIO()
+    buffer.write("Nome;Responsável;Cliente;Status;Data Início\n")
+    for i in range(linhas):
+        nome, status = f"Obra {i}", "Em andamento"
+        if i % INVALIDAS == 1:
+            status = "Demolida"
+        elif i % INVALIDAS == 2:
+            nome = "RECUSADA"
+        buffer.write(f"{nome};Responsável {i % 7};Cliente {i % 13};{status};01/02/2024\n")
+    return buffer.getvalue().encode("utf-8")
+
+
+def resetar():
+    StubPostgrestHandler.inseridas = 0
+    StubPostgrestHandler.requisicoes = 0
+
+
+async def uma_a_uma(db_ops, conteudo):
+    inseridas = falhas = 0
+    for _, row in iter_csv_rows(io.BytesIO(conteudo), ObraCreate):
+        try:
+            await db_ops.create_obra("user-1", ObraCreate(**row))
+            inseridas += 1
+        except Exception:
+            falhas += 1
+    return {"inserted": inseridas, "failed": falhas}
+
+
+async def main():
+    server = StubPostgrestServer(("127.0.0.1", 0), StubPostgrestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = create_client(f"http://127.0.0.1:{server.server_address[1]}", "stub.service.key")
+    conteudo = gerar_csv(LINHAS)
+
+    print("=" * 86)
+    print(f"  {LINHAS} obras, latência do stub {LATENCY_MS}ms + {CUSTO_POR_LINHA_MS}ms por linha")
+    print("=" * 86)
+    print(f"{'cenário':<26} | {'tempo':>9} | {'linhas/s':>9} | {'inseridas':>9} | {'falhas':>6} | "
+          f"{'requisições':>11} | {'invalidações':>12}")
+
+    cenarios = [("uma a uma (create_obra)", None)] + [(f"lotes de {size}", size) for size in (50, 200, 1000)]
+    relatorios = {}
+    for nome, batch_size in cenarios:
+        cache = ContadorCache()
+        db_ops = SecureDatabaseOperations(client, cache=cache)
+        resetar()
+        started = time.perf_counter()
+        if batch_size is None:
+            relatorio = await uma_a_uma(db_ops, conteudo)
+        else:
+            relatorio = await db_ops.import_rows(
+                "user-1", "obras", iter_csv_rows(io.BytesIO(conteudo), ObraCreate), batch_size
+            )
+        duracao = time.perf_counter() - started
+        db_ops.close()
+        relatorios[nome] = relatorio
+        print(f"{nome:<26} | {duracao:>8.2f}s | {LINHAS / duracao:>9.0f} | {relatorio['inserted']:>9} | "
+              f"{relatorio['failed']:>6} | {StubPostgrestHandler.requisicoes:>11} | {cache.invalidacoes:>12}")
+
+    server.shutdown()
+
+    esperadas_falhas = 2 * len(range(1, LINHAS, INVALIDAS))
+    relatorio = relatorios["lotes de 200"]
+    print()
+    print("[1] Relatório de falhas parciais...")
+    ok = True
+    if relatorio["failed"] == esperadas_falhas and relatorio["inserted"] == LINHAS - esperadas_falhas:
+        print(f"   OK - {relatorio['failed']} linhas rejeitadas, ex.: {relatorio['errors'][:2]}")
+    else:
+        print(f"   ERRO - {relatorio['failed']} falhas, esperado {esperadas_falhas}")
+        ok = False
+
+    print("\n[2] Células convertidas pelo tipo do campo...")
+    obras_csv = "Nome;Responsável;Tamanho Obra;Data Início\nObra A;Ana;250;01/02/2024\nObra B;Bia;1.200,50;\n"
+    lancamentos_csv = (
+        "obra_id;descricao;valor;data_emissao;numero_documento\n"
+        f"{OBRA_PROPRIA};Cimento;1.234,56;05/03/2024;123\n"
+    )
+    linhas = [row for _, row in iter_csv_rows(io.BytesIO(obras_csv.encode()), ObraCreate)]
+    linhas += [row for _, row in iter_csv_rows(io.BytesIO(lancamentos_csv.encode()), LancamentoCreate)]
+    linhas += [row for _, row in iter_xlsx_rows(gerar_xlsx(), LancamentoCreate)]
+    esperadas = [
+        {"nome": "Obra A", "responsavel": "Ana", "tamanho_obra": "250", "data_inicio": "2024-02-01"},
+        {"nome": "Obra B", "responsavel": "Bia", "tamanho_obra": "1.200,50", "data_inicio": None},
+        {"obra_id": OBRA_PROPRIA, "descricao": "Cimento", "valor": 1234.56, "data_emissao": "2024-03-05",
+         "numero_documento": "123"},
+        {"obra_id": OBRA_PROPRIA, "descricao": "Areia", "valor": 350, "data_emissao": "2024-03-05",
+         "numero_documento": "4567"},
+    ]
+    modelos = [ObraCreate, ObraCreate, LancamentoCreate, LancamentoCreate]
+    try:
+        for modelo, linha in zip(modelos, linhas):
+            modelo(**linha)
+        validas = True
+    except Exception as e:
+        validas = e
+    if linhas == esperadas and validas is True:
+        print("   OK - texto fica texto ('250', '1.200,50', '123'), datas e valores convertidos")
+    else:
+        print(f"   ERRO - linhas={linhas}, validação={validas}")
+        ok = False
+
+    print("\n[3] Lançamentos com obra ou fornecedor de outro usuário...")
+    server = StubPostgrestServer(("127.0.0.1", 0), StubPostgrestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = create_client(f"http://127.0.0.1:{server.server_address[1]}", "stub.service.key")
+    db_ops = SecureDatabaseOperations(client, cache=ContadorCache())
+    resetar()
+    lancamentos_csv = "obra_id;fornecedor_id;descricao;valor;data_emissao\n" + "".join(
+        f"{obra};{fornecedor};Cimento;10,00;05/03/2024\n" for obra, fornecedor in [
+            (OBRA_PROPRIA, FORNECEDOR_PROPRIO), (OBRA_PROPRIA, ""),
+            (OBRA_PROPRIA, FORNECEDOR_ALHEIO), (OBRA_ALHEIA, FORNECEDOR_PROPRIO),
+        ]
+    )
+    antes = {status: imported_rows.labels(table="lancamentos_financeiros", status=status)._value.get()
+             for status in ("inserted", "failed")}
+    relatorio = await db_ops.import_rows(
+        "user-1", "lancamentos_financeiros",
+        iter_csv_rows(io.BytesIO(lancamentos_csv.encode()), LancamentoCreate)
+    )
+    db_ops.close()
+    server.shutdown()
+    erros = {erro["row"]: erro["error"].split(":")[0] for erro in relatorio["errors"]}
+    if relatorio["inserted"] == 2 and erros == {4: "fornecedor_id", 5: "obra_id"}:
+        print(f"   OK - 2 inseridas, recusadas: {relatorio['errors']}")
+    else:
+        print(f"   ERRO - {relatorio}")
+        ok = False
+
+    print("\n[4] Métricas da importação...")
+    contadas = {status: imported_rows.labels(table="lancamentos_financeiros", status=status)._value.get()
+                - antes[status] for status in antes}
+    bissecao = [amostra for metrica in database_operations.collect() for amostra in metrica.samples
+                if amostra.labels.get("operation") == "_insert_batch"]
+    if contadas == {"inserted": relatorio["inserted"], "failed": relatorio["failed"]} and not bissecao:
+        print(f"   OK - linhas contadas uma vez por importação: {contadas}")
+    else:
+        print(f"   ERRO - contadas={contadas}, relatório={relatorio['inserted']}/{relatorio['failed']}, "
+              f"_insert_batch={len(bissecao)} amostras")
+        ok = False
+    return ok
+
+
+def gerar_xlsx():
+    """Planilha com células numéricas em campos de texto e de valor"""
+    from openpyxl import Workbook
+    from datetime import date
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["obra_id", "descricao", "valor", "data_emissao", "numero_documento"])
+    sheet.append([OBRA_PROPRIA, "Areia", 350, date(2024, 3, 5), 4567])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
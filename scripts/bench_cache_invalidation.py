@@ -0,0 +1,105 @@
+"""
+Benchmark da invalidação de cache por usuário
+Compara o SCAN antigo (`*:{user_id}:*`) com as tag sets do CacheService
+conforme o número total de chaves no Redis cresce até 1M.
+
+ATENÇÃO: usa o banco 15 do Redis e apaga o conteúdo dele (FLUSHDB).
+Execute: python scripts/bench_cache_invalidation.py [redis_url]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import redis.asyncio as redis
+from app.cache_service import CacheService, CACHE_KEY_VERSION, OPERATION_TABLES
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+TOTAL_KEYS = [10_000, 100_000, 1_000_000]
+KEYS_PER_USER = 20
+ROUNDS = 5
+BATCH = 10_000
+
+
+async def scan_invalidation(r, user_id):
+    """Implementação antiga de invalidate_user_cache"""
+    keys = [key async for key in r.scan_iter(match=f"*:{user_id}:*", count=1000)]
+    if keys:
+        await r.delete(*keys)
+    return len(keys)
+
+
+async def populate(r, cache, start, stop):
+    """Cria chaves no mesmo formato (e com as mesmas tags) que CacheService.set"""
+    operations = list(OPERATION_TABLES)
+    for batch_start in range(start, stop, BATCH):
+        async with r.pipeline(transaction=False) as pipe:
+            for i in range(batch_start, min(batch_start + BATCH, stop)):
+                user_id = f"user-{i // KEYS_PER_USER}"
+                operation = operations[i % len(operations)]
+                key = f"{CACHE_KEY_VERSION}:{operation}:{user_id}:{i:032x}"
+                pipe.set(key, "[]", ex=3600)
+                pipe.sadd(cache._user_tag(user_id), key)
+                for table in OPERATION_TABLES[operation]:
+                    pipe.sadd(cache._table_tag(table, user_id), key)
+            await pipe.execute()
+
+
+async def refill_user(r, cache, user_index):
+    start = user_index * KEYS_PER_USER
+    await populate(r, cache, start, start + KEYS_PER_USER)
+
+
+async def measure(label, fn):
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    r = redis.from_url(REDIS_URL, decode_responses=True)
+    cache = CacheService(r)
+    await r.flushdb()
+
+    print("=" * 72)
+    print(f"{'chaves':>10} | {'SCAN (antigo)':>15} | {'tag por usuário':>16} | {'tag por tabela':>15}")
+    print("=" * 72)
+
+    populated = 0
+    try:
+        for total in TOTAL_KEYS:
+            await populate(r, cache, populated, total)
+            populated = total
+            target = 1  # user-1 sempre tem KEYS_PER_USER chaves
+
+            async def run_scan():
+                await scan_invalidation(r, f"user-{target}")
+                await refill_user(r, cache, target)
+
+            async def run_user_tag():
+                await cache.invalidate_user_cache(f"user-{target}")
+                await refill_user(r, cache, target)
+
+            async def run_table_tag():
+                await cache.invalidate_tables(f"user-{target}", ["obras"])
+                await refill_user(r, cache, target)
+
+            # O tempo de refill_user é igual nos três cenários
+            scan_ms = await measure("scan", run_scan)
+            user_ms = await measure("user", run_user_tag)
+            table_ms = await measure("table", run_table_tag)
+            print(f"{total:>10,} | {scan_ms:>13.2f}ms | {user_ms:>14.2f}ms | {table_ms:>13.2f}ms")
+    finally:
+        await r.flushdb()
+        await r.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+Benchmark dos serializadores de cache (app.serialization)
+Compara o caminho antigo - json.dumps no set, json.loads + validação do
+ChatResponse + jsonable_encoder + json.dumps para responder ao cliente -
+com orjson (JSON pronto repassado direto), msgpack e orjson + zstd, para
+entradas de 1KB a 5MB com linhas parecidas com as de obras.
+
+Execute: python scripts/bench_cache_serializer.py [repetições]
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.serialization import CacheSerializer, json_dumps, merge_json
+
+REPETICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+TAMANHOS = [("1KB", 1024), ("10KB", 10 * 1024), ("100KB", 100 * 1024),
+            ("1MB", 1024 * 1024), ("5MB", 5 * 1024 * 1024)]
+
+
+class ChatResponse(BaseModel):
+    """Mesmo formato do ChatResponse de app.main"""
+    response: str
+    operation_performed: Optional[str] = None
+    data: Optional[Any] = None
+    tokens_used: Optional[int] = None
+    model_used: Optional[str] = None
+
+
+def gerar_obra(i: int) -> dict:
+    return {
+        "id": f"0b7a{i:04d}-9c1e-4f2a-8d3b-5e6f7a8b9c0d",
+        "nome": f"Residencial Jardim São João - Bloco {i}",
+        "endereco": f"Rua das Acácias, {i}, São Paulo - SP",
+        "status": "em_andamento",
+        "orcamento_total": 1250000.5 + i,
+        "data_inicio": "2024-03-01",
+        "data_fim_prevista": "2025-08-30",
+        "created_at": "2024-02-15T10:32:11.123456+00:00"
+    }
+
+
+def gerar_entrada(tamanho: int) -> dict:
+    """Entrada de cache {"response", "data"} com obras até ~tamanho bytes"""
+    por_linha = len(json.dumps(gerar_obra(0))) + 2
+    items = [gerar_obra(i) for i in range(max(1, tamanho // por_linha))]
+    return {"response": "🏗️ **Obras encontradas:**", "data": {"items": items, "next_cursor": None}}
+
+
+def cronometrar(func, repeticoes: int) -> float:
+    """Tempo médio em ms"""
+    func()
+    started = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - started) * 1000 / repeticoes
+
+
+def caminho_antigo(entrada):
+    stored = json.dumps(entrada, default=str)
+
+    def set_():
+        json.dumps(entrada, default=str)
+
+    def get_():
+        value = json.loads(stored)
+        response = ChatResponse(**value, operation_performed="get_obras_todas")
+        JSONResponse(jsonable_encoder(response)).body
+
+    return set_, get_, stored.encode(), lambda: json.loads(stored)
+
+
+def caminho_novo(entrada, serializer: CacheSerializer):
+    stored = serializer.dumps(entrada, json_dumps(entrada))
+    campos = {"operation_performed": "get_obras_todas", "tokens_used": None, "model_used": None}
+
+    def set_():
+        serializer.dumps(entrada, json_dumps(entrada))
+
+    def get_():
+        merge_json(campos, serializer.to_json(stored))
+
+    return set_, get_, stored, lambda: json.loads(merge_json(campos, serializer.to_json(stored)))
+
+
+def main():
+    cenarios = [
+        ("json (antigo)", None),
+        ("orjson", CacheSerializer("orjson", compress_threshold=0)),
+        ("msgpack", CacheSerializer("msgpack", compress_threshold=0)),
+        ("orjson + zstd", CacheSerializer("orjson", compress_threshold=64 * 1024)),
+    ]
+
+    print("=" * 78)
+    print(f"  Serialização do cache - média de {REPETICOES} repetições")
+    print("=" * 78)
+    print(f"{'entrada':>7} | {'serializador':<14} | {'set (ms)':>9} | {'get->cliente (ms)':>17} | {'armazenado':>11}")
+
+    ok = True
+    for rotulo, tamanho in TAMANHOS:
+        entrada = gerar_entrada(tamanho)
+        repeticoes = REPETICOES if tamanho <= 100 * 1024 else max(3, REPETICOES // 4)
+        for nome, serializer in cenarios:
+            if serializer is None:
+                set_, get_, stored, roundtrip = caminho_antigo(entrada)
+            else:
+                set_, get_, stored, roundtrip = caminho_novo(entrada, serializer)
+            set_ms = cronometrar(set_, repeticoes)
+            get_ms = cronometrar(get_, repeticoes)
+            print(f"{rotulo:>7} | {nome:<14} | {set_ms:>9.3f} | {get_ms:>17.3f} | {len(stored):>10}B")
+
+            corpo = roundtrip()
+            if corpo.get("data") != entrada["data"] or corpo.get("response") != entrada["response"]:
+                print(f"   ERRO - {nome} não devolveu a mesma entrada ({rotulo})")
+                ok = False
+        print("-" * 78)
+
+    print()
+    print("[1] Ida e volta sem perda de dados...")
+    if ok:
+        print("   OK - todas as entradas chegaram iguais ao cliente")
+
+    print()
+    print("[2] Entradas que não são objeto JSON não são mescladas...")
+    try:
+        merge_json({"operation_performed": "get_all_obras"}, json_dumps([{"id": 1}]))
+        print("   ERRO - lista mesclada como objeto")
+        ok = False
+    except ValueError:
+        print("   OK - lista recusada com ValueError")
+    return ok
+
+
+if __name__ == "__main__":
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,37 @@
+"""
+Micro-benchmark do detector de intenções (OperationMapping)
+Compara a implementação original (re.search padrão a padrão) com o
+matcher compilado em passagem única.
+
+Execute: python scripts/bench_intent_matcher.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.chat_agent import OperationMapping
+from test_intent_matcher import legacy_detect_operation
+
+MENSAGENS = {
+    "acerto na 1ª operação": "Mostre minhas obras ativas, por favor",
+    "acerto na última operação": "Quero cadastrar um novo fornecedor de cimento",
+    "sem operação (vai para o LLM)": "Qual a previsão de chuva para a semana que vem na região da obra?",
+    "mensagem longa": "Bom dia! Preciso de um resumo geral " * 20 + "dos fornecedores",
+}
+
+REPETICOES = 20_000
+
+
+if __name__ == "__main__":
+    print("=" * 78)
+    print(f"{'cenário':<32} | {'original':>12} | {'compilado':>12} | {'ganho':>8}")
+    print("=" * 78)
+
+    for nome, mensagem in MENSAGENS.items():
+        original = timeit.timeit(lambda: legacy_detect_operation(mensagem), number=REPETICOES)
+        compilado = timeit.timeit(lambda: OperationMapping.detect_operation(mensagem), number=REPETICOES)
+        print(f"{nome:<32} | {original / REPETICOES * 1e6:>10.2f}µs | "
+              f"{compilado / REPETICOES * 1e6:>10.2f}µs | {original / compilado:>7.1f}x")
@@ -0,0 +1,227 @@
+"""
+Benchmark do pipeline de logs (app.monitoring)
+Simula requisições concorrentes de chat com os logs de uma resposta do
+cache (2 INFO + 3 DEBUG do CacheService) e mede quanto tempo cada
+requisição passa logando:
+  - configuração antiga: sinks síncronos do loguru, f-strings em todo DEBUG
+  - configuração nova: BatchedSink + amostragem dos DEBUG frequentes
+com disco normal e com disco lento. Também confere o descarte sob pressão
+(fila cheia), a saída JSON (inclusive o aviso de descarte) e o fim do
+sink com mensagens chegando depois de stop().
+
+Execute: python scripts/bench_logging.py [requisições] [concorrência]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from loguru import logger
+from app.monitoring import (
+    BatchedSink, DailyLogFile, FILE_FORMAT, STDOUT_FORMAT, LOG_DEBUG_SAMPLE_RATE, log_sampled
+)
+
+REQUISICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+CONCORRENCIA = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+DISCO_LENTO_MS = 2.0
+
+
+def descartar(text):
+    pass
+
+
+def disco_lento(destino):
+    """Cada escrita no arquivo custa DISCO_LENTO_MS (fsync, disco de rede...)"""
+    def escrever(text):
+        time.sleep(DISCO_LENTO_MS / 1000)
+        destino(text)
+    return escrever
+
+
+def logs_antigos(user_id, key, ttl):
+    logger.info(f"Processing message for user {user_id}: listar obras ativas...")
+    logger.debug(f"Cache MISS for key: {key}")
+    logger.debug(f"Cache SET for key: {key}, TTL: {ttl}, 2048 bytes")
+    logger.debug(f"Cache HIT for key: {key}")
+    logger.info(f"Returning cached result for get_obras_ativas")
+
+
+def logs_novos(user_id, key, ttl):
+    logger.info("Processing message for user {}: {}...", user_id, "listar obras ativas")
+    if log_sampled():
+        logger.debug("Cache MISS for key: {}", key)
+    if log_sampled():
+        logger.debug("Cache SET for key: {}, TTL: {}, {} bytes", key, ttl, 2048)
+    if log_sampled():
+        logger.debug("Cache HIT for key: {}", key)
+    logger.info("Returning cached result for {}", "get_obras_ativas")
+
+
+async def carga(logar) -> list:
+    """Latência (µs) gasta logando em cada requisição"""
+    latencias = []
+    fila = asyncio.Queue()
+    for i in range(REQUISICOES):
+        fila.put_nowait(i)
+
+    async def trabalhador():
+        while not fila.empty():
+            i = fila.get_nowait()
+            started = time.perf_counter()
+            logar(f"user-{i % 100}", f"cache:get_obras_ativas:user-{i % 100}:abc123", "0:05:00")
+            latencias.append((time.perf_counter() - started) * 1_000_000)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(trabalhador() for _ in range(CONCORRENCIA)))
+    return latencias
+
+
+def configurar_antigo(diretorio, lento):
+    logger.remove()
+    logger.add(descartar, format=STDOUT_FORMAT, level="INFO")
+    if lento:
+        arquivo = DailyLogFile(diretorio)
+        logger.add(disco_lento(arquivo), format=FILE_FORMAT, level="DEBUG")
+    else:
+        logger.add(os.path.join(diretorio, "app_{time:YYYY-MM-DD}.log"), rotation="00:00",
+                   retention="30 days", format=FILE_FORMAT, level="DEBUG")
+    return []
+
+
+def configurar_novo(diretorio, lento):
+    logger.remove()
+    arquivo = DailyLogFile(diretorio)
+    sinks = [BatchedSink(descartar, "stdout"),
+             BatchedSink(disco_lento(arquivo) if lento else arquivo, "file")]
+    logger.add(sinks[0], format=STDOUT_FORMAT, level="INFO")
+    logger.add(sinks[1], format=FILE_FORMAT, level="DEBUG")
+    return sinks
+
+
+async def main() -> bool:
+    ok = True
+    print("=" * 82)
+    print(f"  {REQUISICOES} requisições, {CONCORRENCIA} concorrentes, "
+          f"amostragem DEBUG {LOG_DEBUG_SAMPLE_RATE:.0%}, disco lento = {DISCO_LENTO_MS}ms por escrita")
+    print("=" * 82)
+    print(f"{'cenário':<28} | {'média (µs)':>10} | {'p50 (µs)':>9} | {'p99 (µs)':>9} | {'máx (µs)':>9} | {'descartadas':>11}")
+
+    resultados = {}
+    cenarios = [("antigo", configurar_antigo, logs_antigos, False),
+                ("antigo, disco lento", configurar_antigo, logs_antigos, True),
+                ("novo", configurar_novo, logs_novos, False),
+                ("novo, disco lento", configurar_novo, logs_novos, True)]
+    for nome, configurar, logar, lento in cenarios:
+        with tempfile.TemporaryDirectory() as diretorio:
+            sinks = configurar(diretorio, lento)
+            latencias = sorted(await carga(logar))
+            logger.remove()  # esvazia as filas dos BatchedSink
+            descartadas = sum(sink.dropped for sink in sinks)
+        p99 = latencias[int(len(latencias) * 0.99)]
+        resultados[nome] = (statistics.mean(latencias), p99)
+        print(f"{nome:<28} | {statistics.mean(latencias):>10.1f} | {statistics.median(latencias):>9.1f} | "
+              f"{p99:>9.1f} | {latencias[-1]:>9.1f} | {descartadas:>11}")
+
+    print("\n[1] Overhead por requisição menor que o da configuração antiga...")
+    if resultados["novo"][0] < resultados["antigo"][0]:
+        print(f"   OK - {resultados['antigo'][0]:.1f}µs -> {resultados['novo'][0]:.1f}µs")
+    else:
+        print(f"   ERRO - {resultados['antigo'][0]:.1f}µs -> {resultados['novo'][0]:.1f}µs")
+        ok = False
+
+    print("\n[2] Disco lento não chega na latência da requisição...")
+    if resultados["novo, disco lento"][1] < DISCO_LENTO_MS * 1000 / 4:
+        print(f"   OK - p99 {resultados['novo, disco lento'][1]:.1f}µs com disco lento "
+              f"(antigo: {resultados['antigo, disco lento'][1]:.1f}µs)")
+    else:
+        print(f"   ERRO - p99 {resultados['novo, disco lento'][1]:.1f}µs com disco lento")
+        ok = False
+
+    print("\n[3] Fila cheia descarta sem bloquear e avisa no próximo lote...")
+    linhas = []
+    bloqueado = BatchedSink(lambda text: (time.sleep(0.05), linhas.append(text)), "teste", max_queue=100)
+    logger.remove()
+    logger.add(bloqueado, format="{message}", level="INFO")
+    started = time.perf_counter()
+    for i in range(5000):
+        logger.info("mensagem {}", i)
+    duracao_ms = (time.perf_counter() - started) * 1000
+    logger.remove()
+    if bloqueado.dropped > 0 and duracao_ms < 500 and "log messages dropped" in "".join(linhas):
+        print(f"   OK - {bloqueado.dropped} descartadas, 5000 chamadas em {duracao_ms:.0f}ms")
+    else:
+        print(f"   ERRO - descartadas={bloqueado.dropped}, {duracao_ms:.0f}ms")
+        ok = False
+
+    print("\n[4] LOG_FORMAT=json gera um objeto por linha...")
+    linhas = []
+    sink = BatchedSink(linhas.append, "json")
+    logger.add(sink, level="INFO", serialize=True)
+    logger.info("Processing message for user {}: {}...", "user-1", "listar obras")
+    logger.remove()
+    registros = [json.loads(linha) for linha in "".join(linhas).splitlines()]
+    if registros and registros[0]["record"]["message"] == "Processing message for user user-1: listar obras...":
+        print(f"   OK - campos: {', '.join(sorted(registros[0]['record']))[:70]}...")
+    else:
+        print("   ERRO - saída JSON inesperada")
+        ok = False
+
+    print("\n[5] Aviso de descarte também em JSON...")
+    linhas = []
+    bloqueado = BatchedSink(lambda text: (time.sleep(0.05), linhas.append(text)), "teste-json",
+                            max_queue=100, json_logs=True)
+    logger.add(bloqueado, format="{message}", level="INFO", serialize=True)
+    for i in range(5000):
+        logger.info("mensagem {}", i)
+    logger.remove()
+    try:
+        registros = [json.loads(linha) for linha in "".join(linhas).splitlines()]
+        avisos = [r for r in registros if "log messages dropped" in r["record"]["message"]]
+    except (ValueError, KeyError) as e:
+        registros, avisos = [], []
+        print(f"   ERRO - linha que não é JSON do loguru: {e}")
+    if avisos and avisos[0]["record"]["level"]["name"] == "WARNING":
+        print(f"   OK - {len(registros)} linhas JSON, {avisos[0]['record']['extra']['dropped']} descartadas no 1º aviso")
+    else:
+        print("   ERRO - aviso de descarte ausente ou fora do formato JSON")
+        ok = False
+
+    print("\n[6] Mensagens escritas depois de stop() não derrubam o sink...")
+    linhas = []
+    escrevendo = threading.Event()
+    liberar = threading.Event()
+
+    def escrever(text):
+        escrevendo.set()
+        liberar.wait()
+        linhas.append(text)
+
+    sink = BatchedSink(escrever, "teste-stop")
+    sink.write("antes\n")
+    escrevendo.wait()
+    # Sentinela no meio do lote: outra thread logou depois de stop()
+    sink.write("durante\n")
+    sink.queue.put(sink._STOP)
+    sink.write("depois\n")
+    sink._stopping.set()
+    liberar.set()
+    sink._thread.join(timeout=2)
+    if not sink._thread.is_alive() and "".join(linhas) == "antes\ndurante\ndepois\n":
+        print("   OK - 3 mensagens escritas e a thread terminou")
+    else:
+        print(f"   ERRO - thread viva={sink._thread.is_alive()}, escrito={''.join(linhas)!r}")
+        ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
@@ -0,0 +1,185 @@
+"""
+Benchmark da instrumentação Prometheus (app.monitoring)
+Mede o custo por requisição do PrometheusMiddleware e dos decorators
+(track_db_operation / track_cache / track_llm) contra as mesmas chamadas
+sem instrumentação, confere os labels de baixa cardinalidade no /metrics
+e a agregação entre processos no modo multiprocess.
+
+Execute: python scripts/bench_metrics_overhead.py [requisições]
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx
+from fastapi import FastAPI
+from app.monitoring import (
+    PrometheusMiddleware, generate_metrics, track_cache, track_db_operation
+)
+
+REQUISICOES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+LIMITE_US = 50
+
+
+async def endpoint_falso():
+    pass
+
+
+async def app_falso(scope, receive, send):
+    """App ASGI mínimo: marca o endpoint como o roteador faria e responde 200"""
+    scope["endpoint"] = endpoint_falso
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def cronometrar(chamada, n: int) -> float:
+    """Tempo médio em µs"""
+    for _ in range(1000):
+        await chamada()
+    started = time.perf_counter()
+    for _ in range(n):
+        await chamada()
+    return (time.perf_counter() - started) * 1_000_000 / n
+
+
+async def overhead_middleware() -> float:
+    instrumentado = PrometheusMiddleware(app_falso)
+
+    def scope():
+        return {"type": "http", "method": "GET", "path": "/api/obras/123", "headers": []}
+
+    puro = await cronometrar(lambda: app_falso(scope(), receive, send), REQUISICOES)
+    medido = await cronometrar(lambda: instrumentado(scope(), receive, send), REQUISICOES)
+    return medido - puro
+
+
+async def overhead_decorators() -> float:
+    class Falso:
+        async def consulta(self, user_id):
+            return []
+
+        @track_db_operation("obras")
+        async def consulta_medida(self, user_id):
+            return []
+
+        async def get_raw(self, key):
+            return None
+
+        @track_cache("get")
+        async def get_raw_medido(self, key):
+            return None
+
+    falso = Falso()
+    puro = await cronometrar(lambda: falso.consulta("u1"), REQUISICOES)
+    medido = await cronometrar(lambda: falso.consulta_medida("u1"), REQUISICOES)
+    puro_cache = await cronometrar(lambda: falso.get_raw("k"), REQUISICOES)
+    medido_cache = await cronometrar(lambda: falso.get_raw_medido("k"), REQUISICOES)
+    return max(medido - puro, medido_cache - puro_cache)
+
+
+async def labels_no_metrics() -> str:
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/api/obras/{obra_id}")
+    async def obra(obra_id: str):
+        return {"id": obra_id}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://teste") as client:
+        for obra_id in ("a1", "b2", "c3"):
+            await client.get(f"/api/obras/{obra_id}")
+        await client.get("/nao/existe/123")
+        await client.request("FOO", "/api/obras/a1")
+    return generate_metrics().decode()
+
+
+TRABALHADOR = """
+import sys
+sys.path.insert(0, {backend!r})
+from app.monitoring import request_count
+request_count.labels(method="GET", endpoint="/api/obras", status="200").inc({n})
+"""
+
+AGREGADOR = """
+import sys
+sys.path.insert(0, {backend!r})
+from app.monitoring import generate_metrics
+print(generate_metrics().decode())
+"""
+
+
+def multiprocess(backend: str) -> str:
+    with tempfile.TemporaryDirectory() as diretorio:
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": diretorio}
+        for n in (3, 4):
+            subprocess.run([sys.executable, "-c", TRABALHADOR.format(backend=backend, n=n)],
+                           env=env, check=True, capture_output=True, cwd=diretorio)
+        saida = subprocess.run([sys.executable, "-c", AGREGADOR.format(backend=backend)],
+                               env=env, check=True, capture_output=True, text=True, cwd=diretorio)
+        return saida.stdout
+
+
+async def main() -> bool:
+    ok = True
+    print("=" * 60)
+    print(f"  Overhead da instrumentação - {REQUISICOES} chamadas")
+    print("=" * 60)
+
+    print("\n[1] PrometheusMiddleware por requisição...")
+    custo = await overhead_middleware()
+    if custo < LIMITE_US:
+        print(f"   OK - +{custo:.2f}µs por requisição (limite {LIMITE_US}µs)")
+    else:
+        print(f"   ERRO - +{custo:.2f}µs por requisição (limite {LIMITE_US}µs)")
+        ok = False
+
+    print("\n[2] Decorators de banco/cache por chamada...")
+    custo = await overhead_decorators()
+    if custo < LIMITE_US:
+        print(f"   OK - +{custo:.2f}µs por chamada (limite {LIMITE_US}µs)")
+    else:
+        print(f"   ERRO - +{custo:.2f}µs por chamada (limite {LIMITE_US}µs)")
+        ok = False
+
+    print("\n[3] Labels de baixa cardinalidade no /metrics...")
+    saida = await labels_no_metrics()
+    esperado = 'api_requests_total{endpoint="/api/obras/{obra_id}",method="GET",status="200"} 3.0'
+    if esperado in saida and 'endpoint="unmatched"' in saida and 'method="OTHER"' in saida \
+            and "a1" not in saida and "/nao/existe" not in saida:
+        print("   OK - rota agrupada pelo template, sem ids nem caminhos desconhecidos")
+    else:
+        print("   ERRO - labels inesperados:")
+        print("\n".join(linha for linha in saida.splitlines() if linha.startswith("api_requests_total")))
+        ok = False
+
+    print("\n[4] Modo multiprocess (PROMETHEUS_MULTIPROC_DIR)...")
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+    saida = multiprocess(backend)
+    esperado = 'api_requests_total{endpoint="/api/obras",method="GET",status="200"} 7.0'
+    if esperado in saida:
+        print("   OK - contadores de 2 processos somados (3 + 4 = 7)")
+    else:
+        print("   ERRO - agregação entre processos falhou")
+        ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
@@ -0,0 +1,155 @@
+"""
+Benchmark de perguntas compostas (ChatAgent._run_operations)
+Confere a detecção de várias operações na mesma mensagem e compara o
+tempo de resposta executando as operações em sequência e em paralelo,
+com o limite de concorrência por usuário e o cache separado de cada
+operação.
+
+O banco é simulado (cada consulta leva LATENCIA_MS); o cache usa o banco
+15 do Redis.
+Execute: python scripts/bench_multi_operation.py [redis_url]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import redis.asyncio as redis
+from app import chat_agent
+from app.cache_service import CacheService
+from app.chat_agent import ChatAgent, OperationMapping
+from app.llm_integration import UserLLMConfig
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+LATENCIA_MS = 50
+LIMITE = 2
+
+DETECCAO = [
+    ("obras ativas", ["get_obras_ativas"]),
+    ("obras ativas e fornecedores", ["get_obras_ativas", "get_fornecedores"]),
+    ("quais fornecedores e custos da obra?", ["get_fornecedores", "get_custos_obra"]),
+    ("todas as obras ativas", ["get_obras_ativas"]),
+    ("listar fornecedores", ["get_fornecedores"]),
+    ("obras concluídas, obras em andamento e fornecedores",
+     ["get_obras_finalizadas", "get_obras_ativas", "get_fornecedores"]),
+    ("qual o clima hoje?", []),
+]
+COMPOSTA = "obras ativas, fornecedores e custos da obra"
+
+
+class BancoSimulado:
+    """Consultas com latência fixa, contando quantas rodam ao mesmo tempo"""
+
+    def __init__(self):
+        self.chamadas = 0
+        self.em_andamento = defaultdict(int)
+        self.maximo = defaultdict(int)
+
+    async def _consulta(self, user_id, resultado):
+        self.chamadas += 1
+        self.em_andamento[user_id] += 1
+        self.maximo[user_id] = max(self.maximo[user_id], self.em_andamento[user_id])
+        try:
+            await asyncio.sleep(LATENCIA_MS / 1000)
+            return resultado
+        finally:
+            self.em_andamento[user_id] -= 1
+
+    async def get_obras_by_status(self, user_id, status, cursor=None):
+        return await self._consulta(user_id, {"items": [{"nome": "Obra A", "status": status}], "next_cursor": None})
+
+    async def get_all_obras(self, user_id, cursor=None):
+        return await self._consulta(user_id, {"items": [{"nome": "Obra A", "status": "Em andamento"}],
+                                              "next_cursor": None})
+
+    async def get_custos_obras(self, user_id):
+        return await self._consulta(user_id, [{"nome": "Obra A", "gasto_total": 1500.0}])
+
+    async def get_fornecedores(self, user_id, cursor=None):
+        return await self._consulta(user_id, {"items": [{"nome": "Cimento SA"}], "next_cursor": None})
+
+
+async def main(client) -> bool:
+    ok = True
+    banco = BancoSimulado()
+    cache = CacheService(client)
+    agente = ChatAgent(banco, cache, UserLLMConfig(openrouter_api_key="sk-teste"))
+    usuarios = ["bench-seq", "bench-par", "bench-a", "bench-b"]
+
+    print("[1] Detecção de todas as operações da mensagem...")
+    erros = [(mensagem, OperationMapping.detect_operations(mensagem), esperado)
+             for mensagem, esperado in DETECCAO
+             if OperationMapping.detect_operations(mensagem) != esperado]
+    if not erros:
+        print(f"   OK - {len(DETECCAO)} mensagens, compostas e simples")
+    else:
+        for mensagem, obtido, esperado in erros:
+            print(f"   ERRO - {mensagem!r}: {obtido} (esperado {esperado})")
+        ok = False
+
+    print(f"\n[2] '{COMPOSTA}' com {LATENCIA_MS}ms por consulta...")
+    operacoes = OperationMapping.detect_operations(COMPOSTA)
+    started = time.perf_counter()
+    for operacao in operacoes:
+        await agente._run_operation("bench-seq", operacao, COMPOSTA)
+    sequencial_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    resposta = await agente.process_message("bench-par", COMPOSTA)
+    paralelo_ms = (time.perf_counter() - started) * 1000
+    if resposta.get("operations_performed") == operacoes and set(resposta["data"]) == set(operacoes) \
+            and paralelo_ms < sequencial_ms / 2:
+        print(f"   OK - {len(operacoes)} operações: sequencial {sequencial_ms:.0f}ms, "
+              f"paralelo {paralelo_ms:.0f}ms (limite {chat_agent.CHAT_USER_CONCURRENCY} por usuário)")
+    else:
+        print(f"   ERRO - sequencial {sequencial_ms:.0f}ms, paralelo {paralelo_ms:.0f}ms, resposta={resposta}")
+        ok = False
+
+    print("\n[3] Cada operação fica no cache como se fosse perguntada sozinha...")
+    chamadas = banco.chamadas
+    sozinha = await agente.process_message("bench-par", "fornecedores")
+    repetida = await agente.process_message("bench-par", COMPOSTA)
+    if sozinha["from_cache"] and repetida["from_cache"] and banco.chamadas == chamadas \
+            and repetida["response"] == resposta["response"]:
+        print("   OK - 'fornecedores' e a pergunta composta respondidas do cache, sem consultas")
+    else:
+        print(f"   ERRO - {banco.chamadas - chamadas} consultas a mais")
+        ok = False
+
+    print(f"\n[4] Limite de {LIMITE} por usuário vale entre requisições simultâneas...")
+    chat_agent.CHAT_USER_CONCURRENCY = LIMITE
+    banco.maximo.clear()
+    started = time.perf_counter()
+    await asyncio.gather(
+        agente.process_message("bench-a", "obras ativas e fornecedores"),
+        agente.process_message("bench-a", "obras concluídas e custos da obra"),
+        agente.process_message("bench-b", "obras ativas, fornecedores e custos da obra"),
+    )
+    duracao_ms = (time.perf_counter() - started) * 1000
+    if banco.maximo["bench-a"] == LIMITE and banco.maximo["bench-b"] == LIMITE:
+        print(f"   OK - no máximo {LIMITE} consultas por usuário ao mesmo tempo, "
+              f"3 requisições em {duracao_ms:.0f}ms")
+    else:
+        print(f"   ERRO - máximo simultâneo {dict(banco.maximo)}")
+        ok = False
+
+    print("\n[5] Pergunta simples mantém o formato de sempre...")
+    simples = await agente.process_message("bench-b", "obras concluídas")
+    if simples["operation_performed"] == "get_obras_finalizadas" and "operations_performed" not in simples \
+            and simples["data"]["items"]:
+        print("   OK - operation_performed e data da página, como antes")
+    else:
+        print(f"   ERRO - resposta={simples}")
+        ok = False
+
+    for usuario in usuarios:
+        await cache.invalidate_user_cache(usuario)
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main(redis.from_url(REDIS_URL))):
+        sys.exit(1)
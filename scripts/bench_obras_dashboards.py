@@ -0,0 +1,147 @@
+"""
+Benchmark dos dashboards em lote (SecureDatabaseOperations.get_obras_dashboards)
+Compara uma chamada de get_obra_dashboard por obra, em sequência, com uma
+única chamada de get_obras_dashboards para todas, e confere o cache por
+obra: acertos parciais só buscam as obras que faltam e escritas invalidam
+os dashboards.
+
+O PostgREST é simulado (cada chamada leva LATENCIA_MS); o cache usa o
+banco 15 do Redis.
+Execute: python scripts/bench_obras_dashboards.py [redis_url]
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import redis.asyncio as redis
+from app.cache_service import CacheService
+from app.secure_operations import SecureDatabaseOperations, SecureOperationError
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+LATENCIA_MS = 20
+OBRAS = 40
+USUARIO = "bench-dashboards"
+
+
+def dashboard(obra_id):
+    return {
+        "info_basica": {"nome": f"Obra {obra_id[:8]}", "cliente": "Cliente", "status": "Em andamento",
+                        "progresso": 0, "dias_restantes": 90},
+        "financeiro": {"orcamento_total": 100000, "gasto_total": 25000, "saldo": 75000,
+                       "lancamentos_pendentes": 3, "pagamentos_vencidos": 1},
+        "alertas": None
+    }
+
+
+class RpcSimulada:
+    def __init__(self, cliente, nome, params):
+        self.cliente = cliente
+        self.nome = nome
+        self.params = params
+
+    def execute(self):
+        self.cliente.chamadas.append((self.nome, self.params))
+        time.sleep(LATENCIA_MS / 1000)
+        if self.nome == "get_obra_dashboard":
+            dados = dashboard(self.params["p_obra_id"])
+        else:
+            dados = {obra_id: dashboard(obra_id) for obra_id in self.params["p_obra_ids"]
+                     if obra_id in self.cliente.obras}
+        return type("Resposta", (), {"data": dados})()
+
+
+class SupabaseSimulado:
+    """Só .rpc(); get_obras_dashboards ignora obras que não são do usuário"""
+
+    def __init__(self, obras):
+        self.obras = set(obras)
+        self.chamadas = []
+
+    def rpc(self, nome, params):
+        return RpcSimulada(self, nome, params)
+
+
+async def main(client) -> bool:
+    ok = True
+    obras = [str(uuid.uuid4()) for _ in range(OBRAS + 5)]
+    supabase = SupabaseSimulado(obras)
+    cache = CacheService(client)
+    db_ops = SecureDatabaseOperations(supabase, cache=cache)
+    await cache.invalidate_user_cache(USUARIO)
+
+    print(f"[1] {OBRAS} dashboards com {LATENCIA_MS}ms por chamada...")
+    started = time.perf_counter()
+    for obra_id in obras[:OBRAS]:
+        await db_ops._execute(supabase.rpc("get_obra_dashboard", {"p_obra_id": obra_id, "p_user_id": USUARIO}))
+    uma_por_obra_ms = (time.perf_counter() - started) * 1000
+    supabase.chamadas.clear()
+    started = time.perf_counter()
+    resultado = await db_ops.get_obras_dashboards(USUARIO, obras[:OBRAS])
+    lote_ms = (time.perf_counter() - started) * 1000
+    if list(resultado) == obras[:OBRAS] and len(supabase.chamadas) == 1:
+        print(f"   OK - uma chamada por obra {uma_por_obra_ms:.0f}ms ({OBRAS} chamadas), "
+              f"em lote {lote_ms:.0f}ms (1 chamada)")
+    else:
+        print(f"   ERRO - {len(supabase.chamadas)} chamadas, {len(resultado)} dashboards")
+        ok = False
+
+    print("\n[2] Repetição sai inteira do cache...")
+    supabase.chamadas.clear()
+    started = time.perf_counter()
+    repetido = await db_ops.get_obras_dashboards(USUARIO, obras[:OBRAS])
+    cache_ms = (time.perf_counter() - started) * 1000
+    if repetido == resultado and not supabase.chamadas:
+        print(f"   OK - {OBRAS} dashboards em {cache_ms:.1f}ms, nenhuma chamada")
+    else:
+        print(f"   ERRO - {len(supabase.chamadas)} chamadas")
+        ok = False
+
+    print("\n[3] Acerto parcial busca só as obras que faltam...")
+    supabase.chamadas.clear()
+    pedido = obras[OBRAS - 10:]
+    parcial = await db_ops.get_obras_dashboards(USUARIO, pedido)
+    buscadas = supabase.chamadas[0][1]["p_obra_ids"] if supabase.chamadas else []
+    if len(supabase.chamadas) == 1 and buscadas == obras[OBRAS:] and list(parcial) == pedido:
+        print(f"   OK - {len(pedido)} pedidas, {len(buscadas)} buscadas, ordem do pedido mantida")
+    else:
+        print(f"   ERRO - chamadas={supabase.chamadas}")
+        ok = False
+
+    print("\n[4] Escrita em lançamentos invalida os dashboards...")
+    await cache.invalidate_tables(USUARIO, ["lancamentos_financeiros"])
+    supabase.chamadas.clear()
+    await db_ops.get_obras_dashboards(USUARIO, obras[:5])
+    if len(supabase.chamadas) == 1 and len(supabase.chamadas[0][1]["p_obra_ids"]) == 5:
+        print("   OK - 5 obras buscadas de novo em uma chamada")
+    else:
+        print(f"   ERRO - chamadas={supabase.chamadas}")
+        ok = False
+
+    print("\n[5] Obras de outros usuários e ids inválidos...")
+    alheia = str(uuid.uuid4())
+    supabase.chamadas.clear()
+    resultado = await db_ops.get_obras_dashboards(USUARIO, [obras[0], alheia, obras[0]])
+    try:
+        await db_ops.get_obras_dashboards(USUARIO, ["1; drop table obras"])
+        invalido = False
+    except SecureOperationError:
+        invalido = True
+    if list(resultado) == [obras[0]] and supabase.chamadas[0][1]["p_obra_ids"] == [alheia] and invalido:
+        print("   OK - obra alheia fica de fora, repetidas uma vez só, id inválido recusado")
+    else:
+        print(f"   ERRO - resultado={list(resultado)}, chamadas={supabase.chamadas}, recusado={invalido}")
+        ok = False
+
+    await cache.invalidate_user_cache(USUARIO)
+    db_ops.close()
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main(redis.from_url(REDIS_URL))):
+        sys.exit(1)
@@ -0,0 +1,158 @@
+"""
+Teste de carga do RateLimitMiddleware (security/advanced_auth.py)
+Mede o custo por requisição do limite de requisições + checagem de
+sessão (um script Lua, uma ida ao Redis) em uma app FastAPI local e
+confere o comportamento dos limites sob concorrência.
+
+ATENÇÃO: usa o banco 15 do Redis e apaga o conteúdo dele (FLUSHDB).
+Execute: python scripts/bench_rate_limiter.py [redis_url]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import httpx
+import redis.asyncio as redis
+from fastapi import FastAPI, HTTPException
+from jose import jwt
+
+from app.security.advanced_auth import SecureAuthSystem, RateLimitMiddleware
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+JWT_SECRET = "segredo-de-teste-do-benchmark"
+USUARIOS = 50
+REQUISICOES = 4_000
+CONCORRENCIA = 100
+
+
+def criar_app(auth_system=None):
+    app = FastAPI()
+    if auth_system:
+        app.add_middleware(RateLimitMiddleware, auth_system=auth_system)
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def abrir_sessao(auth_system, user_id):
+    """Mesmo fluxo de create_session, sem a validação no Supabase"""
+    session_id = os.urandom(8).hex()
+    await auth_system._run_admit(user_id, session_id, mode="create")
+    now = datetime.utcnow()
+    return jwt.encode({
+        "sub": user_id, "sid": session_id, "iat": now, "type": "session",
+        "exp": now + timedelta(seconds=auth_system.SESSION_DURATION)
+    }, JWT_SECRET, algorithm="HS256"), session_id
+
+
+async def disparar(app, tokens, total, concorrencia):
+    transport = httpx.ASGITransport(app=app)
+    tempos, status = [], []
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def requisicao(i):
+            async with semaforo:
+                started = time.perf_counter()
+                response = await client.get(
+                    "/api/ping", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                )
+                tempos.append((time.perf_counter() - started) * 1000)
+                status.append(response.status_code)
+                return response
+
+        respostas = await asyncio.gather(*(requisicao(i) for i in range(total)))
+    return tempos, status, respostas
+
+
+async def carga(r):
+    auth_system = SecureAuthSystem("http://localhost", "a.b.c", JWT_SECRET, r)
+    auth_system.RATE_LIMIT_REQUESTS = 10 ** 9  # só medir o custo
+    tokens = [(await abrir_sessao(auth_system, f"user-{i}"))[0] for i in range(USUARIOS)]
+
+    print(f"[1] Custo por requisição ({REQUISICOES} requisições, {CONCORRENCIA} simultâneas)")
+    print(f"{'app':<28} | {'p50':>9} | {'p95':>9} | {'req/s':>8}")
+    resultados = {}
+    for nome, app in [("sem middleware", criar_app()),
+                      ("com RateLimitMiddleware", criar_app(auth_system))]:
+        started = time.perf_counter()
+        tempos, status, _ = await disparar(app, tokens, REQUISICOES, CONCORRENCIA)
+        duracao = time.perf_counter() - started
+        quantis = statistics.quantiles(tempos, n=100)
+        resultados[nome] = quantis[49]
+        print(f"{nome:<28} | {quantis[49]:>7.2f}ms | {quantis[94]:>7.2f}ms | {REQUISICOES / duracao:>8.0f}")
+        assert set(status) == {200}, status
+
+    # Custo isolado do script Lua, sem HTTP
+    rodadas = 1_000
+    started = time.perf_counter()
+    for _ in range(rodadas):
+        await auth_system.validate_request(tokens[0])
+    print(f"validate_request isolado: {(time.perf_counter() - started) / rodadas * 1000:.3f}ms\n")
+
+
+async def verificacoes(r):
+    ok = True
+    auth_system = SecureAuthSystem("http://localhost", "a.b.c", JWT_SECRET, r)
+    app = criar_app(auth_system)
+
+    print("[2] Limite atômico sob concorrência (150 requisições simultâneas, limite 100)...")
+    token, session_id = await abrir_sessao(auth_system, "user-limite")  # conta como 1 requisição
+    _, status, respostas = await disparar(app, [token], 150, 150)
+    bloqueadas = [resposta for resposta in respostas if resposta.status_code == 429]
+    if status.count(200) == 99 and len(bloqueadas) == 51 and bloqueadas[0].headers.get("retry-after"):
+        print(f"   OK - 99 liberadas + abertura da sessão, 51 com 429 "
+              f"(Retry-After: {bloqueadas[0].headers['retry-after']}s)\n")
+    else:
+        print(f"   ERRO - {status.count(200)} liberadas, {status.count(429)} bloqueadas\n")
+        ok = False
+
+    print("[3] Limite de sessões ativas...")
+    for _ in range(auth_system.MAX_SESSIONS_PER_USER):
+        await abrir_sessao(auth_system, "user-sessoes")
+    try:
+        await abrir_sessao(auth_system, "user-sessoes")
+        print("   ERRO - sessão além do limite foi criada\n")
+        ok = False
+    except HTTPException as e:
+        print(f"   OK - {e.status_code} {e.detail}\n")
+
+    print("[4] Sessão encerrada é recusada pelo middleware...")
+    token, session_id = await abrir_sessao(auth_system, "user-logout")
+    await auth_system.revoke_session("user-logout", session_id)
+    _, status, _ = await disparar(app, [token], 1, 1)
+    if status == [401]:
+        print("   OK - 401 após logout\n")
+    else:
+        print(f"   ERRO - status {status}\n")
+        ok = False
+    return ok
+
+
+async def main(r):
+    await r.flushdb()
+    try:
+        await carga(r)
+        await r.flushdb()
+        return await verificacoes(r)
+    finally:
+        await r.flushdb()
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("   TESTE DE CARGA DO RATE LIMIT")
+    print("=" * 70)
+    print()
+
+    if not asyncio.run(main(redis.from_url(REDIS_URL, decode_responses=True))):
+        sys.exit(1)
@@ -0,0 +1,105 @@
+"""
+Benchmark da camada de dados do SecureDatabaseOperations
+Sobe um servidor PostgREST falso local (com latência artificial) e compara
+a execução bloqueante no event loop com o offload para o pool de threads.
+
+Execute: python scripts/bench_secure_operations.py [concorrencia] [latencia_ms]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from supabase import create_client
+from app.secure_operations import SecureDatabaseOperations
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LATENCY_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+
+class StubPostgrestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubPostgrestHandler(BaseHTTPRequestHandler):
+    """Responde qualquer GET com uma lista fixa de obras após LATENCY_MS"""
+
+    payload = json.dumps([
+        {"id": str(i), "nome": f"Obra {i}", "status": "Em andamento"}
+        for i in range(10)
+    ]).encode()
+
+    def do_GET(self):
+        time.sleep(LATENCY_MS / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class BlockingDatabaseOperations(SecureDatabaseOperations):
+    """Comportamento antigo: .execute() síncrono dentro do event loop"""
+
+    async def _execute(self, query):
+        return query.execute()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(name, db_ops):
+    async def one_request(i, arrival):
+        # Latência medida a partir da chegada da requisição, incluindo o
+        # tempo em que ela ficou esperando o event loop ser liberado
+        await db_ops.get_obras_by_status(f"user-{i % 10}", "Em andamento")
+        return (time.perf_counter() - arrival) * 1000
+
+    # Aquecimento (conexões do pool HTTP)
+    warmup = time.perf_counter()
+    await asyncio.gather(*(one_request(i, warmup) for i in range(10)))
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one_request(i, started) for i in range(CONCURRENCY)))
+    wall = (time.perf_counter() - started) * 1000
+
+    print(f"{name:<28} p50={percentile(latencies, 50):8.1f}ms  "
+          f"p99={percentile(latencies, 99):8.1f}ms  "
+          f"média={statistics.mean(latencies):8.1f}ms  total={wall:8.1f}ms")
+
+
+async def main():
+    server = StubPostgrestServer(("127.0.0.1", 0), StubPostgrestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = create_client(url, "stub.service.key")
+
+    print("=" * 80)
+    print(f"  {CONCURRENCY} requisições concorrentes, latência do stub {LATENCY_MS}ms")
+    print("=" * 80)
+
+    await run_scenario("bloqueante (antigo)", BlockingDatabaseOperations(client))
+    for cap in (10, 20, 50):
+        db_ops = SecureDatabaseOperations(client, max_concurrency=cap)
+        await run_scenario(f"thread pool (limite={cap})", db_ops)
+        db_ops.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+Teste do L1 do CacheService com invalidação durante a leitura do Redis
+Uma invalidação (pub/sub de outro worker ou escrita local) que chega
+enquanto o GET do Redis está em andamento, ou um GET feito enquanto a
+invalidação do próprio worker apaga as chaves no Redis, não pode deixar
+o valor antigo no L1.
+
+Execute: python scripts/test_cache_l1.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.cache_service import CacheService
+from app.serialization import CacheSerializer
+
+USUARIO = "user-1"
+
+
+class PipelineLento:
+    """Pipeline que só responde quando o teste liberar"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get(self, key):
+        pass
+
+    def pttl(self, key):
+        pass
+
+    async def execute(self):
+        self.redis.lendo.set()
+        await self.redis.liberar.wait()
+        return [self.redis.valor, 60_000]
+
+
+class RedisLento:
+    def __init__(self, valor):
+        self.valor = valor
+        self.lendo = asyncio.Event()
+        self.liberar = asyncio.Event()
+
+    def pipeline(self, transaction=False):
+        return PipelineLento(self)
+
+
+class PipelineGravacao:
+    """Pipeline que responde leituras na hora e segura os DELETE"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.comandos = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, comando):
+        return lambda *args, **kwargs: self.comandos.append((comando, args))
+
+    async def execute(self):
+        apagar = [args for comando, args in self.comandos if comando == "delete"]
+        if not apagar:
+            key = self.comandos[0][1][0]
+            return [self.redis.valores.get(key), 60_000]
+        self.redis.apagando.set()
+        await self.redis.liberar.wait()
+        for keys in apagar:
+            for key in keys:
+                self.redis.valores.pop(key, None)
+        return [len(apagar[0])] + [1] * (len(self.comandos) - 1)
+
+
+class RedisGravacao:
+    def __init__(self, valores):
+        self.valores = valores
+        self.apagando = asyncio.Event()
+        self.liberar = asyncio.Event()
+
+    async def smembers(self, tag):
+        return set(self.valores)
+
+    def pipeline(self, transaction=False):
+        return PipelineGravacao(self)
+
+
+async def ler_com_invalidacao(cache, invalidar):
+    redis = cache.redis
+    leitura = asyncio.create_task(cache.get_raw("get_all_obras", USUARIO))
+    await redis.lendo.wait()
+    invalidar()
+    redis.liberar.set()
+    return await leitura
+
+
+async def main() -> bool:
+    ok = True
+    serializer = CacheSerializer("json", compress_threshold=0)
+    antigo = serializer.dumps([{"id": 1, "nome": "Obra antiga"}])
+
+    print("[1] Invalidação de outro worker durante o GET...")
+    cache = CacheService(RedisLento(antigo), serializer=serializer)
+    key = cache._generate_key("get_all_obras", USUARIO)
+    valor = await ler_com_invalidacao(
+        cache, lambda: cache._handle_invalidation(f"outro-worker|{key}")
+    )
+    encontrado, _ = cache.local.get(key)
+    if valor is not None and not encontrado:
+        print("   OK - valor devolvido, mas não copiado para o L1")
+    else:
+        print("   ERRO - L1 guardou o valor lido antes da invalidação")
+        ok = False
+
+    print("\n[2] Limpeza do L1 (listener reconectando) durante o GET...")
+    cache = CacheService(RedisLento(antigo), serializer=serializer)
+    await ler_com_invalidacao(cache, cache.local.clear)
+    if not len(cache.local):
+        print("   OK - L1 continua vazio")
+    else:
+        print("   ERRO - L1 guardou o valor lido antes da limpeza")
+        ok = False
+
+    print("\n[3] Leitura entre a limpeza do L1 e o DELETE no Redis do mesmo worker...")
+    cache = CacheService(RedisGravacao({}), serializer=serializer)
+    cache.redis.valores[key] = antigo
+    invalidacao = asyncio.create_task(cache.invalidate_tables(USUARIO, ["obras"]))
+    await cache.redis.apagando.wait()
+    # A chave já saiu do L1, mas o Redis ainda tem o valor antigo
+    lido = await cache.get_raw("get_all_obras", USUARIO)
+    cache.redis.liberar.set()
+    await invalidacao
+    encontrado, _ = cache.local.get(key)
+    if lido is not None and not encontrado:
+        print("   OK - valor lido durante a invalidação não ficou no L1")
+    else:
+        print("   ERRO - L1 guardou o valor apagado pela invalidação")
+        ok = False
+
+    print("\n[4] Sem invalidação, o valor lido vai para o L1...")
+    cache = CacheService(RedisLento(antigo), serializer=serializer)
+    await ler_com_invalidacao(cache, lambda: None)
+    encontrado, _ = cache.local.get(key)
+    if encontrado and not cache.local._fills:
+        print("   OK - valor no L1, nenhuma leitura pendente")
+    else:
+        print(f"   ERRO - encontrado={encontrado}, pendentes={cache.local._fills}")
+        ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
@@ -0,0 +1,112 @@
+"""
+Teste das métricas de leitura do CacheService (cache_operations_total)
+Cada leitura conta uma vez: acerto no L1 ou no Redis é hit, chave ausente
+é miss e erro do Redis é só error, nunca error e miss ao mesmo tempo.
+
+Execute: python scripts/test_cache_metrics.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.cache_service import CacheService
+from app.monitoring import cache_operations
+from app.serialization import CacheSerializer
+
+USUARIO = "user-1"
+
+
+class Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get(self, key):
+        self.keys.append(key)
+
+    def pttl(self, key):
+        pass
+
+    async def execute(self):
+        if self.redis.falhar:
+            raise ConnectionError("Redis fora do ar")
+        resultado = []
+        for key in self.keys:
+            resultado += [self.redis.valores.get(key), 60_000]
+        return resultado
+
+
+class RedisFalso:
+    def __init__(self):
+        self.valores = {}
+        self.falhar = False
+
+    def pipeline(self, transaction=False):
+        return Pipeline(self)
+
+
+def contagem() -> dict:
+    return {
+        result: cache_operations.labels(operation="get", result=result)._value.get()
+        for result in ("hit", "miss", "error")
+    }
+
+
+async def medir(leitura) -> dict:
+    antes = contagem()
+    await leitura
+    depois = contagem()
+    return {result: int(depois[result] - antes[result]) for result in depois}
+
+
+def conferir(nome: str, obtido: dict, esperado: dict) -> bool:
+    if obtido == esperado:
+        print(f"   OK - {nome}: {obtido}")
+        return True
+    print(f"   ERRO - {nome}: {obtido}, esperado {esperado}")
+    return False
+
+
+async def main() -> bool:
+    ok = True
+    serializer = CacheSerializer("json", compress_threshold=0)
+    redis = RedisFalso()
+    cache = CacheService(redis, serializer=serializer)
+    key = cache._generate_key("get_all_obras", USUARIO)
+
+    print("[1] get_raw...")
+    ok &= conferir("chave ausente", await medir(cache.get_raw("get_all_obras", USUARIO)),
+                   {"hit": 0, "miss": 1, "error": 0})
+    redis.falhar = True
+    ok &= conferir("erro do Redis", await medir(cache.get_raw("get_all_obras", USUARIO)),
+                   {"hit": 0, "miss": 0, "error": 1})
+    redis.falhar = False
+    redis.valores[key] = serializer.dumps([{"id": 1}])
+    ok &= conferir("acerto no Redis", await medir(cache.get_raw("get_all_obras", USUARIO)),
+                   {"hit": 1, "miss": 0, "error": 0})
+    ok &= conferir("acerto no L1", await medir(cache.get_raw("get_all_obras", USUARIO)),
+                   {"hit": 1, "miss": 0, "error": 0})
+
+    print("\n[2] get_many...")
+    params = [{"obra_id": n} for n in range(3)]
+    ok &= conferir("três chaves ausentes", await medir(cache.get_many("obra", USUARIO, params)),
+                   {"hit": 0, "miss": 3, "error": 0})
+    redis.falhar = True
+    ok &= conferir("erro do Redis", await medir(cache.get_many("obra", USUARIO, params)),
+                   {"hit": 0, "miss": 0, "error": 3})
+
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
@@ -0,0 +1,121 @@
+"""
+Teste do streaming de respostas do OpenRouterClient
+Sobe um servidor OpenRouter falso local que envia os tokens via SSE
+com atraso entre eles, e verifica ordem, tempo até o primeiro token e
+o evento final.
+
+Execute: python scripts/test_chat_streaming.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.llm_integration import OpenRouterClient, UserLLMConfig, LLMHTTPPool
+
+TOKENS = ["Você ", "tem ", "3 ", "obras ", "ativas."]
+TOKEN_DELAY = 0.1
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    """Responde como o endpoint de chat completions com stream=true"""
+
+    protocol_version = "HTTP/1.1"
+    falhas_restantes = 1  # primeira requisição devolve 503 para testar o retry
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if FakeOpenRouterHandler.falhas_restantes:
+            FakeOpenRouterHandler.falhas_restantes -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        assert body.get("stream") is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        self._send(": OPENROUTER PROCESSING\n\n")
+        for token in TOKENS:
+            time.sleep(TOKEN_DELAY)
+            chunk = {"model": body["model"], "choices": [{"delta": {"content": token}}]}
+            self._send(f"data: {json.dumps(chunk)}\n\n")
+        usage = {"model": body["model"], "choices": [], "usage": {"total_tokens": 42}}
+        self._send(f"data: {json.dumps(usage)}\n\n")
+        self._send("data: [DONE]\n\n")
+
+    def _send(self, text):
+        self.wfile.write(text.encode())
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+async def run_stream(url):
+    pool = LLMHTTPPool(retry_backoff=0.01)
+    client = OpenRouterClient(UserLLMConfig(openrouter_api_key="sk-or-test"), pool)
+    client.base_url = url
+
+    started = time.perf_counter()
+    eventos = []
+    async for evento in client.stream_completion([{"role": "user", "content": "obras?"}]):
+        eventos.append((time.perf_counter() - started, evento))
+    await pool.close()
+    return eventos, time.perf_counter() - started
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenRouterHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/v1/chat/completions"
+
+    eventos, total = asyncio.run(run_stream(url))
+    server.shutdown()
+
+    tokens = [evento["content"] for _, evento in eventos if evento["type"] == "token"]
+    done = eventos[-1][1]
+    primeiro_token = eventos[0][0]
+    ok = True
+
+    print("[1] Tokens recebidos na ordem...")
+    if tokens == TOKENS:
+        print(f"   OK - {''.join(tokens)}\n")
+    else:
+        print(f"   ERRO - {tokens}\n")
+        ok = False
+
+    print("[2] Primeiro token antes do fim da geração...")
+    if primeiro_token < total - TOKEN_DELAY * (len(TOKENS) - 2):
+        print(f"   OK - primeiro token em {primeiro_token * 1000:.0f}ms, total {total * 1000:.0f}ms\n")
+    else:
+        print(f"   ERRO - primeiro token em {primeiro_token * 1000:.0f}ms, total {total * 1000:.0f}ms\n")
+        ok = False
+
+    print("[3] Evento final com uso e TTFT...")
+    if done["type"] == "done" and done["tokens_used"] == 42 and done["time_to_first_token"]:
+        print(f"   OK - {done}\n")
+    else:
+        print(f"   ERRO - {done}\n")
+        ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("   TESTE DE STREAMING DO CHAT")
+    print("=" * 50)
+    print()
+
+    if not main():
+        sys.exit(1)
@@ -0,0 +1,163 @@
+"""
+Teste do contexto de conversa (app.conversation_context)
+Simula uma conversa longa e compara o tamanho do prompt enviado ao LLM
+com o histórico completo (crescendo a cada turno) e com o histórico
+compactado no orçamento de tokens. Confere também o resumo dos turnos
+descartados, a calibração do contador com o prompt_tokens do provedor
+e que o prompt de sistema continua um prefixo idêntico entre turnos.
+
+Usa o banco 15 do Redis e apaga as chaves conversation:*.
+Execute: python scripts/test_conversation_context.py [redis_url]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import redis.asyncio as redis
+from app.conversation_context import ConversationStore, SUMMARY_HEADER
+from app.services.prompt_templates import prompt_registry
+from app.services.token_counter import TokenCounter
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+TURNOS = 60
+ORCAMENTO = 1200
+RESUMO = 200
+OPERACOES = ("get_obras_ativas", "get_fornecedores", "get_gastos_mes")
+# Tokenizer do "provedor" conta 30% a mais que o nosso
+RAZAO_PROVEDOR = 1.3
+
+
+def pergunta(i):
+    return f"Pergunta {i}: quanto foi gasto na obra {i % 7} com o fornecedor {i % 5} neste mês?"
+
+
+def resposta(i):
+    linhas = [f"- Lançamento {j}: R$ {1000 + i * j:,.2f} em material de acabamento" for j in range(12)]
+    return f"Resposta {i}: a obra {i % 7} teve estes gastos:\n" + "\n".join(linhas)
+
+
+async def limpar(client):
+    keys = await client.keys("conversation:*")
+    if keys:
+        await client.delete(*keys)
+
+
+async def main(client) -> bool:
+    ok = True
+    await limpar(client)
+    counter = TokenCounter()
+    store = ConversationStore(client, counter, max_tokens=ORCAMENTO, summary_tokens=RESUMO)
+    system = prompt_registry.get("answer_text").messages(OPERACOES, "user-1")
+
+    print("=" * 72)
+    print(f"  {TURNOS} turnos, orçamento de histórico {ORCAMENTO} tokens "
+          f"(resumo {RESUMO}), tokenizer {counter.snapshot()['tokenizer']}")
+    print("=" * 72)
+    print(f"{'turno':>5} | {'histórico completo':>18} | {'compactado':>10} | {'histórico':>9} | {'resumo':>6}")
+
+    completo, prompts, maior_historico, prefixos = [], [], 0, set()
+    custo_append = 0.0
+    for i in range(TURNOS):
+        context = await store.load("user-1", "conversa-longa")
+        historico = store.history_messages(context)
+        mensagens = [*system, *historico,
+                     {"role": "user", "content": pergunta(i)}]
+        prefixos.add(mensagens[0]["content"])
+        ingenuo = [*system, *completo,
+                   {"role": "user", "content": pergunta(i)}]
+        prompts.append((counter.raw_count_messages(ingenuo), counter.raw_count_messages(mensagens)))
+        maior_historico = max(maior_historico, store.history_tokens(context))
+
+        # O provedor devolve o prompt_tokens com o tokenizer dele
+        counter.calibrate("modelo-teste", mensagens, int(counter.raw_count_messages(mensagens) * RAZAO_PROVEDOR))
+
+        started = time.perf_counter()
+        await store.append("user-1", "conversa-longa", context, pergunta(i), resposta(i),
+                           {"model": "modelo-teste", "prompt_tokens": prompts[-1][1]})
+        custo_append += time.perf_counter() - started
+        completo += [{"role": "user", "content": pergunta(i)}, {"role": "assistant", "content": resposta(i)}]
+        if i in (0, 4, 9, 19, 39, TURNOS - 1):
+            print(f"{i + 1:>5} | {prompts[-1][0]:>18} | {prompts[-1][1]:>10} | "
+                  f"{store.history_tokens(context):>9} | {context['summary_tokens']:>6}")
+
+    print("\n[1] Histórico nunca passa do orçamento...")
+    if maior_historico <= ORCAMENTO:
+        print(f"   OK - maior histórico {maior_historico} tokens, "
+              f"append {custo_append * 1000 / TURNOS:.2f}ms por turno")
+    else:
+        print(f"   ERRO - histórico chegou a {maior_historico} tokens")
+        ok = False
+
+    print("\n[2] Prompt estável enquanto o histórico completo cresce...")
+    ingenuo_final, compactado_final = prompts[-1]
+    if compactado_final < ingenuo_final / 5 and max(p[1] for p in prompts[TURNOS // 2:]) <= \
+            counter.raw_count_messages(system) + ORCAMENTO + 100:
+        print(f"   OK - turno {TURNOS}: {compactado_final} tokens contra {ingenuo_final} "
+              f"({1 - compactado_final / ingenuo_final:.0%} menos)")
+    else:
+        print(f"   ERRO - turno {TURNOS}: {compactado_final} contra {ingenuo_final}")
+        ok = False
+
+    print("\n[3] Turnos descartados viram linhas do resumo...")
+    context = await store.load("user-1", "conversa-longa")
+    mensagens = store.history_messages(context)
+    ultima = context["turns"][-1]["content"]
+    if mensagens[0]["role"] == "system" and mensagens[0]["content"].startswith(SUMMARY_HEADER) \
+            and f"Pergunta {TURNOS - 2}" not in context["summary"] and "- Usuário: Pergunta" in context["summary"] \
+            and ultima.startswith(f"Resposta {TURNOS - 1}") and len(context["stats"]) == 20:
+        linhas = context["summary"].splitlines()
+        print(f"   OK - {len(context['turns']) // 2} trocas inteiras, resumo com {len(linhas)} linhas "
+              f"(de '{linhas[0][:30]}...')")
+    else:
+        print(f"   ERRO - resumo: {context['summary'][:200]!r}")
+        ok = False
+
+    print("\n[4] Calibração converge para a contagem do provedor...")
+    estimado = counter.count_messages(mensagens, "modelo-teste")
+    real = counter.raw_count_messages(mensagens) * RAZAO_PROVEDOR
+    if abs(estimado - real) / real < 0.02:
+        print(f"   OK - razão {counter.ratio('modelo-teste'):.3f} (provedor {RAZAO_PROVEDOR}), "
+              f"estimado {estimado} contra {real:.0f}")
+    else:
+        print(f"   ERRO - razão {counter.ratio('modelo-teste'):.3f}, estimado {estimado} contra {real:.0f}")
+        ok = False
+
+    print("\n[5] Prompt de sistema é o mesmo prefixo em todos os turnos...")
+    template = prompt_registry.get("answer_text")
+    mesmo = template.messages(OPERACOES, "user-1")[0]["content"] is system[0]["content"]
+    info = template.prefix.cache_info()
+    if len(prefixos) == 1 and mesmo:
+        print(f"   OK - 1 prompt de sistema em {TURNOS} turnos (cache: {info.hits} hits)")
+    else:
+        print(f"   ERRO - {len(prefixos)} prompts de sistema diferentes")
+        ok = False
+
+    print("\n[6] Resposta longa é cortada antes de entrar no contexto...")
+    curto = ConversationStore(client, counter, max_tokens=ORCAMENTO, max_turn_tokens=100)
+    context = await curto.append("user-1", "resposta-longa", curto._empty(), "resuma tudo",
+                                 resposta(1) * 10, {})
+    if context["turns"][1]["tokens"] <= 110 and context["turns"][1]["content"].endswith("[...]"):
+        print(f"   OK - resposta guardada com {context['turns'][1]['tokens']} tokens")
+    else:
+        print(f"   ERRO - resposta guardada com {context['turns'][1]['tokens']} tokens")
+        ok = False
+
+    print("\n[7] Limpar a conversa apaga o contexto...")
+    await store.clear("user-1", "conversa-longa")
+    if not (await store.load("user-1", "conversa-longa"))["turns"]:
+        print("   OK - próxima pergunta começa sem histórico")
+    else:
+        print("   ERRO - contexto ainda existe")
+        ok = False
+
+    await limpar(client)
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main(redis.from_url(REDIS_URL, decode_responses=True))):
+        sys.exit(1)
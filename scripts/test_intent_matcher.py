@@ -0,0 +1,133 @@
+"""
+Teste de equivalência do detector de intenções (OperationMapping)
+Compara o matcher compilado com a implementação original (re.search
+padrão a padrão) em um corpus gerado de mensagens.
+
+Execute: python scripts/test_intent_matcher.py
+"""
+
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.chat_agent import OperationMapping
+
+# Vocabulário em que a implementação original já tratava os acentos,
+# para que as duas tenham exatamente o mesmo comportamento esperado
+VOCABULARIO = [
+    "obra", "obras", "ativa", "ativas", "em", "andamento", "andando",
+    "projeto", "projetos", "ativo", "ativos", "toda", "todas", "todo", "todos",
+    "as", "os", "listar", "lista", "minha", "minhas", "finalizada",
+    "finalizadas", "finalizados", "concluída", "concluídas", "concluida",
+    "custo", "custos", "da", "quanto", "já", "gastou", "gastei", "gasto",
+    "valor", "total", "gastos", "fornecedor", "fornecedores", "quais",
+    "criar", "cria", "uma", "um", "nova", "novo", "adicionar", "adiciona",
+    "cadastrar", "cadastra", "mostre", "me", "de", "e", "qual", "status",
+]
+
+# Pares (com acento, sem acento) que devem cair na mesma operação
+PARES_ACENTO = [
+    ("Quais são as obras concluídas?", "Quais sao as obras concluidas?"),
+    ("obras concluídas", "obras concluidas"),
+    ("Quanto já gastei na obra?", "Quanto ja gastei na obra?"),
+    ("OBRAS CONCLUÍDAS", "OBRAS CONCLUIDAS"),
+]
+
+
+def legacy_detect_operation(message):
+    """Implementação original de OperationMapping.detect_operation"""
+    message_lower = message.lower()
+
+    for operation, patterns in OperationMapping.OPERATION_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, message_lower):
+                return operation
+
+    return None
+
+
+def gerar_corpus(quantidade=50_000, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(quantidade):
+        palavras = rng.choices(VOCABULARIO, k=rng.randint(1, 8))
+        mensagem = " ".join(palavras)
+        if rng.random() < 0.2:
+            mensagem = mensagem.upper()
+        corpus.append(mensagem)
+    return corpus
+
+
+def test_equivalencia():
+    corpus = gerar_corpus()
+    divergencias = [
+        (mensagem, legacy_detect_operation(mensagem), OperationMapping.detect_operation(mensagem))
+        for mensagem in corpus
+        if legacy_detect_operation(mensagem) != OperationMapping.detect_operation(mensagem)
+    ]
+    detectadas = sum(1 for mensagem in corpus if legacy_detect_operation(mensagem))
+    print(f"[1] Equivalência em {len(corpus)} mensagens ({detectadas} com operação)...")
+    for mensagem, esperado, obtido in divergencias[:10]:
+        print(f"   ERRO - '{mensagem}': esperado {esperado}, obtido {obtido}")
+    if not divergencias:
+        print("   OK - mesma operação em todas as mensagens\n")
+    return not divergencias
+
+
+def test_prioridade():
+    print("[2] Ordem de prioridade entre operações...")
+    casos = {
+        "listar obras ativas": "get_obras_ativas",
+        "fornecedores das obras ativas": "get_obras_ativas",
+        "todas as obras finalizadas": "get_obras_todas",
+        "cadastrar obra nova com fornecedor": "create_obra",
+        "nada a ver": None,
+    }
+    ok = True
+    for mensagem, esperado in casos.items():
+        obtido = OperationMapping.detect_operation(mensagem)
+        if obtido != esperado or legacy_detect_operation(mensagem) != esperado:
+            print(f"   ERRO - '{mensagem}': esperado {esperado}, obtido {obtido}")
+            ok = False
+    if ok:
+        print("   OK - prioridade preservada\n")
+    return ok
+
+
+def test_acentos():
+    print("[3] Mensagens com e sem acento...")
+    ok = True
+    for com_acento, sem_acento in PARES_ACENTO:
+        esperado = legacy_detect_operation(com_acento)
+        obtido = OperationMapping.detect_operation(sem_acento)
+        if esperado is None or OperationMapping.detect_operation(com_acento) != esperado or obtido != esperado:
+            print(f"   ERRO - '{sem_acento}': esperado {esperado}, obtido {obtido}")
+            ok = False
+    if ok:
+        print("   OK - acentos ignorados\n")
+    return ok
+
+
+def test_prefiltro():
+    print("[4] Pré-filtro literal ativo para todos os padrões...")
+    if OperationMapping._prefilter is not None:
+        print(f"   OK - {OperationMapping._prefilter.pattern.count('|') + 1} prefixos literais\n")
+        return True
+    print("   ERRO - algum padrão sem prefixo literal; toda mensagem roda a alternância inteira\n")
+    return False
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("   TESTE DO DETECTOR DE INTENÇÕES")
+    print("=" * 50)
+    print()
+
+    resultados = [test_equivalencia(), test_prioridade(), test_acentos(), test_prefiltro()]
+
+    print("=" * 50)
+    if not all(resultados):
+        sys.exit(1)
@@ -0,0 +1,138 @@
+"""
+Teste do roteamento de modelos (LLMRouter.route)
+Alimenta o ModelHealth com latências e erros sintéticos e verifica a
+escolha do modelo, a troca quando o nível está lento, os limites de
+custo do usuário e o failover do ChatAgent.
+
+Execute: python scripts/test_llm_router.py
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.services.llm_router import LLMRouter, LLMModel, ModelHealth
+from app.llm_integration import UserLLMConfig
+from app.chat_agent import ChatAgent
+
+PERGUNTA = "Me dê uma análise do andamento do cronograma"  # nível MODERATE -> Haiku
+
+
+def alimentar(health, modelo, latencia, quantidade=20, erros=0):
+    for _ in range(quantidade):
+        health.record_success(modelo.value, latencia)
+    for _ in range(erros):
+        health.record_error(modelo.value)
+
+
+def verificar(numero, descricao, condicao, detalhe):
+    print(f"[{numero}] {descricao}...")
+    print(f"   {'OK' if condicao else 'ERRO'} - {detalhe}\n")
+    return condicao
+
+
+def test_roteamento():
+    resultados = []
+
+    health = ModelHealth()
+    router = LLMRouter(health)
+    rota = router.route(PERGUNTA)
+    resultados.append(verificar(
+        1, "Sem medições usa o modelo do nível",
+        rota["models"][0] == LLMModel.CLAUDE_HAIKU.value, rota["models"]
+    ))
+
+    alimentar(health, LLMModel.CLAUDE_HAIKU, 20.0)
+    alimentar(health, LLMModel.GEMINI_FLASH, 0.8)
+    alimentar(health, LLMModel.GPT_3_5, 1.5)
+    rota = router.route(PERGUNTA)
+    resultados.append(verificar(
+        2, "Nível lento passa para o modelo mais rápido",
+        rota["models"][:2] == [LLMModel.GEMINI_FLASH.value, LLMModel.GPT_3_5.value],
+        f"{rota['models']} ({rota['reason']})"
+    ))
+
+    health = ModelHealth()
+    router = LLMRouter(health)
+    alimentar(health, LLMModel.CLAUDE_HAIKU, 3.0)
+    alimentar(health, LLMModel.GEMINI_FLASH, 0.8)
+    rota = router.route(PERGUNTA)
+    limite = router.route(PERGUNTA, max_latency_ms=2000)
+    resultados.append(verificar(
+        3, "Limite de latência do usuário",
+        rota["models"][0] == LLMModel.CLAUDE_HAIKU.value
+        and limite["models"][0] == LLMModel.GEMINI_FLASH.value,
+        f"sem limite {rota['models'][0]}, com 2000ms {limite['models'][0]}"
+    ))
+
+    alimentar(health, LLMModel.GEMINI_FLASH, 0.8, quantidade=0, erros=20)
+    rota = router.route(PERGUNTA, max_latency_ms=2000)
+    resultados.append(verificar(
+        4, "Modelo com muitos erros vai para o fim",
+        rota["models"][0] != LLMModel.GEMINI_FLASH.value,
+        f"{rota['models']} (erro gemini {health.error_rate(LLMModel.GEMINI_FLASH.value):.0%})"
+    ))
+
+    custo_flash = router._estimate_cost(LLMModel.GEMINI_FLASH, PERGUNTA)
+    rota = router.route(PERGUNTA, max_cost=custo_flash * 1.5)
+    caros = [m for m in rota["models"] if router._estimate_cost(LLMModel(m), PERGUNTA) > custo_flash * 1.5]
+    resultados.append(verificar(
+        5, "Limite de custo por consulta",
+        rota["models"] and not caros, rota["models"]
+    ))
+
+    rota = router.route(PERGUNTA, max_cost=1e-9)
+    resultados.append(verificar(
+        6, "Nenhum modelo dentro do limite",
+        rota["models"] == [], rota["reason"]
+    ))
+    return all(resultados)
+
+
+class ClienteFalso:
+    """Falha com 503 nos modelos listados e responde nos demais"""
+
+    def __init__(self, falhos):
+        self.falhos = falhos
+        self.chamados = []
+
+    async def process_query(self, message, user_id, operations, model=None, history=None):
+        self.chamados.append(model)
+        if model in self.falhos:
+            request = httpx.Request("POST", "http://openrouter")
+            raise httpx.HTTPStatusError("503", request=request, response=httpx.Response(503, request=request))
+        return {"operation": None, "response": "ok", "tokens_used": 100, "model_used": model}
+
+
+async def run_failover():
+    config = UserLLMConfig(openrouter_api_key="sk-or-test", auto_routing=True)
+    agent = ChatAgent(db_ops=None, cache=None, user_llm_config=config)
+    agent.router = LLMRouter(ModelHealth())
+    agent.llm_client = ClienteFalso({LLMModel.CLAUDE_HAIKU.value})
+    return await agent._handle_complex_query("user-1", PERGUNTA), agent.llm_client.chamados
+
+
+def test_failover():
+    resultado, chamados = asyncio.run(run_failover())
+    return verificar(
+        7, "Failover do ChatAgent quando o modelo falha",
+        resultado["response"] == "ok" and chamados[0] == LLMModel.CLAUDE_HAIKU.value and len(chamados) == 2,
+        f"tentativas {chamados}, resposta de {resultado['model_used']}"
+    )
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("   TESTE DO ROTEAMENTO DE MODELOS")
+    print("=" * 50)
+    print()
+
+    resultados = [test_roteamento(), test_failover()]
+
+    print("=" * 50)
+    if not all(resultados):
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""
+Teste do histórico de operações (app.operation_history)
+Mede o custo de registrar uma operação no caminho da requisição, confere
+a escrita em lote (por tamanho e por tempo) nos Redis Streams, a paginação
+por cursor, o fallback para o buffer em memória com o Redis fora do ar e
+o que acontece com um lote cuja escrita falhou ou foi cancelada.
+
+Usa o banco 15 do Redis e apaga as chaves operation_history*.
+Execute: python scripts/test_operation_history.py [redis_url]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import redis.asyncio as redis
+from app.operation_history import OperationHistory, GLOBAL_STREAM
+
+REDIS_URL = sys.argv[1] if len(sys.argv) > 1 else "redis://localhost:6379/15"
+OPERACOES = 5000
+
+
+class RedisFora:
+    """Cliente que falha em tudo, como um Redis inacessível"""
+
+    def pipeline(self, *args, **kwargs):
+        raise ConnectionError("Redis indisponível")
+
+    async def xrevrange(self, *args, **kwargs):
+        raise ConnectionError("Redis indisponível")
+
+
+class RedisTravado:
+    """Cliente cujo pipeline.execute() espera o teste liberar e então falha"""
+
+    def __init__(self):
+        self.executando = asyncio.Event()
+        self.liberar = asyncio.Event()
+
+    def pipeline(self, *args, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def xadd(self, *args, **kwargs):
+        pass
+
+    async def execute(self):
+        self.executando.set()
+        await self.liberar.wait()
+        raise ConnectionError("Redis indisponível")
+
+
+async def limpar(client):
+    keys = await client.keys(f"{GLOBAL_STREAM}*")
+    if keys:
+        await client.delete(*keys)
+
+
+async def main(client) -> bool:
+    ok = True
+    await limpar(client)
+
+    print("[1] Custo de record() no caminho da requisição...")
+    history = OperationHistory(client, batch_size=100, flush_interval=0.2)
+    await history.start()
+    started = time.perf_counter()
+    for i in range(OPERACOES):
+        history.record(f"user-{i % 10}", "get_obras_todas", "listar todas as obras " * 20, True)
+    custo_us = (time.perf_counter() - started) * 1_000_000 / OPERACOES
+    print(f"   OK - {custo_us:.2f}µs por operação, sem ida ao Redis")
+
+    print("\n[2] Limite de pendentes descarta as mais antigas...")
+    limitado = OperationHistory(client, max_pending=100)
+    for i in range(150):
+        limitado.record("user-limite", "get_obras_todas", f"mensagem {i}", True)
+    stats = limitado.get_stats()
+    if stats["pending"] == 100 and stats["dropped"] == 50 and limitado._pending[0]["message"] == "mensagem 50":
+        print("   OK - 50 descartadas, 100 pendentes (as mais recentes)")
+    else:
+        print(f"   ERRO - stats={stats}")
+        ok = False
+
+    print("\n[3] Escrita em lote pelo writer em segundo plano...")
+    started = time.perf_counter()
+    while history.get_stats()["pending"] and time.perf_counter() - started < 30:
+        await asyncio.sleep(0.01)
+    duracao = time.perf_counter() - started
+    gravadas = await client.xlen(GLOBAL_STREAM)
+    if gravadas == OPERACOES and history.get_stats()["pending"] == 0:
+        print(f"   OK - {gravadas} entradas gravadas em lotes de {history.batch_size} "
+              f"({gravadas / duracao:.0f}/s)")
+    else:
+        print(f"   ERRO - {gravadas} gravadas, {history.get_stats()['pending']} pendentes")
+        ok = False
+
+    print("\n[4] Lote parcial gravado pelo intervalo de tempo...")
+    history.record("user-parcial", "get_fornecedores", "fornecedores", True, from_cache=True)
+    await asyncio.sleep(0.05)
+    antes = await client.xlen(f"{GLOBAL_STREAM}:user-parcial")
+    await asyncio.sleep(0.3)
+    depois = await client.xlen(f"{GLOBAL_STREAM}:user-parcial")
+    if antes == 0 and depois == 1:
+        print("   OK - entrada única gravada após o flush_interval")
+    else:
+        print(f"   ERRO - antes={antes}, depois={depois}")
+        ok = False
+
+    print("\n[5] Paginação por cursor (mais recentes primeiro)...")
+    ids, cursor, paginas = [], None, 0
+    while True:
+        pagina = await history.query("user-3", cursor, limit=200)
+        ids.extend(item["id"] for item in pagina["items"])
+        paginas += 1
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            break
+    mensagem = pagina["items"][0]["message"] if pagina["items"] else ""
+    if len(ids) == OPERACOES // 10 and len(set(ids)) == len(ids) and ids == sorted(ids, reverse=True) \
+            and len(mensagem) == 200:
+        print(f"   OK - {len(ids)} entradas em {paginas} páginas, sem repetição, mensagem truncada")
+    else:
+        print(f"   ERRO - {len(ids)} entradas ({len(set(ids))} únicas)")
+        ok = False
+
+    await history.close()
+
+    print("\n[6] Redis fora do ar: nada bloqueia e nada se perde...")
+    fora = OperationHistory(RedisFora(), flush_interval=0.05)
+    await fora.start()
+    fora.record("user-1", "get_obras_ativas", "obras ativas", True)
+    await asyncio.sleep(0.2)
+    pagina = await fora.query("user-1")
+    stats = fora.get_stats()
+    fora._writer_task.cancel()
+    if stats["pending"] == 1 and stats["flush_errors"] > 0 and pagina.get("partial") \
+            and pagina["items"][0]["operation"] == "get_obras_ativas":
+        print(f"   OK - entrada mantida para nova tentativa ({stats['flush_errors']} falhas), "
+              "consulta respondida pelo buffer")
+    else:
+        print(f"   ERRO - stats={stats}, pagina={pagina}")
+        ok = False
+
+    print("\n[7] Lote devolvido à fila cheia conta o que não coube...")
+    travado = RedisTravado()
+    cheio = OperationHistory(travado, batch_size=10, max_pending=10)
+    for i in range(10):
+        cheio.record("user-1", "get_obras_ativas", f"antiga {i}", True)
+    escrita = asyncio.create_task(cheio.flush())
+    await travado.executando.wait()
+    for i in range(5):
+        cheio.record("user-1", "get_obras_ativas", f"nova {i}", True)
+    travado.liberar.set()
+    await escrita
+    stats = cheio.get_stats()
+    if stats["dropped"] == 5 and stats["pending"] == 10 and stats["recorded"] - stats["dropped"] == stats["pending"] \
+            and cheio._pending[0]["message"] == "antiga 0":
+        print("   OK - lote mantido na frente, 5 novas descartadas e contadas")
+    else:
+        print(f"   ERRO - stats={stats}")
+        ok = False
+
+    print("\n[8] Writer cancelado no meio da escrita devolve o lote...")
+    travado = RedisTravado()
+    cancelado = OperationHistory(travado, batch_size=10)
+    for i in range(10):
+        cancelado.record("user-1", "get_obras_ativas", f"mensagem {i}", True)
+    escrita = asyncio.create_task(cancelado.flush())
+    await travado.executando.wait()
+    escrita.cancel()
+    try:
+        await escrita
+    except asyncio.CancelledError:
+        pass
+    stats = cancelado.get_stats()
+    if escrita.cancelled() and stats["pending"] == 10 and cancelado._pending[0]["message"] == "mensagem 0":
+        print("   OK - 10 entradas de volta na fila para o flush final")
+    else:
+        print(f"   ERRO - stats={stats}")
+        ok = False
+
+    await limpar(client)
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main(redis.from_url(REDIS_URL, decode_responses=True))):
+        sys.exit(1)
@@ -0,0 +1,176 @@
+"""
+Teste dos templates de prompt (app.services.prompt_templates)
+Compara o custo de montar o prompt de sistema a cada chamada (f-string
+antiga, com o user_id no meio do texto) com o registro de templates, e
+confere que o prefixo é idêntico byte a byte entre usuários, que o
+OpenRouterClient pede o uso detalhado e devolve os tokens servidos do
+cache de prompt do provedor.
+
+Não chama o OpenRouter: as respostas vêm de um pool HTTP falso.
+Execute: python scripts/test_prompt_templates.py [chamadas]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.llm_integration import OpenRouterClient, UserLLMConfig
+from app.monitoring import llm_cached_tokens
+from app.services.prompt_templates import prompt_registry
+
+CHAMADAS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+OPERACOES = ["get_obras_ativas", "get_obras_todas", "get_fornecedores", "get_gastos_mes",
+             "get_lancamentos_obra", "get_resumo_financeiro", "compare_obras"]
+USO = {"prompt_tokens": 900, "completion_tokens": 50, "total_tokens": 950,
+       "prompt_tokens_details": {"cached_tokens": 768}}
+
+
+def prompt_antigo(user_id, available_operations):
+    """Como create_secure_prompt montava o prompt antes dos templates"""
+    system_prompt = f"""Você é um assistente especializado em gestão de obras da construção civil.
+        
+REGRAS CRÍTICAS DE SEGURANÇA:
+1. Você NUNCA gera SQL diretamente
+2. Você só pode usar as operações pré-definidas listadas abaixo
+3. O user_id '{user_id}' já está automaticamente aplicado em todas as operações
+4. NUNCA tente acessar dados de outros usuários
+5. Se não houver operação adequada, informe educadamente que não é possível
+
+OPERAÇÕES DISPONÍVEIS:
+{chr(10).join(f'- {op}' for op in available_operations)}
+"""
+    return system_prompt + """
+FORMATO DE RESPOSTA:
+{
+    "operation": "nome_da_operacao",
+    "parameters": {},
+    "response": "resposta em linguagem natural para o usuário"
+}
+
+Se nenhuma operação for necessária, use "operation": null e responda diretamente."""
+
+
+class RespostaFalsa:
+    def __init__(self, corpo=None, linhas=None):
+        self.corpo = corpo
+        self.linhas = linhas or []
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.corpo
+
+    async def aiter_lines(self):
+        for linha in self.linhas:
+            yield linha
+
+    async def aclose(self):
+        pass
+
+
+class PoolFalso:
+    """Guarda os payloads enviados e responde com o uso do OpenRouter"""
+
+    def __init__(self):
+        self.payloads = []
+
+    async def post(self, url, headers, payload, model, stream=False):
+        self.payloads.append(payload)
+        if stream:
+            return RespostaFalsa(linhas=[
+                "data: " + json.dumps({"model": model, "choices": [{"delta": {"content": "Olá"}}]}),
+                "data: " + json.dumps({"model": model, "choices": [], "usage": USO}),
+                "data: [DONE]"
+            ])
+        return RespostaFalsa({"model": model, "usage": USO, "choices": [
+            {"message": {"content": '{"operation": null, "response": "Olá"}'}}
+        ]})
+
+
+def medir(montar) -> float:
+    """µs por chamada, variando o usuário como em produção"""
+    started = time.perf_counter()
+    for i in range(CHAMADAS):
+        montar(f"user-{i % 500}")
+    return (time.perf_counter() - started) * 1_000_000 / CHAMADAS
+
+
+async def main() -> bool:
+    ok = True
+    template = prompt_registry.get("operations_json")
+    operacoes = tuple(OPERACOES)
+
+    print("[1] Prefixo idêntico para todos os usuários, sem o user_id...")
+    prefixos = {template.messages(operacoes, f"user-{i}")[0]["content"] for i in range(100)}
+    sufixo = template.messages(operacoes, "user-42")[1]["content"]
+    prefixo = prefixos.pop() if len(prefixos) == 1 else ""
+    if prefixo and "user-" not in prefixo and "user-42" in sufixo and "- compare_obras" in prefixo:
+        print(f"   OK - 1 prefixo para 100 usuários ({len(prefixo.encode())} bytes), sufixo: {sufixo!r}")
+    else:
+        print(f"   ERRO - {len(prefixos) + 1} prefixos, sufixo {sufixo!r}")
+        ok = False
+
+    print("\n[2] Mesmas instruções do prompt antigo...")
+    antigo = prompt_antigo("user-42", OPERACOES)
+    if "FORMATO DE RESPOSTA" in prefixo and antigo.split("OPERAÇÕES DISPONÍVEIS:")[1] == \
+            prefixo.split("OPERAÇÕES DISPONÍVEIS:")[1]:
+        print("   OK - lista de operações e formato de resposta iguais")
+    else:
+        print("   ERRO - operações ou formato de resposta mudaram")
+        ok = False
+
+    print("\n[3] Montagem do prompt por chamada...")
+    tempo_antigo = medir(lambda user_id: prompt_antigo(user_id, OPERACOES))
+    tempo_novo = medir(lambda user_id: template.messages(tuple(OPERACOES), user_id))
+    if tempo_novo < tempo_antigo:
+        print(f"   OK - {tempo_antigo:.2f}µs -> {tempo_novo:.2f}µs por chamada")
+    else:
+        print(f"   ERRO - {tempo_antigo:.2f}µs -> {tempo_novo:.2f}µs por chamada")
+        ok = False
+
+    print("\n[4] Tokens do cache de prompt devolvidos pelo chat_completion...")
+    pool = PoolFalso()
+    client = OpenRouterClient(UserLLMConfig(openrouter_api_key="sk-teste"), http_pool=pool)
+    antes = llm_cached_tokens.labels(model="openai/gpt-3.5-turbo")._value.get()
+    resultado = await client.process_query("oi", "user-42", OPERACOES, "openai/gpt-3.5-turbo")
+    contados = llm_cached_tokens.labels(model="openai/gpt-3.5-turbo")._value.get() - antes
+    enviado = pool.payloads[-1]
+    if resultado["cached_tokens"] == 768 and contados == 768 and enviado["usage"] == {"include": True} \
+            and enviado["messages"][0]["content"] == prefixo:
+        print(f"   OK - {resultado['cached_tokens']} de {resultado['prompt_tokens']} tokens do cache, "
+              "métrica llm_cached_prompt_tokens_total atualizada")
+    else:
+        print(f"   ERRO - resultado={resultado}, métrica +{contados}")
+        ok = False
+
+    print("\n[5] Streaming informa os tokens do cache no evento final...")
+    eventos = [evento async for evento in client.stream_completion(
+        client.create_secure_prompt("user-42", OPERACOES, structured=False), "openai/gpt-3.5-turbo"
+    )]
+    if eventos[-1]["type"] == "done" and eventos[-1]["cached_tokens"] == 768:
+        print("   OK - evento done com cached_tokens=768")
+    else:
+        print(f"   ERRO - eventos={eventos}")
+        ok = False
+
+    print("\n[6] Modelos Anthropic recebem o breakpoint de cache no prefixo...")
+    await client.chat_completion(client.create_secure_prompt("user-42", OPERACOES), "anthropic/claude-3-haiku")
+    primeira, segunda = pool.payloads[-1]["messages"][:2]
+    if primeira["content"][0].get("cache_control") == {"type": "ephemeral"} \
+            and primeira["content"][0]["text"] == prefixo and isinstance(segunda["content"], str):
+        print("   OK - cache_control só na primeira mensagem de sistema")
+    else:
+        print(f"   ERRO - mensagens={pool.payloads[-1]['messages'][:2]}")
+        ok = False
+
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)
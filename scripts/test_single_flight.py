@@ -0,0 +1,73 @@
+"""
+Teste do single-flight em um processo (app.single_flight)
+Confere que chamadas concorrentes da mesma chave fazem uma só busca, que
+o cancelamento de quem começou a busca (cliente que desconectou) não
+cancela a dos outros e que erros chegam a todos sem ficar presos.
+
+Execute: python scripts/test_single_flight.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from app.single_flight import SingleFlight
+
+SEGUIDORES = 10
+
+
+async def main() -> bool:
+    ok = True
+    single_flight = SingleFlight()
+    buscas = 0
+
+    async def buscar():
+        nonlocal buscas
+        buscas += 1
+        await asyncio.sleep(0.1)
+        return {"obras": buscas}
+
+    print("[1] Chamadas concorrentes fazem uma só busca...")
+    resultados = await asyncio.gather(*(single_flight.do("obras", buscar) for _ in range(SEGUIDORES)))
+    if buscas == 1 and all(resultado == {"obras": 1} for resultado in resultados):
+        print(f"   OK - {SEGUIDORES} chamadas, 1 busca")
+    else:
+        print(f"   ERRO - {buscas} buscas, resultados={resultados}")
+        ok = False
+
+    print("\n[2] Cancelar a primeira chamada não cancela as outras...")
+    buscas = 0
+    primeira = asyncio.create_task(single_flight.do("obras", buscar))
+    await asyncio.sleep(0)
+    seguidores = [asyncio.create_task(single_flight.do("obras", buscar)) for _ in range(SEGUIDORES)]
+    await asyncio.sleep(0.02)
+    primeira.cancel()
+    resultados = await asyncio.gather(*seguidores, return_exceptions=True)
+    if primeira.cancelled() and buscas == 1 and all(resultado == {"obras": 1} for resultado in resultados):
+        print(f"   OK - primeira cancelada, {SEGUIDORES} seguidoras receberam o resultado")
+    else:
+        print(f"   ERRO - {buscas} buscas, resultados={resultados}")
+        ok = False
+
+    print("\n[3] Erro da busca chega a todos e libera a chave...")
+
+    async def falhar():
+        await asyncio.sleep(0.05)
+        raise ValueError("banco indisponível")
+
+    erros = await asyncio.gather(*(single_flight.do("falha", falhar) for _ in range(3)), return_exceptions=True)
+    if all(isinstance(erro, ValueError) for erro in erros) and not single_flight._inflight:
+        print("   OK - 3 chamadas com ValueError, nenhuma busca pendente")
+    else:
+        print(f"   ERRO - erros={erros}, pendentes={list(single_flight._inflight)}")
+        ok = False
+
+    print(f"\n{single_flight.get_stats()}")
+    return ok
+
+
+if __name__ == "__main__":
+    if not asyncio.run(main()):
+        sys.exit(1)